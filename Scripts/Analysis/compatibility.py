@@ -0,0 +1,277 @@
+import argparse
+import concurrent.futures
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+
+import objdump
+import syscalls
+
+"""
+Checks many binaries against the system calls supported by each unikernel (Nanos, OSv, HermiTux) and writes
+a binary x unikernel matrix of the unsupported system calls, as CSV or JSON.
+
+The binaries of a directory tree (ELF files) are disassembled in a process pool with objdump.extract_syscalls.
+The system calls found are cached by SHA-256 of the binary in {CACHE_FILE}, so a binary is only disassembled
+again when it changes.
+
+The unikernels are described in {UNIKERNELS_FILE}; each one may have:
+    "supported":   the system calls it implements (anything else is unsupported)
+    "source":      {"kind": "nanos" | "osv" | "hermitux", "path": kernel tree}: the supported system calls are read from
+                   the syscall table of the kernel source (see SOURCE_KINDS); a missing tree is reported and ignored
+    "unsupported": system calls known to be missing
+    "patches":     a directory of kernel patches; the system calls they implement ("case <number>: /* <name> */"
+                   entries of a syscall handler, or functions named after a system call) are missing from the
+                   upstream kernel, so they are unsupported, unless --patched (the kernel is built with the patches)
+    "disabled_by": a directory of application patches; the system calls whose calls they comment out are missing
+Relative paths are relative to the description file.
+
+A system call is unsupported if it is known to be missing or if the unikernel has a supported list without it,
+and unknown if the unikernel has no supported list: a binary is only reported compatible with a unikernel when
+every system call it makes is known to be supported.
+
+    Usage: python compatibility.py <directory | binary> ... [--kernel VERSION] [--unikernels FILE] [--output matrix.csv|matrix.json]
+                                   [--jobs N] [--cache FILE] [--patched] [--offline]
+"""
+
+UNIKERNELS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "unikernels.json")
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "syscall_cache.json")
+CACHE_VERSION = 1  # Bumped when objdump.extract_syscalls finds different system calls
+ELF_MAGIC = b"\x7fELF"
+HASH_CHUNK = 1 << 20  # Bytes read at once to hash a binary
+
+PATCH_CASE = re.compile(r'^\+\s*case\s+(\d+)\s*:\s*\n\+\s*/\*\s*(\w+)\s*\*/', re.M)  # "+		case 230:" then "+			/* clock_nanosleep */" (HermiTux syscall handler)
+PATCH_DEFINITION = re.compile(r'^\+(?:[A-Za-z_][\w:]*[\s\*]+)+\**(\w+)\s*\(', re.M)  # "+int sched_getparam(pid_t pid, ..."
+PATCH_COMMENT = re.compile(r'^\+\s*//(.*)$', re.M)  # "+	//err = sched_setscheduler(pid, policy, param);"
+CALL = re.compile(r'\b(\w+)\s*\(')
+
+# Syscall tables of the kernel sources: files (relative to the kernel tree) and entries
+SOURCE_KINDS = {
+    "nanos": ("src/unix", re.compile(r'register_syscall\(\s*\w+\s*,\s*(?P<name>\w+)\s*,\s*(?!0\b|NULL\b)\w+')),  # "register_syscall(map, read, read, 0);"
+    "osv": ("linux.cc", re.compile(r'^\s*SYSCALL\d+\(\s*(?P<name>\w+)', re.M)),  # "SYSCALL3(read, int, char *, size_t);"
+    "hermitux": ("arch/x86/kernel/isrs.c", re.compile(r'case\s+(?P<number>\d+)\s*:\s*\n\s*/\*\s*(?P<name>\w+)\s*\*/')),  # "case 0:" then "/* read */"
+}
+SOURCE_EXTENSIONS = (".c", ".cc", ".h")
+
+COMPATIBLE = "compatible"
+UNKNOWN = "unknown"
+
+"""
+Returns the system calls implemented by the patches of a directory, and those whose calls the patches disable (names).
+"""
+def read_patches(directory, table):
+    names = set(table.values())
+    implemented, disabled = set(), set()
+    for file in sorted(os.listdir(directory)):
+        if not file.endswith(".patch"):
+            continue
+        with open(os.path.join(directory, file)) as f:
+            text = f.read()
+        implemented.update(name for number, name in PATCH_CASE.findall(text) if table.get(int(number)) == name)
+        for name in PATCH_DEFINITION.findall(text):
+            name = name.removeprefix("sys_")  # HermiTux implements <name> as sys_<name>
+            if name in names:
+                implemented.add(name)
+        for comment in PATCH_COMMENT.findall(text):
+            disabled.update(name for name in CALL.findall(comment) if name in names)
+    return implemented, disabled
+
+"""
+Returns the system calls of the syscall table of a kernel source tree (names), or None if the tree is missing.
+"""
+def read_source(kind, directory, table):
+    location, entry = SOURCE_KINDS[kind]
+    path = os.path.join(os.path.expanduser(directory), location)
+    if not os.path.exists(path):
+        print(f"No {kind} kernel source in {directory} ({location} not found): its supported system calls are unknown", file=sys.stderr)
+        return None
+
+    files = [path] if os.path.isfile(path) else [os.path.join(root, file) for root, dirs, files in os.walk(path) for file in sorted(files) if file.endswith(SOURCE_EXTENSIONS)]
+    names = set(table.values())
+    supported = set()
+    for file in files:
+        with open(file, errors="replace") as f:
+            for match in entry.finditer(f.read()):
+                name, number = match["name"], match.groupdict().get("number")
+                if name in names and (number is None or table.get(int(number)) == name):
+                    supported.add(name)
+    return supported
+
+"""
+Loads the unikernel description and resolves it into {unikernel: (supported names or None, unsupported names)}.
+Without {patched}, the system calls implemented by the kernel patches are unsupported (upstream kernel).
+"""
+def load_unikernels(path, table, patched=False):
+    with open(path) as f:
+        description = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+
+    unikernels = {}
+    for name, spec in description.items():
+        supported = set(spec["supported"]) if "supported" in spec else None
+        if "source" in spec:
+            found = read_source(spec["source"]["kind"], os.path.join(base, spec["source"]["path"]), table)
+            if found is not None:
+                supported = found if supported is None else supported | found
+        unsupported = set(spec.get("unsupported", []))
+        if "patches" in spec:
+            implemented, _ = read_patches(os.path.join(base, spec["patches"]), table)
+            if patched:
+                unsupported -= implemented
+                if supported is not None:
+                    supported |= implemented
+            else:
+                unsupported |= implemented
+                if supported is not None:
+                    supported -= implemented
+        if "disabled_by" in spec:
+            _, disabled = read_patches(os.path.join(base, spec["disabled_by"]), table)
+            unsupported |= disabled
+        unikernels[name] = (supported, unsupported)
+    return unikernels
+
+"""
+Returns the system calls of {names} that a unikernel does not support, and those it may not support
+(neither known to be missing nor listed as supported, when the unikernel has no supported list).
+"""
+def unsupported_syscalls(names, supported, unsupported):
+    missing = sorted(name for name in names if name in unsupported or (supported is not None and name not in supported))
+    unknown = sorted(name for name in names if supported is None and name not in unsupported)
+    return missing, unknown
+
+"""
+Returns the status of a binary on a unikernel: compatible, unknown (no unsupported system call, but some not known
+to be supported) or unsupported.
+"""
+def status(missing, unknown):
+    if missing:
+        return "unsupported"
+    return UNKNOWN if unknown else COMPATIBLE
+
+"""
+Returns the ELF binaries of the given files and directory trees.
+"""
+def find_binaries(paths):
+    binaries = []
+    for path in paths:
+        files = [path] if not os.path.isdir(path) else [os.path.join(root, file) for root, dirs, files in os.walk(path) for file in sorted(files)]
+        for file in files:
+            if os.path.isfile(file) and not os.path.islink(file):
+                with open(file, "rb") as f:
+                    if f.read(len(ELF_MAGIC)) == ELF_MAGIC:
+                        binaries.append(file)
+    return binaries
+
+"""
+Returns the SHA-256 of a file.
+"""
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+"""
+Disassembles a binary and returns its system call numbers (run in the worker processes).
+"""
+def analyze(path):
+    return objdump.extract_syscalls(objdump.disassemble(path))
+
+def load_cache(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        cache = json.load(f)
+    return cache["binaries"] if cache.get("version") == CACHE_VERSION else {}
+
+def save_cache(path, binaries):
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w") as f:
+        json.dump({"version": CACHE_VERSION, "binaries": binaries}, f, indent=1, sort_keys=True)
+    os.replace(temporary_path, path)
+
+"""
+Returns {binary: system call numbers} for the binaries, disassembling the ones missing from the cache in {jobs} processes.
+"""
+def collect_syscalls(binaries, cache_path=CACHE_FILE, jobs=None):
+    cache = load_cache(cache_path)
+    hashes = {binary: file_hash(binary) for binary in binaries}
+    missing = sorted({digest: binary for binary, digest in hashes.items() if digest not in cache}.items())
+
+    if missing:
+        print(f"Disassembling {len(missing)} binaries ({len(binaries) - len(missing)} cached)", file=sys.stderr)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(analyze, binary): (digest, binary) for digest, binary in missing}
+            for future in concurrent.futures.as_completed(futures):
+                digest, binary = futures[future]
+                try:
+                    cache[digest] = future.result()
+                except Exception as e:  # A binary objdump cannot read is reported and left out
+                    print(f"Error disassembling {binary}: {e}", file=sys.stderr)
+        save_cache(cache_path, cache)
+    return {binary: cache[digest] for binary, digest in hashes.items() if digest in cache}
+
+"""
+Builds the matrix {binary: {"syscalls": names, "unikernels": {unikernel: {"status", "unsupported", "unknown"}}}}.
+"""
+def build_matrix(binary_syscalls, unikernels, table):
+    matrix = {}
+    for binary, numbers in binary_syscalls.items():
+        names = [table.get(number, f"unknown_{number}") for number in numbers]
+        results = {}
+        for name, sets in unikernels.items():
+            missing, unknown = unsupported_syscalls(names, *sets)
+            results[name] = {"status": status(missing, unknown), "unsupported": missing, "unknown": unknown}
+        matrix[binary] = {"syscalls": names, "unikernels": results}
+    return matrix
+
+"""
+Returns the CSV cell of a binary on a unikernel: its unsupported system calls separated by ';', or the status
+("compatible", or "unknown" when some system calls are not known to be supported).
+"""
+def cell(result):
+    return ";".join(result["unsupported"]) if result["unsupported"] else result["status"]
+
+"""
+Writes the matrix as JSON (with the system calls of every binary) or as CSV (one row per binary, one column
+per unikernel, see cell).
+"""
+def write_matrix(matrix, unikernels, output, kernel_version):
+    if output.endswith(".json"):
+        with open(output, "w") as f:
+            json.dump({"kernel_version": kernel_version, "unikernels": list(unikernels), "binaries": matrix}, f, indent=4)
+        return
+
+    f = sys.stdout if output == "-" else open(output, "w", newline="")
+    writer = csv.writer(f)
+    writer.writerow(["binary", "syscalls"] + list(unikernels))
+    for binary, row in sorted(matrix.items()):
+        writer.writerow([binary, len(row["syscalls"])] + [cell(row["unikernels"][name]) for name in unikernels])
+    if f is not sys.stdout:
+        f.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check binaries against the system calls supported by unikernels.")
+    parser.add_argument("paths", nargs="+", help="Binaries or directories of binaries.")
+    parser.add_argument("--kernel", default=syscalls.DEFAULT_VERSION, help=f"Kernel version of the syscall table (default: {syscalls.DEFAULT_VERSION}).")
+    parser.add_argument("--unikernels", default=UNIKERNELS_FILE, help="Description of the unikernels (default: unikernels.json).")
+    parser.add_argument("--output", default="-", help="Output file, CSV or .json (default: CSV on the standard output).")
+    parser.add_argument("--jobs", type=int, default=None, help="Worker processes (default: one per CPU).")
+    parser.add_argument("--cache", default=CACHE_FILE, help="Cache of the system calls of each binary, by hash (default: syscall_cache.json).")
+    parser.add_argument("--patched", action="store_true", help="Check against the unikernels built with their patches (default: upstream kernels).")
+    parser.add_argument("--offline", action="store_true", help="Never download a syscall table (use the cached tables only).")
+    args = parser.parse_args()
+
+    binaries = find_binaries(args.paths)
+    if not binaries:
+        print("No ELF binary found")
+        sys.exit(1)
+
+    table = syscalls.load_table(args.kernel, args.offline)
+    unikernels = load_unikernels(args.unikernels, table, patched=args.patched)
+    matrix = build_matrix(collect_syscalls(binaries, args.cache, args.jobs), unikernels, table)
+    write_matrix(matrix, unikernels, args.output, args.kernel)
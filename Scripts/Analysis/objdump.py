@@ -1,71 +1,109 @@
+import argparse
 import re
 import subprocess
-import requests
 import sys
 
+import syscalls
+
+FUNCTION_LINE = re.compile(r'^[0-9a-f]+ <(.+)>:$')  # "0000000000401000 <_start>:"
+CALL_TARGET = re.compile(r'<([^>+]+)(?:\+0x[0-9a-f]+)?>')  # "call   401000 <syscall@plt>"
+
+# Instructions that matter to the extraction, matched after the last tab of a line (objdump -d prints
+# "address:<TAB>bytes<TAB>instruction"). RELEVANT_LINE skips most other lines with a single fast search.
+RELEVANT_LINE = re.compile(r'syscall|call|jmp|,%[er](?:ax|di)(?:\s|$)')
+INSTRUCTION = re.compile(r"""(?:
+      (?P<syscall>syscall)\s*$
+    | (?:(?:bnd|notrack)\s+)?(?P<call>call|jmp)\S*\s+(?P<target>.*)
+    | (?:cmp|test|bt)\S*\s                                                # Reads its operands only
+    | (?P<mnemonic>\S+)\s+(?P<source>[^\s#]*),(?P<register>%[er](?:ax|di))(?=\s|$)
+)""", re.X)
+
+NUMBER_REGISTERS = ("%eax", "%rax")  # Register of the system call number
+ARGUMENT_REGISTERS = ("%edi", "%rdi")  # First argument, the number given to syscall()
+SYSCALL_FUNCTIONS = ("syscall",)  # libc wrappers taking the number as first argument
+ARGUMENT = "argument"  # %eax holds the first argument of the function (the function is a syscall() wrapper)
+
 """
-Extracts system call numbers from an objdump file by searching for 'syscall' 
-instructions and their corresponding 'mov $0xZZZ,%eax' assignments.
+Disassembles a binary with objdump and yields its lines as they are written (the disassembly is never held in memory).
 """
-def extract_syscalls(lines):
-    syscalls = []
-
-    for i, line in enumerate(lines):
-        # Identify 'syscall' instruction
-        if 'syscall' in line:
-            # Search for 'mov $0xZZZ,%eax' in preceding lines
-            for j in range(i - 1, -1, -1):
-                match = re.search(r'mov\s+\$0x([0-9a-fA-F]+),%eax', lines[j])
-                if match:
-                    syscall_hex = match.group(1)
-                    syscalls.append(int(syscall_hex, 16))  # Convert hexadecimal to decimal
-                    break  # Stop searching once the instruction is found
-
-    # Remove duplicates and return sorted list of unique syscalls
-    return sorted(set(syscalls))
+def disassemble(binary):
+    with subprocess.Popen(["objdump", "-d", "--no-show-raw-insn", binary], stdout=subprocess.PIPE, text=True, bufsize=1 << 20) as process:
+        yield from process.stdout
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, process.args)
 
 """
-Maps system call numbers to their respective names using the Linux syscall table.
+Value written by an instruction to its {destination} register: the immediate of a 'mov $0xZZZ,%reg',
+0 for a 'xor %reg,%reg', ARGUMENT for a move of the first argument, and None when the value is unknown.
+"""
+def written_value(mnemonic, source, destination):
+    if mnemonic.startswith("mov"):
+        if source.startswith("$0x"):
+            return int(source[3:], 16)
+        if source in ARGUMENT_REGISTERS and destination in NUMBER_REGISTERS:
+            return ARGUMENT
+    elif mnemonic == "xor" and source == destination:
+        return 0
+    return None
 
-Downloads the `syscall_64.tbl` file from the Linux kernel repository to retrieve 
-the mapping of syscall numbers to their names.
 """
-def map_syscalls(syscall_numbers, kernel_version):
-    syscall_mapping = {}
-    results = []
+Extracts system call numbers from objdump -d lines, in a single pass over an iterable of lines.
 
-    try:
-        # Fetch the syscall_64.tbl file from the Linux kernel repository
-        url = f"https://raw.githubusercontent.com/torvalds/linux/refs/tags/v{kernel_version}/arch/x86/entry/syscalls/syscall_64.tbl"
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()  # Raise an error for HTTP failures
-        
-        # Process each line of the remote file
-        for line in response.text.splitlines():
-            line = line.strip()
-            
-            # Ignore empty lines, comments, or headers
-            if not line or line.startswith("#"):
-                continue
-                
-            columns = line.split()
-            
-            # Expected structure: <number> <abi> <name> <entry_point> [options]
-            if len(columns) >= 3:
-                try:
-                    syscall_num = int(columns[0])
-                    syscall_name = columns[2]  # Third column contains the syscall name
-                    syscall_mapping[syscall_num] = syscall_name
-                except (ValueError, IndexError):
-                    continue  # Skip malformed lines
-    except requests.exceptions.RequestException as e:
-        raise RuntimeError(f"Failed to fetch syscall_64.tbl: {e}")
-
-    # Map provided syscall numbers to their corresponding names
-    for num in syscall_numbers:
-        results.append((num, syscall_mapping.get(num, "NOT FOUND")))
-
-    return results
+For every function it tracks the value of %eax/%rax and %edi/%rdi: a 'syscall' instruction uses the last
+immediate moved into %eax, and a call to syscall() (or to a wrapper of the binary that moves its first
+argument into %eax before a 'syscall') uses the last immediate moved into %edi. The tracked values are
+reset at every function and call, so the memory used does not grow with the binary.
+"""
+def extract_syscalls(lines):
+    syscalls = set()
+    wrappers = set(SYSCALL_FUNCTIONS)
+    wrapper_calls = set()  # (called function, immediate in %edi), resolved once every wrapper is known
+    function = None
+    number = argument = None
+
+    for line in lines:
+        if line[:1] not in (" ", "\t"):
+            match = FUNCTION_LINE.match(line.rstrip("\n"))
+            if match:
+                function = match.group(1)
+                number = argument = None
+            continue
+        if RELEVANT_LINE.search(line) is None:
+            continue
+        instruction = INSTRUCTION.match(line, line.rfind("\t") + 1)
+        if instruction is None:
+            continue
+
+        if instruction["syscall"]:
+            if isinstance(number, int):
+                syscalls.add(number)
+            elif number == ARGUMENT and function is not None:
+                wrappers.add(function.split("@")[0])
+        elif instruction["call"]:
+            target = CALL_TARGET.search(instruction["target"])
+            if target and isinstance(argument, int):
+                wrapper_calls.add((target.group(1).split("@")[0], argument))
+            if instruction["call"] == "call":
+                number = argument = None  # Clobbered by the called function
+        elif instruction["register"]:
+            value = written_value(instruction["mnemonic"], instruction["source"], instruction["register"])
+            if instruction["register"] in NUMBER_REGISTERS:
+                number = value
+            else:
+                argument = value
+
+    syscalls.update(argument for called, argument in wrapper_calls if called in wrappers)
+    return sorted(syscalls)
+
+"""
+Maps system call numbers to their respective names using the Linux syscall table of {kernel_version}.
+
+The table comes from the local cache of syscalls.py (loaded once per process); it is downloaded from the
+Linux kernel repository and cached only if it is missing and {offline} is False.
+"""
+def map_syscalls(syscall_numbers, kernel_version=syscalls.DEFAULT_VERSION, offline=False):
+    syscall_mapping = syscalls.load_table(kernel_version, offline)
+    return [(num, syscall_mapping.get(num, "NOT FOUND")) for num in syscall_numbers]
 
 """
 Displays the system calls in by the program.
@@ -79,36 +117,27 @@ Main entry point of the script. Disassembles a binary using objdump, extracts sy
 and maps them to their corresponding names using the Linux syscall table.
 
 Usage:
-    python objdump.py [binary] [kernel_version]
+    python objdump.py [binary] [kernel_version] [--offline]
 
 Example:
     python objdump.py cyclictest 6.8-rc1
 """
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python objdump.py [binary] [kernel_version]")
-        sys.exit(1)
-
-    binary = sys.argv[1]
-    kernel_version = sys.argv[2]
+    parser = argparse.ArgumentParser(description="List the system calls of a binary.")
+    parser.add_argument("binary", help="Binary to disassemble.")
+    parser.add_argument("kernel_version", nargs="?", default=syscalls.DEFAULT_VERSION, help=f"Kernel version of the syscall table (default: {syscalls.DEFAULT_VERSION}).")
+    parser.add_argument("--offline", action="store_true", help="Never download a syscall table (use the cached tables only).")
+    args = parser.parse_args()
 
     try:
-        # Run objdump to disassemble the binary
-        objdump_result = subprocess.run(
-            ["objdump", "-d", binary],
-            capture_output=True,  # Capture stdout and stderr
-            text=True,  # Ensure output is handled as a string
-            check=True  # Raise an exception if the command fails
-        )
-    except subprocess.CalledProcessError as e:
+        # Disassemble the binary and extract system call numbers while objdump runs
+        syscall_numbers = extract_syscalls(disassemble(args.binary))
+    except (OSError, subprocess.CalledProcessError) as e:
         print(f"Error executing objdump: {e}")
         sys.exit(1)
 
-    # Extract system call numbers
-    syscall_numbers = extract_syscalls(objdump_result.stdout)
-
     # Map system call numbers to syscall names
-    mapped_syscalls = map_syscalls(syscall_numbers, kernel_version)
+    mapped_syscalls = map_syscalls(syscall_numbers, args.kernel_version, args.offline)
 
     # Print mapped syscalls
     display_syscalls(mapped_syscalls)
@@ -1,6 +1,26 @@
+import argparse
+import json
+import os
+import re
 import subprocess
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Plots"))
+from histogram import Histogram, bucket_bounds
+
+LATENCY_LINE = re.compile(
+    r'^(?:\[pid\s+(?P<pid>\d+)\] |(?P<tid>\d+) +)?'         # "[pid  1234] " (on stderr) or "1234 " (with -o)
+    r'(?:\d\d:\d\d:\d\d\.\d+ )?'                           # -tt timestamp
+    r'(?:<\.\.\. (?P<resumed>\w+) resumed>|(?P<name>\w+)\()'  # "<... clock_nanosleep resumed>" or "clock_nanosleep("
+    r'.*<(?P<seconds>\d+)\.(?P<micro>\d{6})>$'                 # -T duration, on the finished (or resumed) call
+)
+
+HOT_LOOP_SYSCALLS = ("clock_nanosleep", "nanosleep", "clock_gettime")  # System calls of the cyclictest measurement loop
+TAIL_PERCENTILE = 99.9   # Percentile of the tail latency
+TAIL_THRESHOLD = 50      # Microseconds of tail above the median that flag a hot loop system call
+PERCENTILES = (50, 99, 99.9, 99.99)
+BATCH_SIZE = 4096        # Latencies of a system call buffered before they are added to its histogram
+
 """
 Executes a command with strace and captures only the system calls.
 """
@@ -32,22 +52,148 @@ Displays the system calls used by the program.
 def display_syscalls(syscalls):
     print("\n".join(syscalls))
 
+"""
+Runs a command with strace, tracing every thread with the duration of each system call (-T) and its
+timestamp (-tt), and yields the trace lines as strace writes them. The trace goes through a pipe of its own
+(-o), so the output of the command is not mixed with it.
+"""
+def stream_strace(command):
+    read_fd, write_fd = os.pipe()
+    try:
+        process = subprocess.Popen(
+            ["strace", "-f", "-T", "-tt", "-o", f"/dev/fd/{write_fd}"] + command,
+            stdout=subprocess.DEVNULL,  # Suppresses the original command's output
+            pass_fds=(write_fd,),
+        )
+    except OSError:
+        os.close(read_fd)  # strace could not be started (e.g. not installed)
+        raise
+    finally:
+        os.close(write_fd)
+    with process, open(read_fd) as trace:
+        yield from trace
+    if process.returncode:
+        print(f"strace exited with status {process.returncode}")
+
+"""
+Parses strace -f -T lines one at a time and adds the duration of every system call to the histogram of its
+name (HDR histogram of Plots/histogram.py, in us), {BATCH_SIZE} durations at a time. A call split by another thread
+("<unfinished ...>") is counted once, on its "<... resumed>" line, which has the duration of the whole call;
+calls without a duration (e.g. exit_group) are left out.
+Returns {name: Histogram} and the number of lines parsed.
+"""
+def parse_latencies(lines):
+    histograms = {}
+    pending = {}
+    parsed = 0
+    for line in lines:
+        parsed += 1
+        match = LATENCY_LINE.match(line)
+        if match is None:
+            continue  # Unfinished calls, signals, exits and calls without a duration
+        name = match["resumed"] or match["name"]
+        values = pending.setdefault(name, [])
+        values.append(int(match["seconds"]) * 1000000 + int(match["micro"]))
+        if len(values) >= BATCH_SIZE:
+            histograms.setdefault(name, Histogram()).add(values)
+            values.clear()
+    for name, values in pending.items():
+        histograms.setdefault(name, Histogram()).add(values)
+    return histograms, parsed
+
+"""
+Returns how far (us) the tail latency ({TAIL_PERCENTILE} percentile) of a histogram is above its median.
+"""
+def tail_above_median(histogram):
+    tail, median = histogram.percentiles([TAIL_PERCENTILE, 50])
+    return tail - median
+
+"""
+Returns the hot loop system calls whose tail latency ({TAIL_PERCENTILE} percentile) is more than {threshold} us above their median.
+"""
+def high_tail_syscalls(histograms, hot=HOT_LOOP_SYSCALLS, threshold=TAIL_THRESHOLD):
+    return [name for name in hot if name in histograms
+            and tail_above_median(histograms[name]) > threshold]
+
+"""
+Displays the latency table of the system calls (microseconds), most called first, and the hot loop system calls with a high tail.
+"""
+def display_latencies(histograms, flagged):
+    columns = "".join(f"{'p' + format(p, 'g'):>10}" for p in PERCENTILES)
+    print(f"{'syscall':<24}{'calls':>10}{'mean':>10}{columns}{'max':>10}")
+    for name, histogram in sorted(histograms.items(), key=lambda item: -item[1].count):
+        percentiles = "".join(f"{value:>10.0f}" for value in histogram.percentiles(PERCENTILES))
+        flag = "  HIGH TAIL" if name in flagged else ""
+        print(f"{name:<24}{histogram.count:>10}{histogram.mean():>10.1f}{percentiles}{histogram.max():>10.0f}{flag}")
+
+"""
+Writes the histograms as JSON: for each system call, the statistics and the [lowest latency, count] of every non-empty bucket.
+"""
+def save_latencies(histograms, flagged, path):
+    data = {}
+    for name, histogram in histograms.items():
+        used = histogram.counts.nonzero()[0]
+        data[name] = {
+            "calls": histogram.count,
+            "mean": histogram.mean(),
+            "min": histogram.min(),
+            "max": histogram.max(),
+            "percentiles": {format(p, "g"): float(value) for p, value in zip(PERCENTILES, histogram.percentiles(PERCENTILES))},
+            "high_tail": name in flagged,
+            "histogram": [[int(lower), int(count)] for lower, count in zip(bucket_bounds(used)[0], histogram.counts[used])],
+        }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=4)
+
 """
 Main entry point of the script. Executes a command with strace and extracts the system calls used.
+With --latency, profiles the latency of every system call instead (of the command, or of an existing
+strace -f -T trace given with --trace, "-" for the standard input).
 
 Usage:
     python strace.py [command] [arguments]
+    python strace.py --latency [--trace FILE] [--hot SYSCALL,...] [--tail-threshold US] [--json FILE] [command] [arguments]
 
 Examples:
     python strace.py ./cyclictest -D 4h -i 10000 -v
+    python strace.py --latency ./cyclictest -D 1m -i 1000 -v
+    python strace.py --latency --hot clock_nanosleep,clock_gettime ./cyclictest -D 1m -i 1000 -v
 """
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python strace.py [command] [arguments]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="List the system calls of a command, or profile their latency.")
+    parser.add_argument("--latency", action="store_true", help="Profile the latency of every system call (strace -f -T -tt).")
+    parser.add_argument("--trace", default=None, help="Existing strace -T trace to profile instead of running the command (- for the standard input).")
+    parser.add_argument("--hot", type=lambda value: value.split(","), default=HOT_LOOP_SYSCALLS, help=f"Hot loop system calls checked for a high tail, separated by commas (default: {','.join(HOT_LOOP_SYSCALLS)}).")
+    parser.add_argument("--tail-threshold", type=float, default=TAIL_THRESHOLD, help=f"Microseconds of the p{TAIL_PERCENTILE:g} above the median that flag a hot loop system call (default: {TAIL_THRESHOLD}).")
+    parser.add_argument("--json", default=None, help="Also write the histograms to this JSON file.")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="Command to run and its arguments.")
+    args = parser.parse_args()
+
+    if args.latency:
+        if args.trace is None and not args.command:
+            parser.error("give a command or --trace")
+        if args.trace is None:
+            histograms, parsed = parse_latencies(stream_strace(args.command))
+        elif args.trace == "-":
+            histograms, parsed = parse_latencies(sys.stdin)
+        else:
+            with open(args.trace) as trace:
+                histograms, parsed = parse_latencies(trace)
+        flagged = high_tail_syscalls(histograms, args.hot, args.tail_threshold)
+        print(f"{parsed} lines, {sum(h.count for h in histograms.values())} system calls (latencies in us)")
+        display_latencies(histograms, flagged)
+        for name in flagged:
+            tail = histograms[name].percentiles(TAIL_PERCENTILE)
+            print(f"{name}: p{TAIL_PERCENTILE:g} {tail:.0f} us, {tail_above_median(histograms[name]):.0f} us above the median")
+        if args.json:
+            save_latencies(histograms, flagged, args.json)
+        sys.exit(0)
+
+    if not args.command:
+        parser.error("give a command")
 
     # Extract command and arguments from command-line input
-    command = sys.argv[1:]
+    command = args.command
 
     # Execute the command with strace and capture the output
     strace_output = run_strace(command)
@@ -0,0 +1,176 @@
+import argparse
+import os
+import re
+import sys
+
+"""
+Local cache of the x86_64 system call tables (number -> name), keyed by kernel version.
+
+Tables are <kernel_version>.tbl files, in the format of the kernel's arch/x86/entry/syscalls/syscall_64.tbl
+(<number> <abi> <name> ...). {TABLES_DIR} holds the vendored tables only (tracked by git); the tables seeded
+from a local kernel tree, a syscall_64.tbl file or an asm/unistd_64.h header, and those downloaded from the
+kernel repository, are written to {CACHE_DIR} (ignored by git), which is searched first. A table is parsed
+once per process and kept in memory.
+
+Without network (or with offline=True), a version that is not cached is mapped with the newest cached table:
+x86_64 system call numbers are never reassigned, so a newer table only adds names.
+
+    Usage: python syscalls.py seed <kernel_version> <kernel tree | syscall_64.tbl | unistd_64.h>
+           python syscalls.py list
+"""
+
+TABLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "syscall_tables")  # Vendored tables
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "syscall_cache")   # Seeded and downloaded tables
+TABLE_EXTENSION = ".tbl"
+DEFAULT_VERSION = "6.1"  # Vendored table
+KERNEL_TREE_TABLE = os.path.join("arch", "x86", "entry", "syscalls", "syscall_64.tbl")
+HOST_HEADER = "/usr/include/x86_64-linux-gnu/asm/unistd_64.h"
+TABLE_URL = "https://raw.githubusercontent.com/torvalds/linux/refs/tags/v{kernel_version}/arch/x86/entry/syscalls/syscall_64.tbl"
+DOWNLOAD_TIMEOUT = 10  # Seconds
+
+HEADER_LINE = re.compile(r'^#define\s+__NR_(\w+)\s+(\d+)\s*$', re.M)  # "#define __NR_read 0"
+
+TABLES = {}  # Tables loaded by this process, by kernel version
+
+"""
+Parses the text of a syscall_64.tbl file into a dictionary {number: name} (x32 entries are left out).
+"""
+def parse_table(text):
+    table = {}
+    for line in text.splitlines():
+        columns = line.split()
+
+        # Expected structure: <number> <abi> <name> <entry_point> [options]; ignore empty lines and comments
+        if len(columns) < 3 or columns[0].startswith("#") or columns[1] == "x32":
+            continue
+        try:
+            table[int(columns[0])] = columns[2]
+        except ValueError:
+            continue  # Skip malformed lines
+    return table
+
+"""
+Parses the text of an asm/unistd_64.h header into a dictionary {number: name}.
+"""
+def parse_header(text):
+    return {int(number): name for name, number in HEADER_LINE.findall(text)}
+
+"""
+Returns the path of the table of a kernel version in {tables_dir}.
+"""
+def table_path(kernel_version, tables_dir=CACHE_DIR):
+    return os.path.join(tables_dir, kernel_version + TABLE_EXTENSION)
+
+"""
+Returns the path of the table of a kernel version (the first of {directories} that has it), or None.
+"""
+def find_table(kernel_version, directories=(CACHE_DIR, TABLES_DIR)):
+    for tables_dir in directories:
+        path = table_path(kernel_version, tables_dir)
+        if os.path.exists(path):
+            return path
+    return None
+
+"""
+Returns the kernel versions of the tables of {directories}, oldest first.
+"""
+def cached_versions(directories=(CACHE_DIR, TABLES_DIR)):
+    versions = set()
+    for tables_dir in directories:
+        if os.path.isdir(tables_dir):
+            versions.update(file[:-len(TABLE_EXTENSION)] for file in os.listdir(tables_dir) if file.endswith(TABLE_EXTENSION))
+    return sorted(versions, key=version_key)
+
+"""
+Sort key of a kernel version ("6.8-rc1" sorts after "6.7" and before "6.8").
+"""
+def version_key(kernel_version):
+    release, _, candidate = kernel_version.partition("-rc")
+    numbers = tuple(int(part) if part.isdigit() else 0 for part in release.split("."))
+    return numbers + (0,) * (3 - len(numbers)) + (int(candidate) if candidate.isdigit() else float("inf"),)
+
+"""
+Writes a table {number: name} to the cache (atomically, so concurrent processes never read a partial table).
+"""
+def save_table(kernel_version, table, source, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = table_path(kernel_version, cache_dir)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as f:
+        f.write(f"# x86_64 system call table of Linux {kernel_version} (<number> <abi> <name>), from {source}\n")
+        for number in sorted(table):
+            f.write(f"{number}\tcommon\t{table[number]}\n")
+    os.replace(temporary_path, path)
+    TABLES[kernel_version] = table
+    return path
+
+"""
+Seeds the cache with the table of a kernel version, read from a kernel tree, a syscall_64.tbl file or an asm/unistd_64.h header.
+"""
+def seed(kernel_version, source=HOST_HEADER, cache_dir=CACHE_DIR):
+    path = os.path.join(source, KERNEL_TREE_TABLE) if os.path.isdir(source) else source
+    with open(path) as f:
+        text = f.read()
+    table = parse_header(text) if path.endswith(".h") else parse_table(text)
+    if not table:
+        raise ValueError(f"No system call found in {path}")
+    return save_table(kernel_version, table, path, cache_dir)
+
+"""
+Downloads the syscall_64.tbl file of a kernel version from the Linux kernel repository.
+"""
+def download(kernel_version):
+    import requests  # Only needed for the tables that are not cached yet
+
+    try:
+        response = requests.get(TABLE_URL.format(kernel_version=kernel_version), timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()  # Raise an error for HTTP failures
+    except requests.exceptions.RequestException as e:
+        raise RuntimeError(f"Failed to fetch syscall_64.tbl: {e}")
+    return parse_table(response.text)
+
+"""
+Returns the table {number: name} of a kernel version: from memory, from the cache or the vendored tables,
+downloaded (and cached) unless {offline}, and otherwise the newest table available.
+"""
+def load_table(kernel_version, offline=False, cache_dir=CACHE_DIR, tables_dir=TABLES_DIR):
+    if kernel_version in TABLES:
+        return TABLES[kernel_version]
+
+    path = find_table(kernel_version, (cache_dir, tables_dir))
+    if path is not None:
+        with open(path) as f:
+            TABLES[kernel_version] = parse_table(f.read())
+        return TABLES[kernel_version]
+
+    error = "offline mode"
+    if not offline:
+        try:
+            table = download(kernel_version)
+            save_table(kernel_version, table, TABLE_URL.format(kernel_version=kernel_version), cache_dir)
+            return table
+        except (ImportError, RuntimeError) as e:
+            error = e
+
+    versions = cached_versions((cache_dir, tables_dir))
+    if not versions:
+        raise RuntimeError(f"No system call table for Linux {kernel_version} ({error}); seed one with: python syscalls.py seed {kernel_version} <kernel tree>")
+    print(f"No system call table for Linux {kernel_version} ({error}), using the table of Linux {versions[-1]}", file=sys.stderr)
+    TABLES[kernel_version] = load_table(versions[-1], offline=True, cache_dir=cache_dir, tables_dir=tables_dir)
+    return TABLES[kernel_version]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the cached x86_64 system call tables.")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    seed_parser = subparsers.add_parser("seed", help="Add the table of a kernel version to the cache.")
+    seed_parser.add_argument("kernel_version", help="Kernel version of the table (e.g. 6.8-rc1).")
+    seed_parser.add_argument("source", nargs="?", default=HOST_HEADER, help=f"Kernel tree, syscall_64.tbl or unistd_64.h file (default: {HOST_HEADER}).")
+    subparsers.add_parser("list", help="List the cached and vendored tables.")
+    args = parser.parse_args()
+
+    if args.action == "seed":
+        path = seed(args.kernel_version, args.source)
+        print(f"{path}: {len(TABLES[args.kernel_version])} system calls")
+    else:
+        for version in cached_versions():
+            print(version)
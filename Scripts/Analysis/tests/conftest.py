@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scripts import each other by plain name, as when they are run from their directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
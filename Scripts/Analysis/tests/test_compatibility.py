@@ -0,0 +1,97 @@
+import csv
+import json
+import pytest
+
+import compatibility
+
+TABLE = {0: "read", 1: "write", 60: "exit", 144: "sched_setscheduler", 230: "clock_nanosleep"}
+
+SOURCES = {
+    "nanos/src/unix/syscall.c": "register_syscall(map, read, read, 0);\n"
+                                "register_syscall(map, write, write, 0);\n"
+                                "register_syscall(map, clock_nanosleep, 0, 0);\n",  # Registered without a handler
+    "osv/linux.cc": "SYSCALL3(read, int, char *, size_t);\n"
+                    "SYSCALL1(exit, int);\n",
+    "hermitux/arch/x86/kernel/isrs.c": "\t\tcase 0:\n\t\t\t/* read */\n\t\t\tbreak;\n"
+                                       "\t\tcase 1:\n\t\t\t/* write */\n\t\t\tbreak;\n"
+                                       "\t\tcase 60:\n\t\t\t/* write */\n\t\t\tbreak;\n",  # Number of another system call
+    "patches/osv/0001-clock_nanosleep.patch": "+int clock_nanosleep(clockid_t clock_id, int flags,\n"
+                                            "+                    const struct timespec *request, struct timespec *remain)\n",
+    "patches/hermitux/0001-clock_nanosleep.patch": "+\t\tcase 230:\n+\t\t\t/* clock_nanosleep */\n",
+    "patches/app/0001-scheduler.patch": "+\t//err = sched_setscheduler(pid, policy, param);\n",
+}
+
+UNIKERNELS = {
+    "Nanos": {"source": {"kind": "nanos", "path": "nanos"}},
+    "OSv": {"source": {"kind": "osv", "path": "osv"}, "patches": "patches/osv"},
+    "HermiTux": {"source": {"kind": "hermitux", "path": "hermitux"}, "patches": "patches/hermitux"},
+    "Listed": {"supported": ["read", "write", "exit", "sched_setscheduler"], "disabled_by": "patches/app"},
+    "Missing": {"source": {"kind": "osv", "path": "missing"}},
+}
+
+BINARIES = {
+    "app": [0, 1],
+    "sleeper": [0, 230],
+    "scheduler": [60, 144],
+    "odd": [999],
+}
+
+@pytest.fixture
+def description(tmp_path):
+    for file, text in SOURCES.items():
+        path = tmp_path / file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+    path = tmp_path / "unikernels.json"
+    path.write_text(json.dumps(UNIKERNELS))
+    return str(path)
+
+def statuses(matrix):
+    return {binary: {name: result["status"] for name, result in row["unikernels"].items()} for binary, row in matrix.items()}
+
+def test_supported_syscalls_from_sources(description, capsys):
+    unikernels = compatibility.load_unikernels(description, TABLE)
+    assert unikernels["Nanos"] == ({"read", "write"}, set())
+    assert unikernels["OSv"] == ({"read", "exit"}, {"clock_nanosleep"})
+    assert unikernels["HermiTux"] == ({"read", "write"}, {"clock_nanosleep"})
+    assert unikernels["Listed"] == ({"read", "write", "exit", "sched_setscheduler"}, {"sched_setscheduler"})
+    assert unikernels["Missing"] == (None, set())
+    assert "No osv kernel source" in capsys.readouterr().err
+
+def test_matrix_upstream_kernels(description):
+    unikernels = compatibility.load_unikernels(description, TABLE)
+    matrix = compatibility.build_matrix(BINARIES, unikernels, TABLE)
+
+    assert matrix["sleeper"]["syscalls"] == ["read", "clock_nanosleep"]
+    assert matrix["odd"]["syscalls"] == ["unknown_999"]
+    assert statuses(matrix) == {
+        "app": {"Nanos": "compatible", "OSv": "unsupported", "HermiTux": "compatible", "Listed": "compatible", "Missing": "unknown"},
+        "sleeper": {"Nanos": "unsupported", "OSv": "unsupported", "HermiTux": "unsupported", "Listed": "unsupported", "Missing": "unknown"},
+        "scheduler": {"Nanos": "unsupported", "OSv": "unsupported", "HermiTux": "unsupported", "Listed": "unsupported", "Missing": "unknown"},
+        "odd": {"Nanos": "unsupported", "OSv": "unsupported", "HermiTux": "unsupported", "Listed": "unsupported", "Missing": "unknown"},
+    }
+    assert matrix["app"]["unikernels"]["OSv"]["unsupported"] == ["write"]
+    assert matrix["app"]["unikernels"]["Missing"]["unknown"] == ["read", "write"]
+    assert matrix["scheduler"]["unikernels"]["Listed"]["unsupported"] == ["sched_setscheduler"]
+
+def test_matrix_patched_kernels(description):
+    unikernels = compatibility.load_unikernels(description, TABLE, patched=True)
+    matrix = compatibility.build_matrix(BINARIES, unikernels, TABLE)
+    assert statuses(matrix)["sleeper"] == {"Nanos": "unsupported", "OSv": "compatible", "HermiTux": "compatible", "Listed": "unsupported", "Missing": "unknown"}
+
+def test_cell():
+    assert compatibility.cell({"status": "unsupported", "unsupported": ["fork", "clone"], "unknown": []}) == "fork;clone"
+    assert compatibility.cell({"status": "unknown", "unsupported": [], "unknown": ["read"]}) == "unknown"
+    assert compatibility.cell({"status": "compatible", "unsupported": [], "unknown": []}) == "compatible"
+
+def test_write_matrix_csv(description, tmp_path):
+    unikernels = compatibility.load_unikernels(description, TABLE)
+    matrix = compatibility.build_matrix(BINARIES, unikernels, TABLE)
+    output = str(tmp_path / "matrix.csv")
+    compatibility.write_matrix(matrix, unikernels, output, "6.1")
+
+    with open(output, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["binary", "syscalls", "Nanos", "OSv", "HermiTux", "Listed", "Missing"]
+    assert rows[1] == ["app", "2", "compatible", "write", "compatible", "compatible", "unknown"]
+    assert [row[0] for row in rows[1:]] == ["app", "odd", "scheduler", "sleeper"]
@@ -0,0 +1,61 @@
+import pytest
+
+import objdump
+
+"""Lines of objdump -d --no-show-raw-insn output: one function per (name, instructions)."""
+def disassembly(*functions):
+    lines = ["", "binary:     file format elf64-x86-64", "", "", "Disassembly of section .text:", ""]
+    address = 0x401000
+    for name, instructions in functions:
+        lines += [f"{address:016x} <{name}>:"]
+        for instruction in instructions:
+            lines.append(f"  {address:x}:\t{instruction}")
+            address += 4
+        lines.append("")
+    return [line + "\n" for line in lines]
+
+def test_mov_eax_before_syscall():
+    lines = disassembly(("_start", ["mov    $0x3c,%eax", "xor    %edi,%edi", "syscall"]),
+                        ("write_out", ["mov    $0x1,%eax", "mov    $0x1,%edi", "syscall", "ret"]))
+    assert objdump.extract_syscalls(lines) == [1, 60]
+
+def test_rax_and_xor():
+    lines = disassembly(("read_in", ["xor    %eax,%eax", "syscall"]),
+                        ("gettid", ["mov    $0xba,%rax", "nop", "syscall"]),
+                        ("movl", ["movl   $0xe7,%eax", "syscall"]))
+    assert objdump.extract_syscalls(lines) == [0, 186, 231]
+
+def test_unknown_number_ignored():
+    lines = disassembly(("dispatch", ["mov    %esi,%eax", "syscall"]),
+                        ("compare", ["mov    $0x27,%eax", "cmp    $0x1,%eax", "syscall"]))  # cmp only reads %eax
+    assert objdump.extract_syscalls(lines) == [39]
+
+@pytest.mark.parametrize("register", ["%edi", "%rdi"])
+def test_libc_syscall_wrapper(register):
+    lines = disassembly(("main", [f"mov    $0xe4,{register}", "mov    $0x0,%esi", "call   401100 <syscall@plt>", "ret"]))
+    assert objdump.extract_syscalls(lines) == [228]
+
+@pytest.mark.parametrize("register", ["%edi", "%rdi"])
+def test_wrapper_of_the_binary(register):
+    # The wrapper is defined after its caller: the calls are resolved once every wrapper is known
+    lines = disassembly(("main", [f"mov    $0xca,{register}", "call   401200 <my_syscall>",
+                                  "mov    $0x1,%edi", "call   401300 <not_a_wrapper>", "ret"]),
+                        ("my_syscall", [f"mov    {register},%rax", "syscall", "ret"]),
+                        ("not_a_wrapper", ["mov    $0x2,%eax", "syscall", "ret"]))
+    assert objdump.extract_syscalls(lines) == [2, 202]
+
+def test_registers_reset_between_functions():
+    lines = disassembly(("sets_eax", ["mov    $0x3c,%eax", "mov    $0xe4,%edi", "ret"]),
+                        ("uses_eax", ["syscall", "call   401100 <syscall@plt>", "ret"]))
+    assert objdump.extract_syscalls(lines) == []
+
+def test_registers_clobbered_by_call():
+    lines = disassembly(("main", ["mov    $0x3c,%eax", "mov    $0xe4,%edi", "call   401400 <helper>",
+                                  "syscall", "call   401100 <syscall@plt>", "ret"]),
+                        ("helper", ["ret"]))
+    assert objdump.extract_syscalls(lines) == []
+
+def test_register_overwritten_before_syscall():
+    lines = disassembly(("main", ["mov    $0x3c,%eax", "mov    (%rsp),%eax", "syscall",
+                                  "mov    $0x1,%eax", "jmp    401010 <main+0x10>", "syscall"]))  # A jump keeps the registers
+    assert objdump.extract_syscalls(lines) == [1]
@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+
+import strace
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "strace.py")
+
+TRACE = """\
+1234 12:00:00.000001 execve("./cyclictest", ["./cyclictest"], 0x7ffd /* 20 vars */) = 0 <0.000210>
+1234 12:00:00.000300 clock_gettime(CLOCK_MONOTONIC, {tv_sec=1, tv_nsec=2}) = 0 <0.000001>
+1235 12:00:00.000400 clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME, {tv_sec=1, tv_nsec=3}, <unfinished ...>
+1234 12:00:00.000450 write(1, "T: 0\\n", 5) = 5 <0.000012>
+1235 12:00:00.001500 <... clock_nanosleep resumed>NULL) = 0 <0.001100>
+[pid  1236] 12:00:00.001600 clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME, {tv_sec=1, tv_nsec=4}, NULL) = 0 <0.000070>
+[pid  1236] 12:00:00.001700 --- SIGALRM {si_signo=SIGALRM, si_code=SI_TIMER} ---
+1236 12:00:02.000000 clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME, {tv_sec=3, tv_nsec=0}, NULL) = 0 <1.500000>
+1234 12:00:03.000000 exit_group(0)              = ?
+1234 12:00:03.000100 +++ exited with 0 +++
+"""
+
+def test_parse_latencies():
+    histograms, parsed = strace.parse_latencies(TRACE.splitlines())
+    assert parsed == 10
+    assert sorted(histograms) == ["clock_gettime", "clock_nanosleep", "execve", "write"]
+
+    # The unfinished call is counted once, with the duration of its resumed line
+    sleeps = histograms["clock_nanosleep"]
+    assert sleeps.count == 3
+    assert (sleeps.min(), sleeps.max()) == (70, 1500000)
+    assert sleeps.mean() == (1100 + 70 + 1500000) / 3
+    assert histograms["write"].count == 1 and histograms["write"].max() == 12
+    assert histograms["clock_gettime"].max() == 1
+
+def test_parse_latencies_in_batches():
+    lines = [f"1234 12:00:00.{i:06d} clock_gettime(CLOCK_MONOTONIC, {{}}) = 0 <0.{i % 100:06d}>" for i in range(strace.BATCH_SIZE * 2 + 5)]
+    histograms, parsed = strace.parse_latencies(lines)
+    assert parsed == len(lines)
+    assert histograms["clock_gettime"].count == len(lines)
+    assert histograms["clock_gettime"].max() == 99
+
+def tail_trace(tail_us):
+    lines = [f"1234 12:00:00.000000 clock_nanosleep(CLOCK_MONOTONIC, 0, {{}}, NULL) = 0 <0.{60:06d}>"] * 9950
+    lines += [f"1234 12:00:00.000000 clock_nanosleep(CLOCK_MONOTONIC, 0, {{}}, NULL) = 0 <0.{60 + tail_us:06d}>"] * 50
+    lines += [f"1234 12:00:00.000000 clock_gettime(CLOCK_MONOTONIC, {{}}) = 0 <0.000001>"] * 100
+    lines += [f"1234 12:00:00.000000 read(3, \"\", 4096) = 0 <0.{5000:06d}>"] * 100
+    return lines
+
+def test_high_tail_syscalls():
+    histograms, _ = strace.parse_latencies(tail_trace(200))
+    assert strace.high_tail_syscalls(histograms) == ["clock_nanosleep"]
+    assert strace.high_tail_syscalls(histograms, threshold=500) == []
+    assert strace.high_tail_syscalls(histograms, hot=["read", "clock_gettime"]) == []  # Slow but not in the tail
+
+    histograms, _ = strace.parse_latencies(tail_trace(20))
+    assert strace.high_tail_syscalls(histograms) == []
+
+def test_cli_hot_before_command(tmp_path):
+    trace = tmp_path / "cyclictest.strace"
+    trace.write_text("\n".join(tail_trace(200)) + "\n")
+    output = tmp_path / "latencies.json"
+    result = subprocess.run([sys.executable, SCRIPT, "--latency", "--hot", "clock_nanosleep,nanosleep", "--trace", str(trace),
+                             "--json", str(output), "./cyclictest", "-D", "1m"], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "clock_nanosleep: p99.9" in result.stdout
+
+    with open(output) as f:
+        data = json.load(f)
+    assert data["clock_nanosleep"]["high_tail"] and not data["read"]["high_tail"]
+    assert data["clock_nanosleep"]["calls"] == 10000
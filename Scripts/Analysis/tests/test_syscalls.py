@@ -0,0 +1,94 @@
+import os
+import pytest
+
+import syscalls
+
+TBL = ("# comment\n"
+       "0\tcommon\tread\tsys_read\n"
+       "1\tcommon\twrite\tsys_write\n"
+       "512\tx32\trt_sigaction\tcompat_sys_rt_sigaction\n"  # x32 entries are left out
+       "bad\tcommon\tbroken\n")
+HEADER = ("#ifndef _ASM_UNISTD_64_H\n"
+          "#define __NR_read 0\n"
+          "#define __NR_write 1\n"
+          "#define __NR_exit 60\n"
+          "#endif\n")
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(syscalls, "TABLES", {})
+    cache_dir, tables_dir = str(tmp_path / "cache"), str(tmp_path / "tables")
+    os.makedirs(tables_dir)
+    return cache_dir, tables_dir
+
+def load(kernel_version, dirs, offline=True):
+    cache_dir, tables_dir = dirs
+    return syscalls.load_table(kernel_version, offline, cache_dir=cache_dir, tables_dir=tables_dir)
+
+@pytest.mark.parametrize("name, text, expected", [
+    ("syscall_64.tbl", TBL, {0: "read", 1: "write"}),
+    ("unistd_64.h", HEADER, {0: "read", 1: "write", 60: "exit"}),
+])
+def test_seed_from_file(tmp_path, dirs, name, text, expected):
+    source = tmp_path / name
+    source.write_text(text)
+    path = syscalls.seed("6.8-rc1", str(source), cache_dir=dirs[0])
+
+    assert path == os.path.join(dirs[0], "6.8-rc1.tbl")
+    assert os.listdir(dirs[1]) == []  # The vendored tables are left alone
+    syscalls.TABLES.clear()
+    assert load("6.8-rc1", dirs) == expected  # Read back from the cache
+
+def test_seed_from_kernel_tree(tmp_path, dirs):
+    table = tmp_path / "linux" / syscalls.KERNEL_TREE_TABLE
+    table.parent.mkdir(parents=True)
+    table.write_text(TBL)
+    syscalls.seed("6.9", str(tmp_path / "linux"), cache_dir=dirs[0])
+    assert syscalls.cached_versions(dirs) == ["6.9"]
+
+def test_seed_without_system_calls(tmp_path, dirs):
+    source = tmp_path / "empty.tbl"
+    source.write_text("# nothing\n")
+    with pytest.raises(ValueError):
+        syscalls.seed("6.9", str(source), cache_dir=dirs[0])
+
+def test_offline_falls_back_to_newest_table(dirs, capsys):
+    cache_dir, tables_dir = dirs
+    syscalls.save_table("6.1", {0: "read"}, "vendored", tables_dir)
+    syscalls.save_table("6.8-rc1", {0: "read", 1: "write"}, "test", cache_dir)
+    syscalls.save_table("5.15", {0: "old"}, "test", cache_dir)
+    syscalls.TABLES.clear()
+
+    assert syscalls.cached_versions(dirs) == ["5.15", "6.1", "6.8-rc1"]
+    assert load("6.10", dirs) == {0: "read", 1: "write"}
+    assert "using the table of Linux 6.8-rc1" in capsys.readouterr().err
+    assert not os.path.exists(syscalls.table_path("6.10", cache_dir))  # The fallback is not cached under the missing version
+
+def test_cache_searched_before_vendored_tables(dirs):
+    cache_dir, tables_dir = dirs
+    syscalls.save_table("6.1", {0: "vendored"}, "test", tables_dir)
+    syscalls.save_table("6.1", {0: "seeded"}, "test", cache_dir)
+    syscalls.TABLES.clear()
+    assert load("6.1", dirs) == {0: "seeded"}
+
+def test_no_table_at_all(dirs):
+    with pytest.raises(RuntimeError, match="seed one"):
+        load("6.1", dirs)
+
+def test_download_failure_falls_back(dirs, monkeypatch):
+    def failing_download(kernel_version):
+        raise RuntimeError("Failed to fetch syscall_64.tbl: no network")
+
+    monkeypatch.setattr(syscalls, "download", failing_download)
+    syscalls.save_table("6.1", {0: "read"}, "vendored", dirs[1])
+    syscalls.TABLES.clear()
+    assert load("6.2", dirs, offline=False) == {0: "read"}
+
+def test_vendored_table():
+    with open(syscalls.table_path(syscalls.DEFAULT_VERSION, syscalls.TABLES_DIR)) as f:
+        table = syscalls.parse_table(f.read())
+    assert table[0] == "read" and table[60] == "exit" and table[230] == "clock_nanosleep"
+
+@pytest.mark.parametrize("older, newer", [("6.1", "6.8-rc1"), ("6.8-rc1", "6.8"), ("6.8", "6.10"), ("5.15.100", "6.1")])
+def test_version_key(older, newer):
+    assert syscalls.version_key(older) < syscalls.version_key(newer)
@@ -0,0 +1,104 @@
+import threading
+import time
+
+import getDataESXi
+
+"""
+Local stand-in for the ESXi host and the Linux VMs, to test getDataESXi.py without hardware
+(python getDataESXi.py --fake).
+
+It answers the vim-cmd power commands, powers the unikernel VMs off by themselves at the end of their
+run (like cyclictest -D exiting), accepts SSH commands on a Linux address only while one of its VMs
+is on, reports the CPU affinity of the VMs (vim-cmd vmsvc/get.config), and checks that VMs sharing a
+host core or an SSH address never run at the same time, and that a test VM without an affinity never runs next to another one.
+"""
+
+RUN_TIME = 0.5  # Seconds of a simulated cyclictest run
+POWER_DELAY = 0.1  # Seconds for a power state change to be visible
+
+# Timing of the orchestrator against the fake host
+TIMING = {"test_duration": RUN_TIME, "test_margin": 2, "poll_interval": 0.05, "power_timeout": 2, "boot_timeout": 2}
+
+# Address of the VMs that accept SSH commands
+VM_HOSTS = {vm_id: getDataESXi.LINUX_HOST for vm_id in getDataESXi.LINUX_VMS}
+VM_HOSTS[getDataESXi.STRESS_VMS[0]] = getDataESXi.STRESS1_HOST
+VM_HOSTS[getDataESXi.STRESS_VMS[1]] = getDataESXi.STRESS2_HOST
+
+UNIKERNEL_VMS = set(getDataESXi.NANOS_VMS + getDataESXi.OSV_VMS + getDataESXi.APPBOX_VMS)
+TEST_VMS = UNIKERNEL_VMS | set(getDataESXi.LINUX_VMS)
+
+# CPU affinity configured on the fake host (one core per interval); the AppBox VMs have none, so they run alone
+VM_CORES = {}
+for vms in (getDataESXi.NANOS_VMS, getDataESXi.OSV_VMS, getDataESXi.LINUX_VMS):
+    VM_CORES.update({vm_id: {core} for vm_id, core in zip(vms, (2, 3, 4))})
+
+class FakeESXiHost:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.powered_on = {}  # VM -> time of power.on
+        self.max_running = 0
+        self.conflicts = []  # (VM, VM) pairs sharing a core or an address while both were on
+        self.commands = 0
+
+    def power_state(self, vm_id):
+        started = self.powered_on.get(vm_id)
+        if started is None:
+            return False
+        elapsed = time.monotonic() - started
+        if vm_id in UNIKERNEL_VMS and elapsed > POWER_DELAY + RUN_TIME:
+            del self.powered_on[vm_id]  # The run is over, the unikernel exits
+            return False
+        return elapsed > POWER_DELAY
+
+    def execute(self, host, command):
+        with self.lock:
+            self.commands += 1
+            words = command.split()
+            if host == getDataESXi.ESXI_HOST and words[0] == "vim-cmd":
+                operation, vm_id = words[1].split("/")[1], int(words[2])
+                if operation == "power.getstate":
+                    return "Retrieved runtime info\nPowered " + ("on" if self.power_state(vm_id) else "off")
+                if operation == "get.config":
+                    if vm_id not in VM_CORES:
+                        return "(vim.vm.ConfigInfo) {\n   cpuAffinity = (vim.vm.AffinityInfo) null,\n}"
+                    cores = ", ".join(str(core) for core in sorted(VM_CORES[vm_id]))
+                    return f"(vim.vm.ConfigInfo) {{\n   cpuAffinity = (vim.vm.AffinityInfo) {{\n      affinitySet = (int) [\n         {cores}\n      ]\n   }},\n}}"
+                if operation == "power.on":
+                    self.check_cores(vm_id)
+                    self.powered_on[vm_id] = time.monotonic()
+                    return f"Powering on VM:"
+                if operation == "power.off":
+                    self.powered_on.pop(vm_id, None)
+                    return f"Powering off VM:"
+
+            if not any(VM_HOSTS.get(vm_id) == host and self.power_state(vm_id) for vm_id in list(self.powered_on)):
+                raise ConnectionError(f"{host} is not reachable")
+
+        if words[0] == "./cyclictest":
+            time.sleep(RUN_TIME)
+        return ""
+
+    def check_cores(self, vm_id):
+        for other in self.powered_on:
+            if vm_id not in TEST_VMS or other not in TEST_VMS:
+                continue  # The stress VMs run next to the tests
+            if vm_id not in VM_CORES or other not in VM_CORES or VM_CORES[vm_id] & VM_CORES[other]:
+                self.conflicts.append((vm_id, other))
+            elif vm_id in VM_HOSTS and VM_HOSTS.get(vm_id) == VM_HOSTS.get(other):
+                self.conflicts.append((vm_id, other))  # Two Linux VMs on the same address
+        self.max_running = max(self.max_running, len(self.powered_on) + 1)
+
+    def report(self):
+        return f"Fake ESXi: {self.commands} commands, up to {self.max_running} VMs on at once, core conflicts: {self.conflicts or 'none'}"
+
+host = FakeESXiHost()
+
+"""
+Fake SSH session with the interface of getDataESXi.SSHSession.
+"""
+class FakeSession(getDataESXi.SSHSession):
+    def run_blocking(self, command, retry=False):
+        return host.execute(self.host, command)
+
+    def close(self):
+        pass
@@ -1,4 +1,9 @@
-import paramiko
+import argparse
+import asyncio
+import json
+import os
+import re
+import threading
 import time
 
 # SSH and ESXi Configuration
@@ -12,90 +17,363 @@ STRESS2_HOST = "10.3.3.196"
 SSH_USER = "samuel"
 SSH_PASSWORD = "password"
 
-# VM Groups
+# VM Groups (one VM per interval: 10000, 1000 and 100 us)
 NANOS_VMS = [100, 101, 102]
 OSV_VMS = [103, 104, 105]
 APPBOX_VMS = [106, 107, 108]
 LINUX_VMS = [109, 110, 111]
 STRESS_VMS = [87, 88]
+INTERVALS = [10000, 1000, 100]
+
+# Host cores each VM is pinned to: read from the CPU scheduling affinity of the VMs on ESXi (sched.cpu.affinity),
+# or from an --affinity file. VMs with disjoint cores run at the same time; a VM without a known affinity runs alone.
+AFFINITY = re.compile(r'cpuAffinity = \(vim\.vm\.AffinityInfo\) \{\s*affinitySet = \(int\) \[([\d,\s]*)\]')  # vim-cmd vmsvc/get.config
 
 SLEEP_4H = 4 * 60 * 60  # 4 hours in seconds
-SLEEP_10S = 10  # 10 seconds
 
-"""Executes a command via SSH"""
-def execute_ssh_command(host, username, password, command):
-    try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(host, username=username, password=password)
-        stdin, stdout, stderr = ssh.exec_command(command)
-        output = stdout.read().decode().strip()
-        ssh.close()
-        return output
-    except Exception as e:
-        print(f"Error executing SSH command on {host}: {e}")
-        return None
-
-"""Powers off a virtual machine on ESXi."""
-def power_off_vm(vm_id):
-    command = f"vim-cmd vmsvc/power.off {vm_id}"
-    execute_ssh_command(ESXI_HOST, ESXI_USER, ESXI_PASSWORD, command)
-
-"""Powers off and then powers on a virtual machine on ESXi."""
-def power_on_vm(vm_id):
-    power_off_vm(vm_id)
-    time.sleep(10)
-    command = f"vim-cmd vmsvc/power.on {vm_id}"
-    execute_ssh_command(ESXI_HOST, ESXI_USER, ESXI_PASSWORD, command)
-
-"""Turns on VMs, waits for a duration, then turns them off."""
-def run_vm_test(vm_list, duration):
-    for vm_id in vm_list:
-        power_on_vm(vm_id)
-        time.sleep(duration)
-        power_off_vm(vm_id)
-
-"""Runs a command on a Linux VM and waits for completion."""
-def run_linux(vm_id, ip_address, command, sleep_time, turn_off=False):
-    power_on_vm(vm_id)
-    execute_ssh_command(ip_address, SSH_USER, SSH_PASSWORD, command)
-    time.sleep(sleep_time)
-
-    if turn_off:
-        power_off_vm(vm_id)
-
-"""Runs cyclictest on a Linux VM and waits for completion."""
-def run_linux_test(vm_id, interval):
-    command = f"./cyclictest -D 4h -v -i {interval}"
-    run_linux(vm_id, LINUX_HOST, command, SLEEP_4H, turn_off=True)
-
-"""Runs a stress test on a VM."""
-def run_stress_test(vm_id, ip_address):
-    command = "stress -c 10 -m 24 --vm-bytes 256M"
-    run_linux(vm_id, ip_address, command, SLEEP_10S, turn_off=False)
+TEST_DURATION = SLEEP_4H  # Duration of each cyclictest run
+TEST_MARGIN = 10 * 60  # A VM still powered on this long after the end of its run is powered off
+POLL_INTERVAL = 30  # Seconds between two power state checks
+POWER_TIMEOUT = 120  # Seconds to reach a power state after power.on / power.off
+BOOT_TIMEOUT = 300  # Seconds for a Linux VM to accept SSH connections after power.on
+
+STATE_FILE = "esxi_state.json"  # Tests already completed, to resume the matrix after a crash
+
+"""
+Persistent SSH session to a host. The connection is opened once and reused by every command
+(each command gets its own channel, so commands can run concurrently); it is reopened by the next command if it fails.
+Only read-only commands ({retry}) are run again after a connection error: a command that changes the state of a
+host (power.on, starting cyclictest or stress) may have run before the error, so it is never repeated.
+Sessions belong to their SessionPool, which closes them.
+"""
+class SSHSession:
+    def __init__(self, host, username, password):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.client = None
+        self.connect_lock = threading.Lock()
+
+    def connect(self):
+        import paramiko  # Only needed for real hosts (not with --fake)
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(self.host, username=self.username, password=self.password)
+        return client
+
+    """Executes a command and returns its output (blocking)."""
+    def run_blocking(self, command, retry=False):
+        attempts = 2 if retry else 1
+        for attempt in range(attempts):
+            client = None
+            try:
+                with self.connect_lock:
+                    if self.client is None:
+                        self.client = self.connect()
+                    client = self.client
+                stdin, stdout, stderr = client.exec_command(command)
+                return stdout.read().decode().strip()
+            except Exception as e:
+                if client is not None:
+                    self.disconnect(client)
+                if attempt == attempts - 1:
+                    raise ConnectionError(f"Error executing SSH command on {self.host}: {e}") from e
+
+    """Executes a command without blocking the event loop."""
+    async def run(self, command, retry=False):
+        return await asyncio.to_thread(self.run_blocking, command, retry)
+
+    """Drops a broken connection (unless another command already replaced it), so the next command reconnects."""
+    def disconnect(self, client):
+        with self.connect_lock:
+            if self.client is not client:
+                return
+            self.client = None
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    def close(self):
+        with self.connect_lock:
+            if self.client is not None:
+                try:
+                    self.client.close()
+                except Exception:
+                    pass
+                self.client = None
+
+"""
+One persistent session per (host, user), created on first use.
+"""
+class SessionPool:
+    def __init__(self, session_factory=SSHSession):
+        self.session_factory = session_factory
+        self.sessions = {}
+
+    def get(self, host, username, password):
+        key = (host, username)
+        if key not in self.sessions:
+            self.sessions[key] = self.session_factory(host, username, password)
+        return self.sessions[key]
+
+    def close_all(self):
+        for session in self.sessions.values():
+            session.close()
+        self.sessions.clear()
+
+"""
+Power management of the VMs of an ESXi host (vim-cmd), polling the power state instead of sleeping.
+"""
+class ESXi:
+    def __init__(self, session, poll_interval=POLL_INTERVAL, power_timeout=POWER_TIMEOUT):
+        self.session = session
+        self.poll_interval = poll_interval
+        self.power_timeout = power_timeout
+
+    """Returns True if the VM is powered on."""
+    async def is_powered_on(self, vm_id):
+        output = await self.session.run(f"vim-cmd vmsvc/power.getstate {vm_id}", retry=True)
+        return "Powered on" in output
+
+    """Returns the host cores the VM is pinned to (its CPU scheduling affinity), or None if it has no affinity."""
+    async def cpu_affinity(self, vm_id):
+        output = await self.session.run(f"vim-cmd vmsvc/get.config {vm_id}", retry=True)
+        match = AFFINITY.search(output)
+        if match is None:
+            return None
+        cores = {int(core) for core in match.group(1).replace(",", " ").split()}
+        return cores or None
+
+    """Waits until the VM is powered on ({on}) or off, up to {timeout} seconds. Returns True if reached."""
+    async def wait_power_state(self, vm_id, on, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            if await self.is_powered_on(vm_id) == on:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(min(self.poll_interval, max(deadline - time.monotonic(), 0)))
+
+    """Powers off a virtual machine."""
+    async def power_off(self, vm_id):
+        if await self.is_powered_on(vm_id):
+            await self.session.run(f"vim-cmd vmsvc/power.off {vm_id}")
+            if not await self.wait_power_state(vm_id, False, self.power_timeout):
+                raise TimeoutError(f"VM {vm_id} did not power off")
+
+    """Powers on a virtual machine (powered off first if it is already on, so it boots fresh)."""
+    async def power_on(self, vm_id):
+        await self.power_off(vm_id)
+        await self.session.run(f"vim-cmd vmsvc/power.on {vm_id}")
+        if not await self.wait_power_state(vm_id, True, self.power_timeout):
+            raise TimeoutError(f"VM {vm_id} did not power on")
+
+"""
+Tests already completed, saved after each test so a crashed matrix resumes where it stopped.
+"""
+class MatrixState:
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        self.completed = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.completed = set(json.load(f)["completed"])
+
+    def mark_completed(self, key):
+        self.completed.add(key)
+        if self.path:
+            temporary_path = self.path + ".tmp"
+            with open(temporary_path, "w") as f:
+                json.dump({"completed": sorted(self.completed)}, f, indent=4)
+            os.replace(temporary_path, self.path)
+
+"""
+Test of the matrix: a VM running cyclictest with an interval, with or without stress.
+"""
+class Test:
+    def __init__(self, system, vm_id, interval, stress, linux=False):
+        self.system = system
+        self.vm_id = vm_id
+        self.interval = interval
+        self.stress = stress
+        self.linux = linux
+        self.cores = None  # Host cores of the VM (Orchestrator.resolve_affinity), None if unknown: the test runs alone
+        self.key = f"{'Stress' if stress else 'NoStress'}/{system}/{interval}"
+
+"""
+Builds the test matrix: every system and interval, without and with stress.
+"""
+def build_matrix():
+    tests = []
+    for stress in (False, True):
+        for system, vms in (("Nanos", NANOS_VMS), ("OSv", OSV_VMS), ("AppBox", APPBOX_VMS), ("Ubuntu", LINUX_VMS)):
+            for vm_id, interval in zip(vms, INTERVALS):
+                tests.append(Test(system, vm_id, interval, stress, linux=system == "Ubuntu"))
+    return tests
+
+"""
+Reads an affinity file: {"<vm_id>": [cores], ...}.
+"""
+def load_affinity(path):
+    with open(path) as f:
+        return {int(vm_id): set(cores) for vm_id, cores in json.load(f).items()}
+
+class Orchestrator:
+    def __init__(self, pool, state, test_duration=TEST_DURATION, test_margin=TEST_MARGIN,
+                 poll_interval=POLL_INTERVAL, power_timeout=POWER_TIMEOUT, boot_timeout=BOOT_TIMEOUT, affinity=None):
+        self.pool = pool
+        self.state = state
+        self.affinity = affinity  # Cores of each VM given by an --affinity file (None: read from the host)
+        self.esxi = ESXi(pool.get(ESXI_HOST, ESXI_USER, ESXI_PASSWORD), poll_interval, power_timeout)
+        self.test_duration = test_duration
+        self.test_margin = test_margin
+        self.poll_interval = poll_interval
+        self.boot_timeout = boot_timeout
+
+    """Runs a unikernel test: the VM runs cyclictest at boot and powers off when it ends."""
+    async def run_unikernel(self, test):
+        await self.esxi.power_on(test.vm_id)
+        await self.esxi.wait_power_state(test.vm_id, False, self.test_duration + self.test_margin)
+        await self.esxi.power_off(test.vm_id)
+
+    """
+    Sets the cores of every test: from the affinity file if there is one, otherwise from the affinity of its VM on the host.
+    A VM whose affinity is unknown (not configured, or the query failed) keeps None and runs alone.
+    """
+    async def resolve_affinity(self, tests):
+        async def cores(vm_id):
+            if self.affinity is not None:
+                return self.affinity.get(vm_id)
+            try:
+                return await self.esxi.cpu_affinity(vm_id)
+            except ConnectionError as e:
+                print(f"Affinity of VM {vm_id} unknown ({e}), its tests run alone")
+                return None
+
+        vm_ids = sorted({test.vm_id for test in tests})
+        affinity = dict(zip(vm_ids, await asyncio.gather(*(cores(vm_id) for vm_id in vm_ids))))
+        for test in tests:
+            test.cores = affinity[test.vm_id]
+
+    """Waits until a Linux VM accepts SSH commands."""
+    async def wait_ssh(self, session):
+        deadline = time.monotonic() + self.boot_timeout
+        while True:
+            try:
+                await session.run("true", retry=True)
+                return
+            except ConnectionError:
+                if time.monotonic() >= deadline:
+                    raise
+                await asyncio.sleep(self.poll_interval)
+
+    """Runs cyclictest on a Linux VM and waits for its completion."""
+    async def run_linux(self, test):
+        await self.esxi.power_on(test.vm_id)
+        session = self.pool.get(LINUX_HOST, SSH_USER, SSH_PASSWORD)
+        await self.wait_ssh(session)
+        await session.run(f"./cyclictest -D 4h -v -i {test.interval}")
+        # The session is shared (the next Linux VM and a stress VM use the same address) and only the pool closes it:
+        # once this VM is off, the next command finds the connection broken and reconnects
+        await self.esxi.power_off(test.vm_id)
+
+    """Starts the stress VMs (stress runs in the background until the VMs are powered off)."""
+    async def start_stress(self):
+        async def start(vm_id, host):
+            await self.esxi.power_on(vm_id)
+            session = self.pool.get(host, SSH_USER, SSH_PASSWORD)
+            await self.wait_ssh(session)
+            await session.run("nohup stress -c 10 -m 24 --vm-bytes 256M > /dev/null 2>&1 &")
+        await asyncio.gather(start(STRESS_VMS[0], STRESS1_HOST), start(STRESS_VMS[1], STRESS2_HOST))
+
+    async def stop_stress(self):
+        await asyncio.gather(*(self.esxi.power_off(vm_id) for vm_id in STRESS_VMS))
+
+    async def run_test(self, test):
+        cores = sorted(test.cores) if test.cores is not None else "unknown, alone"
+        print(f"{time.strftime('%H:%M:%S')} Start: {test.key} (VM {test.vm_id}, cores {cores})")
+        if test.linux:
+            await self.run_linux(test)
+        else:
+            await self.run_unikernel(test)
+        self.state.mark_completed(test.key)
+        print(f"{time.strftime('%H:%M:%S')} Done: {test.key}")
+
+    """
+    Runs tests concurrently: a test starts as soon as none of its cores is used by a running test.
+    Linux tests share the same address, so only one of them runs at a time. A test whose cores are unknown
+    runs alone: it waits for the running tests to end, and the tests after it wait for it.
+    """
+    async def run_tests(self, tests):
+        pending = [test for test in tests if test.key not in self.state.completed]
+        running = {}
+
+        while pending or running:
+            busy = set().union(*(test.cores or set() for test in running.values()))
+            linux_running = any(test.linux for test in running.values())
+            for test in list(pending):
+                if any(other.cores is None for other in running.values()):
+                    break
+                if test.cores is None:
+                    if running:
+                        break  # Started once the running tests end
+                elif test.cores & busy or (test.linux and linux_running):
+                    continue
+                running[asyncio.create_task(self.run_test(test))] = test
+                busy |= test.cores or set()
+                linux_running |= test.linux
+                pending.remove(test)
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                test = running.pop(task)
+                try:
+                    task.result()
+                except Exception as e:
+                    print(f"Error in {test.key}: {e} (it runs again when the matrix is resumed)")
+
+    """Runs the tests without stress, then the tests with stress, skipping the completed ones."""
+    async def run_matrix(self, tests):
+        await self.resolve_affinity(tests)
+        await self.run_tests([test for test in tests if not test.stress])
+
+        stress_tests = [test for test in tests if test.stress and test.key not in self.state.completed]
+        if stress_tests:
+            await self.start_stress()
+            try:
+                await self.run_tests(stress_tests)
+            finally:
+                await self.stop_stress()
 
 """Main function to orchestrate VM tests."""
 def main():
-    # Tests without stress
-    run_vm_test(NANOS_VMS, SLEEP_4H)
-    run_vm_test(OSV_VMS, SLEEP_4H)
-    run_vm_test(APPBOX_VMS, SLEEP_4H)
-
-    run_linux_test(LINUX_VMS[0], 10000)
-    run_linux_test(LINUX_VMS[1], 1000)
-    run_linux_test(LINUX_VMS[2], 100)
-
-    # Tests with stress
-    run_stress_test(STRESS_VMS[0], STRESS1_HOST)
-    run_stress_test(STRESS_VMS[1], STRESS2_HOST)
-    
-    run_vm_test(NANOS_VMS, SLEEP_4H)
-    run_vm_test(OSV_VMS, SLEEP_4H)
-    run_vm_test(APPBOX_VMS, SLEEP_4H)
-
-    run_linux_test(LINUX_VMS[0], 10000)
-    run_linux_test(LINUX_VMS[1], 1000)
-    run_linux_test(LINUX_VMS[2], 100)
+    parser = argparse.ArgumentParser(description="Run the cyclictest matrix on ESXi.")
+    parser.add_argument("--state", default=STATE_FILE, help=f"File of the completed tests, to resume the matrix (default: {STATE_FILE}).")
+    parser.add_argument("--restart", action="store_true", help="Ignore the completed tests and run the whole matrix.")
+    parser.add_argument("--affinity", default=None, help='JSON file of the host cores of each VM, {"<vm_id>": [cores]} (default: read from the VMs on ESXi).')
+    parser.add_argument("--fake", action="store_true", help="Run against a local fake ESXi host (fakeESXi.py) with short runs.")
+    args = parser.parse_args()
+    affinity = load_affinity(args.affinity) if args.affinity else None
+
+    if args.restart and os.path.exists(args.state):
+        os.remove(args.state)
+    state = MatrixState(args.state)
+
+    if args.fake:
+        import fakeESXi
+        pool = SessionPool(fakeESXi.FakeSession)
+        orchestrator = Orchestrator(pool, state, affinity=affinity, **fakeESXi.TIMING)
+    else:
+        pool = SessionPool()
+        orchestrator = Orchestrator(pool, state, affinity=affinity)
+
+    try:
+        asyncio.run(orchestrator.run_matrix(build_matrix()))
+    finally:
+        pool.close_all()
+        if args.fake:
+            print(fakeESXi.host.report())
 
 if __name__ == "__main__":
     main()
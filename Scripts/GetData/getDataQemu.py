@@ -0,0 +1,394 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+"""
+Runs the cyclictest matrix on QEMU/KVM from a declarative description (qemuMatrix.json, or YAML if PyYAML
+is installed) instead of the copy-pasted blocks of getDataQemu.sh.
+
+The description lists the systems (build commands, QEMU command and output name), the intervals, the stress
+modes and the isolated host cores. Every system x interval x stress combination is a run; runs are pinned to
+one isolated core each (taskset) with a real-time priority (chrt) and run at the same time as long as they do
+not share a core. Runs of an "exclusive" system (image rebuilt in place for each interval) never overlap.
+Each run is started in its own process group, so a timeout kills the VM and everything it started (and nothing else).
+The serial output is written to <data_dir>/<output>, the RAW layout clean_data expects (with "capture", as a
+binary capture converted on the fly by live.py, about 3x less data written than the text). For systems with
+"stats", procSampler.py samples the CPU/memory usage of the VM on the housekeeping core ("stats_core") into
+the CPU and Memory datasets under "stats_dir".
+
+    Usage: python getDataQemu.py [qemuMatrix.json] [--dry-run] [--force] [--only SYSTEM ...] [--no-checks]
+"""
+
+DESCRIPTION_FILE = "qemuMatrix.json"
+STRESS_NAMES = {False: "NoStress", True: "Stress"}
+
+TIMEOUT = 4 * 60 * 60 + 10  # Seconds before a run is killed (4h and 10s)
+WAIT_BETWEEN_TESTS = 10     # Seconds a core rests between two runs
+PRIORITY = 99               # SCHED_FIFO priority of the runs (0: no real-time priority)
+KILL_GRACE = 10             # Seconds between SIGTERM and SIGKILL of a process group
+BOOT_WAIT = 60              # Seconds for a Linux VM to boot before the SSH command
+STATS_RATE = 100            # CPU/memory samples per second (procSampler.py)
+STATS_CORE = 0              # Host core of the sampler, live.py and the builds (a housekeeping core, not one of the isolated cores)
+SAMPLER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "procSampler.py")
+LIVE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Plots", "live.py")
+CAPTURE_EXTENSION = ".cap"  # Binary capture of the samples (Plots/capture.py), written instead of the text log with "capture"
+
+# Ports of a run are offset by its slot (index of its core), so parallel VMs do not collide
+VNC_BASE = 10
+GDB_BASE = 1234
+SSH_BASE = 2230
+
+PARTIAL_APPENDIX_FILE = ".part"  # Log of a run in progress
+
+SSH_OPTIONS = ["-o", "StrictHostKeyChecking=no", "-o", "UserKnownHostsFile=/dev/null"]
+
+"""
+Loads a matrix description (JSON, or YAML for .yaml/.yml files).
+"""
+def load_description(path):
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml  # Only needed for YAML descriptions
+            return yaml.safe_load(f)
+        return json.load(f)
+
+"""
+Replaces the {placeholders} of a string or of every string of a list.
+"""
+def expand_value(value, fields):
+    if isinstance(value, list):
+        return [expand_value(item, fields) for item in value]
+    return value.format(**fields)
+
+"""
+Run of the matrix: a system with an interval, with or without stress.
+"""
+class Run:
+    def __init__(self, system, spec, interval, stress, data_dir, capture=False):
+        self.system = system
+        self.spec = spec
+        self.interval = interval
+        self.stress = stress
+        self.exclusive = spec.get("exclusive", False)
+        self.capture = capture
+        self.key = f"{STRESS_NAMES[stress]}/{system}/{interval}"
+        self.log_path = os.path.join(data_dir, spec["output"].format(**self.fields()))
+        if capture:
+            self.log_path = os.path.splitext(self.log_path)[0] + CAPTURE_EXTENSION
+
+    """Values of the placeholders of the run on the core of {slot}."""
+    def fields(self, slot=0, core=None):
+        return {
+            "system": self.system,
+            "interval": self.interval,
+            "stress": STRESS_NAMES[self.stress],
+            "core": core,
+            "vnc": VNC_BASE + slot,
+            "gdb_port": GDB_BASE + slot,
+            "ssh_port": SSH_BASE + slot,
+        }
+
+"""
+Expands the description into runs: every system and interval, without stress first, then with stress.
+"""
+def expand(description, only=None):
+    runs = []
+    for stress in description.get("stress", [False, True]):
+        for system, spec in description["systems"].items():
+            if only and system not in only:
+                continue
+            for interval in spec.get("intervals", description["intervals"]):
+                capture = spec.get("capture", description.get("capture", False))
+                runs.append(Run(system, spec, interval, stress, description["data_dir"], capture))
+    return runs
+
+"""
+Returns the isolated cores of the host (isolcpus), or None if unknown.
+"""
+def isolated_cores():
+    try:
+        with open("/sys/devices/system/cpu/isolated") as f:
+            text = f.read().strip()
+    except OSError:
+        return None
+    cores = set()
+    for part in filter(None, text.split(",")):
+        first, _, last = part.partition("-")
+        cores.update(range(int(first), int(last or first) + 1))
+    return cores
+
+"""
+Checks that hyperthreading is disabled and that the cores of the runs are isolated.
+"""
+def check_host(cores):
+    output = subprocess.run(["lscpu"], capture_output=True, text=True).stdout
+    fields = dict(line.split(":", 1) for line in output.splitlines() if ":" in line)
+    threads_per_core = int(fields.get("Thread(s) per core", "1").strip())
+    if threads_per_core != 1:
+        raise SystemExit(f"Error: hyperthreading is enabled ({threads_per_core} threads per core)")
+
+    isolated = isolated_cores()
+    if isolated is not None and not set(cores) <= isolated:
+        print(f"Warning: cores {sorted(set(cores) - isolated)} are not isolated (isolated: {sorted(isolated)})")
+
+"""
+Command prefix that pins a process to {cores} with the real-time {priority}.
+"""
+def pinned(command, cores, priority):
+    prefix = ["taskset", "-c", ",".join(str(core) for core in cores)]
+    if priority:
+        prefix += ["chrt", "-f", str(priority)]
+    return prefix + command
+
+"""
+Kills the process group of {process}: SIGTERM, then SIGKILL if it is still running after {grace} seconds.
+"""
+async def kill_group(process, grace=KILL_GRACE):
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(process.wait(), grace)
+            return
+        except asyncio.TimeoutError:
+            pass
+
+"""
+Waits for {process} up to {timeout} seconds, killing its process group on timeout. Returns True if it timed out.
+"""
+async def wait_or_kill(process, timeout):
+    try:
+        await asyncio.wait_for(process.wait(), timeout)
+        return False
+    except asyncio.TimeoutError:
+        await kill_group(process)
+        return True
+    except asyncio.CancelledError:  # Matrix interrupted
+        await kill_group(process)
+        raise
+
+class MatrixRunner:
+    def __init__(self, description, dry_run=False, force=False):
+        self.description = description
+        self.dry_run = dry_run
+        self.force = force
+        self.cores = list(description["cores"])
+        self.timeout = description.get("timeout", TIMEOUT)
+        self.wait_between_tests = description.get("wait_between_tests", WAIT_BETWEEN_TESTS)
+        self.priority = description.get("priority", PRIORITY)
+        self.ssh_user = description.get("ssh_user", "")
+        self.prepared = set()  # Systems whose "prepare" commands already ran
+
+    def log(self, message):
+        print(f"{time.strftime('%H:%M:%S')} {message}", flush=True)
+
+    """Starts a process in its own process group (stdout/stderr to {output}, a file object)."""
+    async def start(self, command, output):
+        return await asyncio.create_subprocess_exec(*command, stdin=subprocess.DEVNULL, stdout=output,
+                                                    stderr=subprocess.STDOUT, start_new_session=True)
+
+    """Command prefix that pins a helper process (build, sampler, live.py) to the housekeeping core, away from the runs."""
+    def housekeeping(self, command):
+        return pinned(command, [self.description.get("stats_core", STATS_CORE)], 0)
+
+    """
+    Runs the shell commands of a build step in the build directory of the system, on the housekeeping core
+    (a build runs while the runs of other systems are measuring on the isolated cores).
+    """
+    async def shell(self, commands, cwd):
+        for command in commands:
+            command = self.housekeeping(["sh", "-c", command])
+            if self.dry_run:
+                print(f"    $ {subprocess.list2cmdline(command)}")
+                continue
+            process = await asyncio.create_subprocess_exec(*command, cwd=cwd, start_new_session=True)
+            if await process.wait() != 0:
+                raise RuntimeError(f"'{command[-1]}' failed with exit code {process.returncode}")
+
+    async def build(self, run, fields):
+        cwd = run.spec.get("build_dir")
+        if run.system not in self.prepared:
+            await self.shell(expand_value(run.spec.get("prepare", []), fields), cwd)
+            self.prepared.add(run.system)
+        await self.shell(expand_value(run.spec.get("build", []), fields), cwd)
+
+    """True if the CPU/memory usage of the run is sampled (one run per system and stress: the CPU and Memory datasets have no interval)."""
+    def is_sampled(self, run):
+        if not run.spec.get("stats"):
+            return False
+        return run.interval == run.spec.get("stats_interval", run.spec.get("intervals", self.description["intervals"])[0])
+
+    """Command of the /proc sampler of the VM {pid}, on the housekeeping core."""
+    def sampler_command(self, run, pid):
+        command = [sys.executable, SAMPLER, "--pid", str(pid), "--source", run.system, "--data", self.description["stats_dir"],
+                   "--environment", "QEMU", "--rate", str(self.description.get("stats_rate", STATS_RATE))]
+        if run.stress:
+            command.append("--stress")
+        return self.housekeeping(command)
+
+    """
+    Opens the log of a run: a file descriptor where the VM writes its output. With "capture", the output goes
+    through a pipe to live.py, which writes the samples to a binary capture instead of the text log.
+    Returns the descriptor and the capture process (None without capture).
+    """
+    async def open_log(self, run, partial_path):
+        if not run.capture:
+            return os.open(partial_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644), None
+        read_fd, write_fd = os.pipe()
+        with open(run.log_path + ".live.log", "wb") as live_log:  # Reports of live.py (not .txt, so clean_data ignores it)
+            command = self.housekeeping([sys.executable, LIVE, "-", "--capture", partial_path, "--capture-only"])
+            capture = await asyncio.create_subprocess_exec(*command, stdin=read_fd, stdout=live_log, stderr=subprocess.STDOUT,
+                                                           start_new_session=True)  # Not killed with the VM: it ends with its output
+        os.close(read_fd)
+        return write_fd, capture
+
+    """Boots a Linux VM and runs the SSH command, whose output is the log of the run."""
+    async def run_linux(self, run, command, fields, log_file):
+        with open(run.log_path + ".vm.log", "wb") as vm_log:  # Not .txt, so clean_data ignores it
+            vm = await self.start(command, vm_log)
+        try:
+            await asyncio.sleep(run.spec.get("boot_wait", BOOT_WAIT))
+            ssh = ["ssh", *SSH_OPTIONS, "-p", str(fields["ssh_port"]), f"{self.ssh_user}@127.0.0.1",
+                   expand_value(run.spec["ssh_command"], fields)]
+            process = await self.start(ssh, log_file)
+            return vm, await wait_or_kill(process, self.timeout)
+        finally:
+            await kill_group(vm)
+
+    async def execute(self, run, slot, core):
+        fields = run.fields(slot, core)
+        command = pinned(expand_value(run.spec["command"], fields), [core], self.priority)
+        self.log(f"Start: {run.key} (core {core}) -> {run.log_path}")
+        if self.dry_run:
+            await self.build(run, fields)
+            print(f"    $ {subprocess.list2cmdline(command)}")
+            if self.is_sampled(run):
+                print(f"    $ {subprocess.list2cmdline(self.sampler_command(run, '<pid>'))}")
+            return
+
+        await self.build(run, fields)
+        os.makedirs(os.path.dirname(run.log_path), exist_ok=True)
+        start = time.monotonic()
+        # The log gets its final name only when the run ends, so an interrupted run is not taken for a finished one
+        partial_path = run.log_path + PARTIAL_APPENDIX_FILE
+        log_file, capture = await self.open_log(run, partial_path)
+        try:
+            if "ssh_command" in run.spec:
+                process, timed_out = await self.run_linux(run, command, fields, log_file)
+            else:
+                process = await self.start(command, log_file)
+                sampler = await self.start(self.sampler_command(run, process.pid), None) if self.is_sampled(run) else None
+                timed_out = await wait_or_kill(process, self.timeout)
+                if sampler is not None:
+                    await sampler.wait()  # Ends with the VM, after writing the CPU and Memory datasets
+        finally:
+            os.close(log_file)
+            if capture is not None:
+                await capture.wait()  # Ends when the output of the VM is closed, after the last fsync
+        os.replace(partial_path, run.log_path)
+        status = "timeout, killed" if timed_out else f"exit code {process.returncode}"
+        self.log(f"Done: {run.key} after {time.monotonic() - start:.0f}s ({status})")
+
+    """True if the run already has a log (skipped unless --force)."""
+    def is_done(self, run):
+        return not self.force and not self.dry_run and os.path.exists(run.log_path) and os.path.getsize(run.log_path) > 0
+
+    """
+    Runs the runs concurrently: a run starts as soon as a core is free and no run of the same
+    exclusive system is running; the core rests {wait_between_tests} seconds after each run.
+    """
+    async def run_phase(self, runs):
+        pending = [run for run in runs if not self.is_done(run)]
+        free_slots = list(range(len(self.cores)))
+        running = {}
+
+        async def execute_on(run, slot):
+            try:
+                await self.execute(run, slot, self.cores[slot])
+            finally:
+                if not self.dry_run:
+                    await asyncio.sleep(self.wait_between_tests)
+
+        while pending or running:
+            busy_systems = {run.system for run, _ in running.values() if run.exclusive}
+            for run in list(pending):
+                if not free_slots:
+                    break
+                if run.exclusive and run.system in busy_systems:
+                    continue
+                slot = free_slots.pop(0)
+                running[asyncio.create_task(execute_on(run, slot))] = (run, slot)
+                if run.exclusive:
+                    busy_systems.add(run.system)
+                pending.remove(run)
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                run, slot = running.pop(task)
+                free_slots.append(slot)
+                free_slots.sort()
+                try:
+                    task.result()
+                except Exception as e:
+                    self.log(f"Error in {run.key}: {e}")
+
+    """Starts the stress VMs, pinned to their own cores, and the stress command in each one."""
+    async def start_stress(self):
+        processes = []
+        for vm in self.description.get("stress_vms", []):
+            command = pinned(vm["command"], vm["cores"], 0)
+            self.log(f"Starting stress VM on cores {vm['cores']}")
+            if self.dry_run:
+                print(f"    $ {subprocess.list2cmdline(command)}")
+                continue
+            processes.append(await self.start(command, subprocess.DEVNULL))
+        if self.dry_run:
+            return processes
+
+        await asyncio.sleep(self.description.get("boot_wait", BOOT_WAIT))
+        for vm in self.description.get("stress_vms", []):
+            ssh = ["ssh", *SSH_OPTIONS, "-p", str(vm["ssh_port"]), f"{self.ssh_user}@127.0.0.1", self.description["stress_command"]]
+            processes.append(await self.start(ssh, subprocess.DEVNULL))
+        return processes
+
+    async def run_matrix(self, runs):
+        await self.run_phase([run for run in runs if not run.stress])
+
+        stress_runs = [run for run in runs if run.stress and not self.is_done(run)]
+        if stress_runs:
+            processes = await self.start_stress()
+            try:
+                await self.run_phase(stress_runs)
+            finally:
+                for process in processes:
+                    await kill_group(process)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the cyclictest matrix on QEMU/KVM from a JSON/YAML description.")
+    parser.add_argument("description", nargs="?", default=DESCRIPTION_FILE, help=f"Matrix description (default: {DESCRIPTION_FILE}).")
+    parser.add_argument("--dry-run", action="store_true", help="Print the runs, their cores and commands without running them.")
+    parser.add_argument("--force", action="store_true", help="Run again the runs whose log already exists.")
+    parser.add_argument("--only", nargs="+", default=None, help="Run only these systems.")
+    parser.add_argument("--no-checks", action="store_true", help="Skip the hyperthreading and isolated cores checks.")
+    args = parser.parse_args()
+
+    description = load_description(args.description)
+    runs = expand(description, args.only)
+    if not args.no_checks and not args.dry_run:
+        check_host(description["cores"])
+
+    runner = MatrixRunner(description, args.dry_run, args.force)
+    try:
+        asyncio.run(runner.run_matrix(runs))
+    except KeyboardInterrupt:
+        print("Interrupted: the VMs of the running runs were killed; runs with a log are skipped when the matrix is started again")
+
+if __name__ == "__main__":
+    main()
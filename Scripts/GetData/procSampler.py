@@ -0,0 +1,163 @@
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Plots"))
+from cpu_memory import CPU_WINDOW, SAMPLE, SPILL_APPENDIX_FILE, output_paths, save_outputs
+
+"""
+Low-overhead CPU/RSS sampler of a process (the VM of a run), replacing the pidstat loop of getDataQemu.sh.
+
+Each sample reads /proc/<pid>/stat (utime + stime of every thread, in clock ticks) and /proc/<pid>/statm
+(resident pages) from descriptors opened once, with pread, so sampling forks nothing and allocates little;
+rates of 100 Hz and more are possible. Samples are packed into a fixed-size binary buffer (16 bytes per
+sample) that is flushed to a spill file when full and every {FLUSH_INTERVAL} seconds, so a killed sampler
+keeps what it collected. At the end the samples are converted to the CPU and Memory datasets by
+Plots/cpu_memory.py, with the overhead of the sampler itself (CPU time, cost per sample and of its /proc reads,
+late samples) in <source>.sampler.json, next to the CPU dataset.
+
+    Usage: python procSampler.py (--pid PID | -- command ...) --source NAME [--data DIR] [--environment ENV] [--stress]
+                                 [--rate HZ] [--cpu-window SECONDS] [--duration SECONDS]
+"""
+
+RATE = 100             # Samples per second
+BUFFER_SAMPLES = 4096  # Samples kept in memory between two flushes
+FLUSH_INTERVAL = 10    # Seconds between two flushes of the buffer to the spill file
+DATA_DIR = "../../DATA/"
+ENVIRONMENT = "QEMU"
+PROC_DIR = "/proc"
+
+class ProcSampler:
+    def __init__(self, pid, spill_path, rate=RATE, buffer_samples=BUFFER_SAMPLES, proc_dir=PROC_DIR):
+        self.pid = pid
+        self.period = 1 / rate
+        self.stat_fd = os.open(os.path.join(proc_dir, str(pid), "stat"), os.O_RDONLY)
+        self.statm_fd = os.open(os.path.join(proc_dir, str(pid), "statm"), os.O_RDONLY)
+        self.buffer = bytearray(SAMPLE.size * buffer_samples)
+        self.position = 0  # Bytes of the buffer in use
+        self.spill = open(spill_path, "wb")
+        self.spill_path = spill_path
+        self.samples = 0
+        self.late = 0        # Samples taken more than one period after their deadline
+        self.max_delay = 0.0  # Largest delay of a sample after its deadline (s)
+        self.read_time = 0.0  # Seconds spent reading /proc and packing the samples (the rest is waking up)
+
+    """
+    Takes one sample. Returns False when the process is gone (or a zombie).
+    """
+    def sample(self, elapsed_ns):
+        try:
+            stat = os.pread(self.stat_fd, 1024, 0)
+            statm = os.pread(self.statm_fd, 256, 0)
+        except OSError:
+            return False
+        fields = stat.rpartition(b")")[2].split()  # The command name (in parentheses) may contain spaces and parentheses
+        if not fields or fields[0] in (b"Z", b"X"):
+            return False
+
+        SAMPLE.pack_into(self.buffer, self.position, elapsed_ns, int(fields[11]) + int(fields[12]), int(statm.split()[1]))
+        self.position += SAMPLE.size
+        self.samples += 1
+        if self.position == len(self.buffer):
+            self.flush()
+        return True
+
+    def flush(self):
+        self.spill.write(memoryview(self.buffer)[:self.position])
+        self.spill.flush()
+        self.position = 0
+
+    """
+    Samples the process every period until it exits or {duration} seconds have passed.
+    Deadlines are absolute, so a late sample does not shift the following ones.
+    Returns the overhead report of the sampler.
+    """
+    def run(self, duration=None):
+        start_usage = resource.getrusage(resource.RUSAGE_SELF)
+        start = time.monotonic_ns()
+        deadline = time.monotonic()
+        last_flush = deadline
+        end = None if duration is None else deadline + duration
+        try:
+            while end is None or deadline < end:
+                now = time.monotonic()
+                delay = now - deadline
+                self.max_delay = max(self.max_delay, delay)
+                if delay > self.period:
+                    self.late += 1
+                    deadline = now  # Skip the missed deadlines instead of sampling in a burst
+
+                before = time.perf_counter()
+                if not self.sample(time.monotonic_ns() - start):
+                    break
+                self.read_time += time.perf_counter() - before
+                if now - last_flush >= FLUSH_INTERVAL:
+                    self.flush()
+                    last_flush = now
+
+                deadline += self.period
+                pause = deadline - time.monotonic()
+                if pause > 0:
+                    time.sleep(pause)
+        except KeyboardInterrupt:
+            print("Interrupted, saving the samples taken so far")
+        finally:
+            self.flush()
+            self.spill.close()
+            os.close(self.stat_fd)
+            os.close(self.statm_fd)
+
+        wall = (time.monotonic_ns() - start) / 1e9
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu = (usage.ru_utime - start_usage.ru_utime) + (usage.ru_stime - start_usage.ru_stime)
+        return {
+            "pid": self.pid,
+            "rate": 1 / self.period,
+            "samples": self.samples,
+            "wall": wall,
+            "achieved_rate": self.samples / wall if wall else 0.0,
+            "sampler_cpu": cpu,
+            "sampler_cpu_percent": 100 * cpu / wall if wall else 0.0,
+            "cost_per_sample_us": 1e6 * cpu / self.samples if self.samples else 0.0,
+            "read_cost_per_sample_us": 1e6 * self.read_time / self.samples if self.samples else 0.0,
+            "late_samples": self.late,
+            "max_delay_ms": 1000 * self.max_delay,
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Sample the CPU usage and resident memory of a process from /proc.")
+    parser.add_argument("--pid", type=int, default=None, help="Process to sample (default: run the command given after --).")
+    parser.add_argument("command", nargs="*", help="Command to run and sample (after --).")
+    parser.add_argument("--source", required=True, help="Source of the datasets (e.g. Nanos).")
+    parser.add_argument("--data", default=DATA_DIR, help=f"DATA directory with the CPU and Memory trees (default: {DATA_DIR}).")
+    parser.add_argument("--environment", default=ENVIRONMENT, help=f"Environment of the datasets (default: {ENVIRONMENT}).")
+    parser.add_argument("--stress", action="store_true", help="The run is under stress.")
+    parser.add_argument("--rate", type=float, default=RATE, help=f"Samples per second (default: {RATE}).")
+    parser.add_argument("--cpu-window", type=float, default=CPU_WINDOW, help=f"Seconds of each CPU (%%) value, 0 for every sample (default: {CPU_WINDOW}).")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds (default: when the process exits).")
+    args = parser.parse_args()
+
+    if (args.pid is None) == (not args.command):
+        parser.error("give either --pid or a command")
+    process = subprocess.Popen(args.command) if args.command else None
+    pid = args.pid if process is None else process.pid
+
+    cpu_path, memory_path = output_paths(args.data, args.environment, args.stress, args.source)
+    os.makedirs(os.path.dirname(cpu_path), exist_ok=True)
+    sampler = ProcSampler(pid, os.path.splitext(cpu_path)[0] + SPILL_APPENDIX_FILE, args.rate)
+    report = sampler.run(args.duration)
+    if process is not None:
+        process.wait()
+
+    save_outputs(sampler.spill_path, cpu_path, memory_path, report, args.cpu_window)
+    print(f"{report['samples']} samples at {report['achieved_rate']:.1f} Hz ({report['late_samples']} late, max delay {report['max_delay_ms']:.2f} ms); "
+          f"sampler overhead: {report['sampler_cpu_percent']:.3f}% of a core, {report['cost_per_sample_us']:.1f} us per sample "
+          f"({report['read_cost_per_sample_us']:.1f} us reading /proc, the rest is waking up)")
+    print(cpu_path)
+    print(memory_path)
+
+if __name__ == "__main__":
+    main()
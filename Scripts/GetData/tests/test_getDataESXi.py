@@ -0,0 +1,143 @@
+import asyncio
+import json
+import pytest
+
+import fakeESXi
+import getDataESXi
+
+RUN_TIME = 0.1
+TIMING = {"test_duration": RUN_TIME, "test_margin": 1, "poll_interval": 0.01, "power_timeout": 1, "boot_timeout": 1}
+READ_ONLY = ("vim-cmd vmsvc/power.getstate", "vim-cmd vmsvc/get.config", "true")
+
+"""Fake session that also records every command with its retry flag."""
+class RecordingSession(fakeESXi.FakeSession):
+    commands = []
+
+    def run_blocking(self, command, retry=False):
+        RecordingSession.commands.append((self.host, command, retry))
+        return super().run_blocking(command, retry)
+
+@pytest.fixture
+def host(monkeypatch):
+    monkeypatch.setattr(fakeESXi, "RUN_TIME", RUN_TIME)
+    monkeypatch.setattr(fakeESXi, "POWER_DELAY", 0.02)
+    monkeypatch.setattr(fakeESXi, "host", fakeESXi.FakeESXiHost())
+    monkeypatch.setattr(RecordingSession, "commands", [])
+    return fakeESXi.host
+
+def orchestrator(state, affinity=None):
+    return getDataESXi.Orchestrator(getDataESXi.SessionPool(RecordingSession), state, affinity=affinity, **TIMING)
+
+def powered_on(commands):
+    return [int(command.split()[-1]) for _, command, _ in commands if command.startswith("vim-cmd vmsvc/power.on")]
+
+def test_matrix_without_conflicts(tmp_path, host):
+    state = getDataESXi.MatrixState(str(tmp_path / "state.json"))
+    tests = getDataESXi.build_matrix()
+    asyncio.run(orchestrator(state).run_matrix(tests))
+
+    assert host.conflicts == []
+    assert host.max_running > 2  # Tests on disjoint cores ran at the same time
+    assert state.completed == {test.key for test in tests}
+    assert {test.vm_id: test.cores for test in tests} == {vm_id: fakeESXi.VM_CORES.get(vm_id) for vm_id in {test.vm_id for test in tests}}
+
+    on = powered_on(RecordingSession.commands)
+    assert sorted(vm_id for vm_id in on if vm_id in fakeESXi.TEST_VMS) == sorted(test.vm_id for test in tests)
+    assert on.count(getDataESXi.STRESS_VMS[0]) == 1  # Stress VMs started once, for the stress phase
+
+def test_only_read_only_commands_retried(tmp_path, host):
+    asyncio.run(orchestrator(getDataESXi.MatrixState(None)).run_matrix(getDataESXi.build_matrix()))
+
+    retried = {command for _, command, retry in RecordingSession.commands if retry}
+    assert retried and all(command.startswith(READ_ONLY) for command in retried)
+    for _, command, retry in RecordingSession.commands:
+        if not command.startswith(READ_ONLY):
+            assert not retry, command
+
+def test_resume_from_state(tmp_path, host):
+    path = tmp_path / "state.json"
+    tests = getDataESXi.build_matrix()
+    completed = [test.key for test in tests if not test.stress][:6]
+    path.write_text(json.dumps({"completed": completed}))
+
+    state = getDataESXi.MatrixState(str(path))
+    asyncio.run(orchestrator(state).run_matrix(tests))
+
+    started = powered_on(RecordingSession.commands)
+    for test in tests:
+        if test.key in completed:
+            assert started.count(test.vm_id) == 1  # Only for its test with stress
+    assert sum(1 for vm_id in started if vm_id in fakeESXi.TEST_VMS) == len(tests) - len(completed)
+    assert set(json.loads(path.read_text())["completed"]) == {test.key for test in tests}
+
+def test_failed_test_runs_again_on_resume(tmp_path, host, monkeypatch):
+    path = str(tmp_path / "state.json")
+    tests = [test for test in getDataESXi.build_matrix() if not test.stress and test.system == "Nanos"]
+    failing = tests[1]
+
+    async def broken_power_on(vm_id):
+        raise TimeoutError(f"VM {vm_id} did not power on")
+
+    runner = orchestrator(getDataESXi.MatrixState(path))
+    original_power_on = runner.esxi.power_on
+    monkeypatch.setattr(runner.esxi, "power_on", lambda vm_id: broken_power_on(vm_id) if vm_id == failing.vm_id else original_power_on(vm_id))
+    asyncio.run(runner.run_matrix(tests))
+    assert getDataESXi.MatrixState(path).completed == {test.key for test in tests} - {failing.key}
+
+    RecordingSession.commands.clear()
+    asyncio.run(orchestrator(getDataESXi.MatrixState(path)).run_matrix(tests))
+    assert powered_on(RecordingSession.commands) == [failing.vm_id]
+    assert getDataESXi.MatrixState(path).completed == {test.key for test in tests}
+
+def test_unknown_affinity_runs_alone(tmp_path, host):
+    tests = [test for test in getDataESXi.build_matrix() if not test.stress and test.system in ("Nanos", "AppBox")]
+    asyncio.run(orchestrator(getDataESXi.MatrixState(None)).run_matrix(tests))
+    assert all(test.cores is None for test in tests if test.system == "AppBox")
+    assert host.conflicts == []  # The fake host flags a VM without affinity running next to another one
+
+def test_fake_host_detects_linux_overlap(host):
+    first, second = getDataESXi.LINUX_VMS[:2]
+    host.execute(getDataESXi.ESXI_HOST, f"vim-cmd vmsvc/power.on {first}")
+    host.execute(getDataESXi.ESXI_HOST, f"vim-cmd vmsvc/power.on {second}")
+    assert host.conflicts == [(second, first)]
+
+"""SSH client whose first {failures} commands fail, as a connection broken by a VM powered off."""
+class FlakyClient:
+    def __init__(self, failures):
+        self.failures = failures
+        self.closed = False
+
+    def exec_command(self, command):
+        if self.failures:
+            self.failures -= 1
+            raise EOFError("connection closed")
+        output = type("Output", (), {"read": lambda self: b"Powered on\n"})()
+        return None, output, None
+
+    def close(self):
+        self.closed = True
+
+class FlakySession(getDataESXi.SSHSession):
+    def __init__(self, failures):
+        super().__init__("host", "user", "password")
+        self.clients = [FlakyClient(failures), FlakyClient(0)]
+        self.connections = 0
+
+    def connect(self):
+        self.connections += 1
+        return self.clients[self.connections - 1]
+
+def test_run_blocking_retries_read_only_commands():
+    session = FlakySession(1)
+    assert session.run_blocking("vim-cmd vmsvc/power.getstate 100", retry=True) == "Powered on"
+    assert session.connections == 2  # Reconnected once
+    assert session.clients[0].closed
+
+def test_run_blocking_never_repeats_other_commands():
+    session = FlakySession(1)
+    with pytest.raises(ConnectionError):
+        session.run_blocking("vim-cmd vmsvc/power.on 100")
+    assert session.connections == 1
+    assert session.client is None  # The broken connection is dropped: the next command reconnects
+    assert session.run_blocking("vim-cmd vmsvc/power.on 100") == "Powered on"
+    assert session.connections == 2
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import pytest
+
+import getDataQemu
+
+CORES = [2, 3, 5]
+STATS_CORE = 1
+
+def description(data_dir):
+    return {
+        "data_dir": str(data_dir),
+        "cores": CORES,
+        "intervals": [10000, 1000, 100],
+        "stats_core": STATS_CORE,
+        "stats_dir": str(data_dir),
+        "systems": {
+            "Nanos": {
+                "exclusive": True,
+                "build": ["ops build cyclictest -c config{interval}.json"],
+                "command": ["qemu-system-x86_64", "-vnc", ":{vnc}", "-gdb", "tcp::{gdb_port}"],
+                "output": "QEMU/Nanos/{stress}/RAW/QemuNanos{stress}{interval}.txt",
+            },
+            "OSv": {
+                "exclusive": True,
+                "build_dir": str(data_dir),
+                "prepare": ["./scripts/manifest_from_host.sh"],
+                "build": ["./scripts/build image=cyclictest-{interval}"],
+                "command": ["qemu-system-x86_64", "-vnc", ":{vnc}"],
+                "output": "QEMU/OSv/{stress}/RAW/QemuOSv{stress}{interval}.txt",
+            },
+            "Linux": {
+                "intervals": [1000, 100],
+                "capture": True,
+                "command": ["qemu-system-x86_64", "-netdev", "user,hostfwd=tcp::{ssh_port}-:22"],
+                "ssh_command": "cyclictest -i {interval}",
+                "output": "QEMU/Linux/{stress}/RAW/QemuLinux{stress}{interval}.txt",
+            },
+        },
+    }
+
+def test_expand(tmp_path):
+    runs = getDataQemu.expand(description(tmp_path))
+    assert len(runs) == 2 * (3 + 3 + 2)
+    assert [run.stress for run in runs] == [False] * 8 + [True] * 8
+    assert [run.key for run in runs[:3]] == ["NoStress/Nanos/10000", "NoStress/Nanos/1000", "NoStress/Nanos/100"]
+    assert runs[0].log_path == os.path.join(str(tmp_path), "QEMU/Nanos/NoStress/RAW/QemuNanosNoStress10000.txt")
+    assert runs[-1].log_path == os.path.join(str(tmp_path), "QEMU/Linux/Stress/RAW/QemuLinuxStress100.cap")
+    assert [run.system for run in getDataQemu.expand(description(tmp_path), only=["OSv"])] == ["OSv"] * 6
+
+def test_dry_run_pins_runs_and_builds(tmp_path, capsys):
+    runner = getDataQemu.MatrixRunner(description(tmp_path), dry_run=True)
+    run = getDataQemu.expand(description(tmp_path), only=["OSv"])[1]
+    asyncio.run(runner.execute(run, 1, CORES[1]))
+    asyncio.run(runner.execute(run, 1, CORES[1]))
+
+    lines = [line.strip() for line in capsys.readouterr().out.splitlines() if "$" in line]
+    assert lines == [
+        f'$ taskset -c {STATS_CORE} sh -c ./scripts/manifest_from_host.sh',  # Prepared once per system
+        f'$ taskset -c {STATS_CORE} sh -c "./scripts/build image=cyclictest-1000"',
+        f'$ taskset -c {CORES[1]} chrt -f 99 qemu-system-x86_64 -vnc :11',
+        f'$ taskset -c {STATS_CORE} sh -c "./scripts/build image=cyclictest-1000"',
+        f'$ taskset -c {CORES[1]} chrt -f 99 qemu-system-x86_64 -vnc :11',
+    ]
+
+"""
+Runs a phase with a fake execute that checks, when each run starts, that its core is free and that no run of the same
+exclusive system is running. Returns the (run key, slot, core) of every run, in start order.
+"""
+def run_phase(runner, runs):
+    started = []
+    busy_cores, busy_systems = set(), set()
+
+    async def execute(run, slot, core):
+        assert core == runner.cores[slot]
+        assert core not in busy_cores
+        assert not (run.exclusive and run.system in busy_systems)
+        busy_cores.add(core)
+        busy_systems.add(run.system)
+        started.append((run.key, slot, core))
+        await asyncio.sleep(0.001 * (1 + len(started) % 3))  # Runs of different lengths
+        busy_cores.remove(core)
+        busy_systems.discard(run.system)
+
+    runner.execute = execute
+    asyncio.run(runner.run_phase(runs))
+    return started
+
+def test_run_phase_slots(tmp_path):
+    runner = getDataQemu.MatrixRunner(description(tmp_path), dry_run=True)
+    runs = [run for run in getDataQemu.expand(description(tmp_path)) if not run.stress]
+    started = run_phase(runner, runs)
+
+    assert sorted(key for key, _, _ in started) == sorted(run.key for run in runs)
+    assert [(key, core) for key, _, core in started[:3]] == [("NoStress/Nanos/10000", 2), ("NoStress/OSv/10000", 3), ("NoStress/Linux/1000", 5)]
+    assert {core for _, _, core in started} == set(CORES)
+
+def test_exclusive_system_serialized(tmp_path):
+    runner = getDataQemu.MatrixRunner(description(tmp_path), dry_run=True)
+    runs = getDataQemu.expand(description(tmp_path), only=["Nanos"])
+    started = run_phase(runner, runs)  # Asserts that two Nanos runs never overlap
+
+    # A single exclusive system only ever uses one core at a time: the first free one
+    assert [core for _, _, core in started] == [CORES[0]] * len(runs)
+
+def test_finished_runs_skipped(tmp_path):
+    matrix = description(tmp_path)
+    runs = getDataQemu.expand(matrix, only=["Nanos"])
+    os.makedirs(os.path.dirname(runs[0].log_path))
+    with open(runs[0].log_path, "w") as f:
+        f.write("0:1:58\n")
+
+    runner = getDataQemu.MatrixRunner(matrix)
+    runner.wait_between_tests = 0
+    started = run_phase(runner, runs)
+    assert runs[0].key not in [key for key, _, _ in started]
+    assert len(started) == len(runs) - 1
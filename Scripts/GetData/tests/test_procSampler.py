@@ -0,0 +1,91 @@
+import json
+import numpy as np
+import os
+import pytest
+
+import procSampler
+import cpu_memory  # Plots/cpu_memory.py, on the path once procSampler is imported
+
+PID = 4321
+
+"""Contents of /proc/<pid>/stat: utime and stime are the 14th and 15th fields, the 12th and 13th after the command name."""
+def stat_text(comm, utime, stime, state="S"):
+    return f"{PID} ({comm}) {state} 1 {PID} {PID} 0 -1 4194560 1000 0 0 0 {utime} {stime} 0 0 20 0 3 0 12345 1000000 500\n"
+
+@pytest.fixture
+def proc(tmp_path):
+    directory = tmp_path / "proc" / str(PID)
+    directory.mkdir(parents=True)
+    (directory / "stat").write_text(stat_text("qemu", 0, 0))
+    (directory / "statm").write_text("100000 2500 300 1 0 5000 0\n")
+    return directory
+
+def sampler(tmp_path, buffer_samples=procSampler.BUFFER_SAMPLES):
+    return procSampler.ProcSampler(PID, str(tmp_path / "spill.tmp"), buffer_samples=buffer_samples, proc_dir=str(tmp_path / "proc"))
+
+def spilled(sampler):
+    return np.fromfile(sampler.spill_path, dtype=cpu_memory.SAMPLE_DTYPE)
+
+@pytest.mark.parametrize("comm", ["qemu", "qemu system", "a) b (c", "x) S 1 2 3 4 5 6 7 8 9 10 11 12 13"])
+def test_ticks_after_last_parenthesis(tmp_path, proc, comm):
+    (proc / "stat").write_text(stat_text(comm, 1234, 56))
+    ps = sampler(tmp_path)
+    assert ps.sample(42)
+    ps.flush()
+
+    samples = spilled(ps)
+    assert samples["time"].tolist() == [42]
+    assert samples["ticks"].tolist() == [1234 + 56]
+    assert samples["rss"].tolist() == [2500]
+
+@pytest.mark.parametrize("state", ["Z", "X"])
+def test_dead_process_stops_sampling(tmp_path, proc, state):
+    (proc / "stat").write_text(stat_text("qemu", 1, 1, state))
+    ps = sampler(tmp_path)
+    assert not ps.sample(0)
+    assert ps.samples == 0
+
+def test_spill_flushed_when_buffer_full(tmp_path, proc):
+    ps = sampler(tmp_path, buffer_samples=4)
+    for i in range(10):
+        (proc / "stat").write_text(stat_text("qemu", i, i))  # Same file, read again with pread at every sample
+        assert ps.sample(i * 1000)
+        assert os.path.getsize(ps.spill_path) == (i + 1) // 4 * 4 * cpu_memory.SAMPLE.size  # Only the full buffers so far
+
+    ps.flush()
+    samples = spilled(ps)
+    assert samples["time"].tolist() == [i * 1000 for i in range(10)]
+    assert samples["ticks"].tolist() == [2 * i for i in range(10)]
+
+def test_run_until_duration(tmp_path, proc):
+    ps = procSampler.ProcSampler(PID, str(tmp_path / "spill.tmp"), rate=200, proc_dir=str(tmp_path / "proc"))
+    report = ps.run(duration=0.1)
+    assert report["samples"] == len(spilled(ps)) > 0
+    assert report["pid"] == PID
+
+def test_save_outputs(tmp_path):
+    # 5 s at 100 Hz of a process using half a CPU, and RSS growing by one page per sample
+    n = 500
+    samples = np.zeros(n, dtype=cpu_memory.SAMPLE_DTYPE)
+    samples["time"] = np.arange(n) * 10 ** 7
+    samples["ticks"] = np.arange(n) * cpu_memory.CLOCK_TICKS // 200
+    samples["rss"] = 1000 + np.arange(n)[::-1]
+    spill_path = str(tmp_path / "Nanos_samples.tmp")
+    samples.tofile(spill_path)
+
+    cpu_path, memory_path = cpu_memory.output_paths(str(tmp_path / "DATA"), "QEMU", False, "Nanos")
+    outputs = cpu_memory.save_outputs(spill_path, cpu_path, memory_path, {"samples": n})
+
+    assert outputs[:2] == [cpu_path, memory_path]
+    assert not os.path.exists(spill_path)
+    np.testing.assert_allclose(np.load(cpu_path), [50.0] * 4)  # Complete 1 s windows only
+    np.testing.assert_array_equal(np.load(memory_path), (1000 + np.arange(n)) * cpu_memory.PAGE_KB)  # Sorted
+    np.testing.assert_array_equal(np.load(outputs[2]), samples)  # Time-ordered samples
+    with open(outputs[3]) as f:
+        assert json.load(f) == {"samples": n, "cpu_window": cpu_memory.CPU_WINDOW}
+
+def test_cpu_percent_of_every_pair():
+    samples = np.zeros(3, dtype=cpu_memory.SAMPLE_DTYPE)
+    samples["time"] = [0, 10 ** 9, 3 * 10 ** 9]
+    samples["ticks"] = [0, cpu_memory.CLOCK_TICKS, cpu_memory.CLOCK_TICKS]
+    np.testing.assert_allclose(cpu_memory.cpu_percent(samples, window=0), [100.0, 0.0])
@@ -5,6 +5,8 @@ import sys
 import os
 
 import config
+import profiler
+import stats
 
 def create_bar_chart(data, title, name_plot, log=False):
     nanos = [i for i in data if i.source == "Nanos"]
@@ -15,17 +17,17 @@ def create_bar_chart(data, title, name_plot, log=False):
     #systems = list(range(1, 4))
 
     # Calculate standard deviation for ESXi and QEMU
-    std_nanos_esxi = [np.mean(nanos[i].data) for i in range(len(nanos)) if i % 2 == 0]
-    std_nanos_qemu = [np.mean(nanos[i].data) for i in range(len(nanos)) if i % 2 == 1]
+    std_nanos_esxi = [stats.mean(nanos[i].data) for i in range(len(nanos)) if i % 2 == 0]
+    std_nanos_qemu = [stats.mean(nanos[i].data) for i in range(len(nanos)) if i % 2 == 1]
 
-    std_osv_esxi = [np.mean(osv[i].data) for i in range(len(osv)) if i % 2 == 0]
-    std_osv_qemu = [np.mean(osv[i].data) for i in range(len(osv)) if i % 2 == 1]
+    std_osv_esxi = [stats.mean(osv[i].data) for i in range(len(osv)) if i % 2 == 0]
+    std_osv_qemu = [stats.mean(osv[i].data) for i in range(len(osv)) if i % 2 == 1]
 
-    std_ubuntu_esxi = [np.mean(ubuntu[i].data) for i in range(len(ubuntu)) if i % 2 == 0]
-    std_ubuntu_qemu = [np.mean(ubuntu[i].data) for i in range(len(ubuntu)) if i % 2 == 1]
+    std_ubuntu_esxi = [stats.mean(ubuntu[i].data) for i in range(len(ubuntu)) if i % 2 == 0]
+    std_ubuntu_qemu = [stats.mean(ubuntu[i].data) for i in range(len(ubuntu)) if i % 2 == 1]
 
-    std_appbox_esxi = [np.mean(appbox[i].data) for i in range(len(appbox)) if i % 2 == 0]
-    std_appbox_qemu = [np.mean(appbox[i].data) for i in range(len(appbox)) if i % 2 == 1]
+    std_appbox_esxi = [stats.mean(appbox[i].data) for i in range(len(appbox)) if i % 2 == 0]
+    std_appbox_qemu = [stats.mean(appbox[i].data) for i in range(len(appbox)) if i % 2 == 1]
 
     #profiles = ["B.3", "B.4"]
     profiles = ["10000 No Stress", "10000 Stress", "1000 No Stress", "1000 Stress", "100 No Stress", "100 Stress"]
@@ -118,7 +120,8 @@ def create_bar_chart(data, title, name_plot, log=False):
     #os.makedirs(os.path.dirname(save_path), exist_ok=True)
 
     # Salva a figura
-    plt.savefig(config.path_types_of_tests['data'] + config.path_types_of_tests["latency"] + config.path_boxplots + name_plot + "jitter.png", dpi=300)
+    with profiler.stage("savefig"):
+        plt.savefig(config.path_types_of_tests['data'] + config.path_types_of_tests["latency"] + config.path_boxplots + name_plot + "jitter.png", dpi=300)
     plt.close()
     print(config.path_types_of_tests['data'] + config.path_types_of_tests["latency"] + config.path_boxplots + name_plot + "jitter.png")
 
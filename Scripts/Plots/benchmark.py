@@ -0,0 +1,264 @@
+import numpy as np
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import time
+
+import clean_data
+import config
+import cpu_memory
+
+"""
+Benchmark of the analysis pipeline on synthetic data.
+
+Generates cyclictest verbose logs (UTF-8 and UTF-16LE, each ingested into its own tree) and CPU/RSS sample
+spills with the size of real runs, then times each stage: clean_data ingestion, the CPU/memory conversion
+of cpu_memory.save_outputs, config.load_data, stats.get_stats and the plot functions.
+The CPU/memory stage is the ingest of the GetData/procSampler.py spill files, which replaced the pidstat CSVs of
+getDataQemu.sh: nothing in the pipeline reads those CSVs, so there is no pidstat stage to time.
+Each stage runs in a fresh process, so its peak RSS is measured on its own. The results (wall time,
+CPU time, throughput, peak RSS) are saved as JSON to compare runs over time.
+
+    Usage: python benchmark.py [--hours 4] [--intervals 10000,1000,100] [--output-dir ../../DATA/Benchmarks/]
+                               [--work-dir DIR] [--compare previous.json]
+"""
+
+BENCHMARK_VERSION = 2  # 2: one tree per encoding, procSampler spill stage instead of the pidstat CSV
+OUTPUT_DIR = "../../DATA/Benchmarks/"
+WORK_DIR = "../../DATA/Benchmarks/work/"
+HOURS = 4
+INTERVALS = [10000, 1000, 100]
+ENCODINGS = ["utf-8", "utf-16le"]
+SEED = 0
+SAMPLER_RATE = 100  # Samples per second of the synthetic procSampler runs (its default rate)
+
+LINE_WIDTH = 8  # Width of each column of the cyclictest verbose output ("%8d:%8d:%8d")
+LINES_PER_CHUNK = 1 << 20  # Lines generated and written at once
+CYCLICTEST_HEADER = "# /dev/cpu_dma_latency set to 0us\nThread 0 Interval: 1500\nPolicy: fifo: loadavg: 0.00 0.01 0.00 1/100 200\n\n"
+
+"""
+Formats non-negative integers as right-aligned decimal columns of {width} characters (uint8 codes).
+"""
+def format_column(values, width=LINE_WIDTH):
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    digits = (values[:, None] // powers) % 10 + clean_data.ZERO
+    leading = (values[:, None] < powers) & (powers > 1)  # Leading zeros become spaces
+    return np.where(leading, ord(" "), digits).astype(np.uint8)
+
+"""
+Returns synthetic latencies in us: a log-normal body with rare large spikes.
+"""
+def synthetic_latencies(rng, n):
+    latencies = rng.lognormal(np.log(15), 0.4, n).astype(np.int64) + 1
+    spikes = rng.random(n) < 1e-4
+    latencies[spikes] = rng.integers(100, 20000, int(spikes.sum()))
+    return latencies
+
+"""
+Writes a synthetic cyclictest verbose log of {hours} hours with an interval of {interval} us.
+"""
+def generate_cyclictest_log(file_path, interval, hours, encoding, seed=SEED):
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600 * 1e6 / interval)
+    line_size = 3 * LINE_WIDTH + 3
+
+    with open(file_path, "wb") as f:
+        bom = b"\xff\xfe" if encoding == "utf-16le" else b""  # Logs redirected by PowerShell start with a BOM
+        f.write(bom + CYCLICTEST_HEADER.encode(encoding))
+        for start in range(0, n, LINES_PER_CHUNK):
+            counters = np.arange(start, min(start + LINES_PER_CHUNK, n), dtype=np.int64)
+            lines = np.empty((len(counters), line_size), dtype=np.uint8)
+            lines[:, 0:LINE_WIDTH] = format_column(np.zeros_like(counters))
+            lines[:, LINE_WIDTH] = clean_data.COLON
+            lines[:, LINE_WIDTH + 1:2 * LINE_WIDTH + 1] = format_column(counters)
+            lines[:, 2 * LINE_WIDTH + 1] = clean_data.COLON
+            lines[:, 2 * LINE_WIDTH + 2:3 * LINE_WIDTH + 2] = format_column(synthetic_latencies(rng, len(counters)))
+            lines[:, -1] = clean_data.NEWLINE
+
+            if encoding == "utf-16le":
+                lines = lines.astype("<u2")
+            f.write(lines.tobytes())
+
+    return n
+
+"""
+Writes the spill file of a synthetic procSampler run of {hours} hours (binary samples, as ProcSampler.flush writes them).
+"""
+def generate_sampler_spill(file_path, hours, rate=SAMPLER_RATE, seed=SEED):
+    rng = np.random.default_rng(seed)
+    n = int(hours * 3600 * rate)
+    samples = np.empty(n, dtype=cpu_memory.SAMPLE_DTYPE)
+    samples["time"] = np.arange(n, dtype=np.uint64) * int(1e9 / rate)
+    cpu = np.clip(rng.normal(0.25, 0.05, n), 0, 1)  # Fraction of a CPU used between two samples
+    samples["ticks"] = np.floor(np.cumsum(cpu) * cpu_memory.CLOCK_TICKS / rate)
+    samples["rss"] = 50000 + np.cumsum(rng.integers(-16, 17, n))  # Pages
+    samples.tofile(file_path)
+    return n
+
+"""
+Returns the peak RSS of the current process in MB.
+VmHWM is used when available: unlike ru_maxrss, it is not inherited from the parent across exec.
+"""
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+
+"""
+Runs {function} in the current process and returns its wall time, CPU time and peak RSS (MB).
+"""
+def measure(function, *args):
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = function(*args)
+    wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+    return result, {"wall": wall, "cpu": cpu, "peak_rss_mb": peak_rss_mb()}
+
+def stage_ingest(file_path, filename, encoding):
+    _, metrics = measure(clean_data.get_clean_data, file_path, filename, encoding)
+    samples = len(np.load(filename + clean_data.SERIES_APPENDIX_FILE + ".npy", mmap_mode='r'))
+    size = os.path.getsize(file_path)
+    return dict(metrics, bytes=size, samples=samples, throughput_mb_s=size / 1e6 / metrics["wall"], samples_per_s=samples / metrics["wall"])
+
+def stage_sampler(spill_path, cpu_path, memory_path):
+    size = os.path.getsize(spill_path)
+    samples = size // cpu_memory.SAMPLE_DTYPE.itemsize
+    _, metrics = measure(cpu_memory.save_outputs, spill_path, cpu_path, memory_path, {})
+    return dict(metrics, bytes=size, samples=samples, samples_per_s=samples / metrics["wall"])
+
+def stage_load_data(file_path, type_data, view):
+    data, metrics = measure(config.load_data, file_path, 10, type_data, view)
+    if view != config.HIST:
+        metrics = dict(metrics, samples=len(data), samples_per_s=len(data) / metrics["wall"])
+    _, cached = measure(config.load_data, file_path, 10, type_data, view)
+    return dict(metrics, cached_wall=cached["wall"])
+
+def stage_function(name, file_paths, view, work_dir):
+    config.path_types_of_tests["data"] = work_dir  # The plots are saved in {work_dir}/Cyclictest/Plots/
+    all_data = [config.BoxData(config.load_data(file_path, 10, config.LATENCY, view), "Nanos", "tan", False, "QEMU",
+                               view=view, sorted=view == config.SORTED, interval_range=clean_data.get_interval(file_path))
+                for file_path in file_paths]
+    functions = {
+        "stats.get_stats": lambda: [config.stats.get_stats(data) for data in all_data],
+        "jitter.plot": lambda: config.jitter.plot(all_data, "benchmark"),
+        "jitter.plot_time_domain": lambda: config.jitter.plot_time_domain(all_data, "benchmark"),
+        "boxplot.box_plot_all": lambda: config.boxplot.box_plot_all(all_data, "benchmark", True, config.LATENCY),
+    }
+    samples = sum(len(data.data) for data in all_data)
+    _, metrics = measure(functions[name])
+    return dict(metrics, samples=samples, samples_per_s=samples / metrics["wall"])
+
+"""
+Runs a stage in a new process (clean peak RSS) and returns its result, with the error if it failed.
+"""
+def run_stage(stage, description, *args):
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        try:
+            result = pool.apply(stage, args)
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+    result = dict(description, **result)
+    status = result.get("error") or f"{result['wall']:.3f}s, {result['peak_rss_mb']:.0f} MB"
+    print(f"{description['stage']} {description.get('input', '')}: {status}")
+    return result
+
+"""
+Generates the synthetic data in {work_dir} (laid out like the DATA tree, one tree per encoding so the outputs
+of the same interval do not overwrite each other) and runs every stage.
+"""
+def run_benchmark(work_dir, hours, intervals):
+    os.makedirs(os.path.join(work_dir, "Cyclictest", "Plots"), exist_ok=True)
+    results = []
+
+    outputs = {}
+    for encoding in ENCODINGS:
+        raw_dir = os.path.join(work_dir, encoding, "Cyclictest", "QEMU", "Nanos", "NoStress", "RAW")
+        os.makedirs(raw_dir, exist_ok=True)
+        for interval in intervals:
+            file_path = os.path.join(raw_dir, f"QemuNanos{interval}.txt")
+            if not os.path.exists(file_path):
+                print(f"Generating {file_path}...")
+                generate_cyclictest_log(file_path, interval, hours, encoding)
+            filename = os.path.join(os.path.dirname(raw_dir), f"{interval}")
+            outputs[encoding, interval] = filename + ".npy"
+            results.append(run_stage(stage_ingest, {"stage": "clean_data", "input": file_path, "encoding": encoding, "interval": interval},
+                                     file_path, filename, encoding))
+
+    cpu_path, memory_path = cpu_memory.output_paths(work_dir, "QEMU", False, "Nanos")
+    os.makedirs(os.path.dirname(cpu_path), exist_ok=True)
+    spill_path = os.path.splitext(cpu_path)[0] + cpu_memory.SPILL_APPENDIX_FILE
+    generate_sampler_spill(spill_path, hours)  # save_outputs removes the spill file
+    results.append(run_stage(stage_sampler, {"stage": "procSampler", "input": spill_path}, spill_path, cpu_path, memory_path))
+    for type_data, npy_path in ((config.CPU, cpu_path), (config.MEMORY, memory_path)):
+        results.append(run_stage(stage_load_data, {"stage": "load_data", "input": npy_path, "type": type_data, "view": config.SORTED},
+                                 npy_path, type_data, config.SORTED))
+
+    for file_path in outputs.values():
+        for view, appendix in config.view_appendix_files.items():
+            view_path = file_path[:-len(".npy")] + appendix + ".npy"
+            results.append(run_stage(stage_load_data, {"stage": "load_data", "input": view_path, "type": config.LATENCY, "view": view},
+                                     view_path, config.LATENCY, view))
+
+    # Both encodings give the same datasets: the analysis functions run on the first one
+    file_paths = [file_path for (encoding, _), file_path in outputs.items() if encoding == ENCODINGS[0]]
+    for name in ("stats.get_stats", "jitter.plot", "boxplot.box_plot_all"):
+        results.append(run_stage(stage_function, {"stage": name, "view": config.SORTED}, name, file_paths, config.SORTED, work_dir))
+    series_paths = [file_path[:-len(".npy")] + config.view_appendix_files[config.SERIES] + ".npy" for file_path in file_paths]
+    results.append(run_stage(stage_function, {"stage": "jitter.plot_time_domain", "view": config.SERIES}, "jitter.plot_time_domain", series_paths, config.SERIES, work_dir))
+
+    return results
+
+"""
+Prints the wall time of each stage relative to a previous report.
+"""
+def compare(results, previous_path):
+    with open(previous_path) as f:
+        previous = {(r["stage"], r.get("input"), r.get("view")): r for r in json.load(f)["results"]}
+
+    for result in results:
+        old = previous.get((result["stage"], result.get("input"), result.get("view")))
+        if old is None or "wall" not in old or "wall" not in result:
+            continue
+        print(f"{result['stage']} {result.get('input', '')}: {old['wall']:.3f}s -> {result['wall']:.3f}s ({result['wall'] / old['wall']:.2f}x)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic cyclictest logs and procSampler runs.")
+    parser.add_argument("--hours", type=float, default=HOURS, help=f"Duration of the synthetic runs in hours (default: {HOURS}).")
+    parser.add_argument("--intervals", type=lambda value: [int(i) for i in value.split(",") if i], default=INTERVALS,
+                        help="Comma-separated cyclictest intervals in us (default: 10000,1000,100).")
+    parser.add_argument("--work-dir", default=WORK_DIR, help=f"Directory of the synthetic data, reused between runs (default: {WORK_DIR}).")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help=f"Directory of the JSON reports (default: {OUTPUT_DIR}).")
+    parser.add_argument("--compare", default=None, help="Previous JSON report to compare the wall times with.")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.work_dir, args.hours, args.intervals)
+    report = {
+        "version": BENCHMARK_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+        "parameters": {"hours": args.hours, "intervals": args.intervals, "encodings": ENCODINGS, "sampler_rate": SAMPLER_RATE, "seed": SEED},
+        "results": results,
+    }
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_path = os.path.join(args.output_dir, f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=4)
+    print(output_path)
+
+    if args.compare:
+        compare(results, args.compare)
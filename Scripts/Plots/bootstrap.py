@@ -0,0 +1,111 @@
+import numpy as np
+from collections import namedtuple
+
+import stats
+from histogram import Histogram, bucket_bounds
+
+"""
+Bootstrap confidence intervals of the metrics reported by stats (mean, median, standard deviation, tail percentiles).
+
+A bootstrap resample of n values drawn with replacement is a multinomial draw of counts over the
+distinct values of the data, so the resamples are drawn as a matrix of counts (one row per resample)
+instead of n random indices. The cost depends on the number of distinct values (a few thousand for
+latencies in microseconds), not on the number of samples. The rows are drawn in blocks to bound memory.
+"""
+
+resamples = 1000  # Number of bootstrap resamples (configurable with --resamples)
+seed = 0          # Seed of the random generator, so the intervals are reproducible (--seed)
+confidence = 95   # Confidence level of the intervals in percent (--confidence)
+
+BLOCK_ELEMENTS = 1 << 22  # Counts drawn at once (resamples per block x distinct values)
+
+# Metric estimate and its confidence interval
+Interval = namedtuple("Interval", ["estimate", "low", "high"])
+
+"""
+Returns the distinct values of a dataset and the number of times each one appears.
+Sorted arrays are scanned once, unsorted arrays are sorted by np.unique, histograms use their bucket middles.
+"""
+def distinct_values(data_array, is_sorted=False):
+    if isinstance(data_array, Histogram):
+        used = np.flatnonzero(data_array.counts)
+        lower, width = bucket_bounds(used)
+        middle = np.clip(lower + (width - 1) / 2, data_array.min_value, data_array.max_value)
+        return middle * data_array.scale, data_array.counts[used]
+
+    data_array = np.asarray(data_array)
+    if not is_sorted:
+        return np.unique(data_array, return_counts=True)
+
+    starts = np.concatenate(([0], np.flatnonzero(data_array[1:] != data_array[:-1]) + 1))
+    return data_array[starts], np.diff(np.append(starts, len(data_array)))
+
+"""
+Returns the percentiles {q} of each resample (rows of {cumulative}, the cumulative counts over {values}).
+Same definition as np.percentile on the resampled values.
+"""
+def resample_percentiles(values, cumulative, q):
+    rows, k = cumulative.shape
+    n = cumulative[0, -1]
+    # Offsetting each row by row * n makes the whole matrix non-decreasing, so one searchsorted finds every rank
+    flat = (cumulative + np.arange(rows)[:, None] * n).reshape(-1)
+    row_offsets = np.arange(rows)[:, None]
+
+    position = np.asarray(q, dtype=np.float64) / 100 * (n - 1)
+    below = np.floor(position).astype(np.int64)
+    above = np.minimum(below + 1, n - 1)
+
+    def value_at(rank):
+        index = np.searchsorted(flat, row_offsets * n + rank[None, :], side='right') - row_offsets * k
+        return values[index]
+
+    return stats.lerp(value_at(below), value_at(above), (position - below)[None, :])
+
+"""
+Computes the bootstrap confidence intervals of the mean, median, standard deviation and tail percentiles of a dataset.
+
+    :param data_array: The samples (array, sorted array or histogram).
+    :param tail: The tail percentiles (default is stats.tail_percentiles).
+    :param is_sorted: Whether the array is sorted (read without sorting it again).
+    :return: A dictionary metric name -> Interval(estimate, low, high).
+"""
+def confidence_intervals(data_array, tail=None, is_sorted=False):
+    if tail is None:
+        tail = stats.tail_percentiles
+    q = [50] + list(tail)
+    names = ["mean", "median", "std"] + [f"p{value:g}" for value in tail]
+
+    values, counts = distinct_values(data_array, is_sorted)
+    values = values.astype(np.float64)
+    n = int(counts.sum())
+    if n == 0:
+        return {}
+
+    # Values centred on the mean, to compute the variance of each resample without cancellation
+    center = float(np.dot(values, counts)) / n
+    centred = values - center
+    probabilities = counts / n
+
+    rng = np.random.default_rng(seed)
+    block = max(1, BLOCK_ELEMENTS // len(values))
+    results = []
+    for start in range(0, resamples, block):
+        draws = rng.multinomial(n, probabilities, size=min(block, resamples - start))
+        shift = draws @ centred / n
+        variance = np.maximum(draws @ (centred * centred) / n - shift * shift, 0.0)
+        results.append(np.column_stack((center + shift, np.sqrt(variance), resample_percentiles(values, np.cumsum(draws, axis=1), q))))
+
+    results = np.concatenate(results)
+    alpha = (100 - confidence) / 2
+    low, high = np.percentile(results, [alpha, 100 - alpha], axis=0)
+
+    estimates = [stats.mean(data_array), stats.std(data_array)] + list(stats.percentiles(data_array, q, is_sorted))
+    order = [0, 2, 1] + list(range(3, len(names)))  # results columns: mean, std, median, tail...
+    return {name: Interval(estimates[column], low[column], high[column]) for name, column in zip(names, order)}
+
+"""
+Computes the confidence intervals of every configuration of a profile (list of BoxData), in order.
+Every configuration uses the same seed, so its intervals do not depend on the rest of the profile.
+"""
+def profile_intervals(all_data, tail=None):
+    return [confidence_intervals(data.data, tail, data.sorted) for data in all_data]
@@ -6,6 +6,21 @@ import sys
 import numpy as np
 
 import config
+import profiler
+import stats
+
+PAIR_OFFSET = 0.7  # Distance between the boxes of a pair of configurations (e.g. without and with stress)
+PAIR_SPACING = 2   # Distance between consecutive pairs
+GROUP_SIZE = 3     # Pairs per group (e.g. the three intervals of an environment)
+GROUP_GAP = 1      # Extra space between groups
+
+"""
+Returns the positions of {count} boxes: pairs of boxes, grouped by {GROUP_SIZE} pairs.
+"""
+def box_positions(count):
+    index = np.arange(count)
+    pair = index // 2
+    return 1 + pair * PAIR_SPACING + (pair // GROUP_SIZE) * GROUP_GAP + (index % 2) * PAIR_OFFSET
 
 def box_plot(data_objects, name_plot, title, log, type_data):
     fig, ax = plt.subplots(figsize=(6, 4))
@@ -24,26 +39,22 @@ def box_plot(data_objects, name_plot, title, log, type_data):
     if log:
         plt.yscale('log', base=10)
 
-    data = [obj.data for obj in data_objects]
-    labels = [obj.label for obj in data_objects]
+    summaries = [stats.box_summary(obj) for obj in data_objects]  # Computed once per configuration, reused by the log and linear plots
     stresses = [obj.stress for obj in data_objects]
     
     stress_legend_number = 0
     for i in range(len(stresses)):
         stress_legend_number += stresses[i]
 
-    positions = [1, 1.7, 3, 3.7, 5, 5.7, 8, 8.7, 10, 10.7, 12, 12.7]
-    #positions = [1, 1.6, 5, 5.6]
-    #positions = np.arange(1, len(data) + 1)  # Posições dos boxplots
+    positions = box_positions(len(summaries))
 
-    boxplots = ax.boxplot(data, 
-                           labels=labels,  # Ajustando as labels
-                           showfliers=False,   # Ocultando outliers
-                           showmeans=True,     # Mostrando a média
-                           meanprops={"marker": "o", "markerfacecolor": "red", "markeredgecolor": "black"},  # Propriedades da média
-                           whis=[0, 100],
-                           patch_artist=True,#)#,
-                           positions=positions)  # Permitir preenchimento das caixas
+    # Whiskers at the minimum and maximum, no outliers: only the five-number summary and the mean are drawn
+    boxplots = ax.bxp(summaries,
+                      positions=positions,
+                      showfliers=False,   # Ocultando outliers
+                      showmeans=True,     # Mostrando a média
+                      meanprops={"marker": "o", "markerfacecolor": "red", "markeredgecolor": "black"},  # Propriedades da média
+                      patch_artist=True)  # Permitir preenchimento das caixas
 
 
     # fill with colors
@@ -94,7 +105,8 @@ def box_plot(data_objects, name_plot, title, log, type_data):
     #for pos, name in group_positions:
     #    fig.text(pos, 0.02, name, ha="center", fontsize=10, fontweight="bold")
     # show plot
-    plt.savefig(config.path_types_of_tests['data'] + config.path_types_of_tests[type_data] + config.path_boxplots + name_plot + ".png", dpi=300)
+    with profiler.stage("savefig"):
+        plt.savefig(config.path_types_of_tests['data'] + config.path_types_of_tests[type_data] + config.path_boxplots + name_plot + ".png", dpi=300)
     plt.close()
     print(config.path_types_of_tests['data'] + config.path_types_of_tests[type_data] + config.path_boxplots + name_plot + ".png")
 
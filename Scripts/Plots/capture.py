@@ -0,0 +1,109 @@
+import numpy as np
+import os
+import struct
+import time
+
+"""
+Binary capture format of a cyclictest run, written while the run is in progress (live.py --capture).
+
+Layout of the file:
+    header (32 bytes) | record | record | ...
+
+Each record is a sample: its cyclictest loop counter and its latency (uint32 each, 8 bytes, the same
+records as the _series.npy outputs of clean_data), instead of the ~16-25 bytes of a verbose text line.
+Records are written in fixed-size chunks, and the samples received so far are written and fsync'd every
+{FSYNC_INTERVAL} seconds. The header does not store the number of samples: it is derived from the file
+size, so a capture killed at any point (e.g. at the timeout of the run) is a valid capture of the samples
+written so far (a record cut in the middle is ignored).
+"""
+
+EXTENSION = ".cap"
+TEMPORARY_EXTENSION = ".tmp" + EXTENSION  # Spill files of live.py, never processed as runs
+MAGIC = b"CYCTCAP\0"
+VERSION = 1
+HEADER = struct.Struct("<8sHHIIQ4x")  # Magic, version, header size, record size, interval (us, 0 if unknown), start time (ns since the epoch)
+RECORD_DTYPE = np.dtype([("counter", "<u4"), ("latency", "<u4")])
+
+CHUNK_SAMPLES = 64 * 1024  # Samples written at once (512 KB)
+FSYNC_INTERVAL = 10        # Seconds between two fsyncs of the capture
+
+"""
+Returns True if {path} is a capture file (by its extension).
+"""
+def is_capture(path):
+    return isinstance(path, str) and path.endswith(EXTENSION)
+
+"""
+Reads the header of a capture: a dictionary with the version, interval (None if unknown), start time and number of samples.
+"""
+def read_header(path):
+    with open(path, "rb") as f:
+        data = f.read(HEADER.size)
+        size = os.fstat(f.fileno()).st_size
+    if len(data) < HEADER.size:
+        raise ValueError(f"Invalid capture {path}: file too small")
+    magic, version, header_size, record_size, interval, start_time = HEADER.unpack(data)
+    if magic != MAGIC or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"Invalid capture {path}: bad header")
+    return {
+        "version": version,
+        "header_size": header_size,
+        "interval": interval or None,
+        "start_time": start_time,
+        "samples": (size - header_size) // record_size,
+    }
+
+"""
+Opens a capture as a read-only memory-mapped array of RECORD_DTYPE (complete records only).
+"""
+def open_capture(path):
+    header = read_header(path)
+    if header["samples"] == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=header["header_size"], shape=(header["samples"],))
+
+"""
+Writes the samples of a run to a capture file, in chunks of {chunk_samples} records, with an fsync every {fsync_interval} seconds.
+"""
+class CaptureWriter:
+    def __init__(self, path, interval=None, chunk_samples=CHUNK_SAMPLES, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, HEADER.size, RECORD_DTYPE.itemsize, interval or 0, time.time_ns()))
+        self.chunk = np.empty(chunk_samples, dtype=RECORD_DTYPE)
+        self.count = 0  # Samples in the chunk
+        self.samples = 0
+        self.fsync_interval = fsync_interval
+        self.last_sync = time.monotonic()
+
+    def append(self, counters, values):
+        position = 0
+        while position < len(values):
+            n = min(len(values) - position, len(self.chunk) - self.count)
+            self.chunk["counter"][self.count:self.count + n] = counters[position:position + n]
+            self.chunk["latency"][self.count:self.count + n] = values[position:position + n]
+            self.count += n
+            position += n
+            if self.count == len(self.chunk):
+                self.write_chunk()
+        self.samples += len(values)
+
+        if time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    """Writes the samples of the chunk (a full chunk, or a partial one before an fsync)."""
+    def write_chunk(self):
+        self.file.write(memoryview(self.chunk[:self.count]).cast("B"))
+        self.count = 0
+
+    """Writes the pending samples and forces them to disk."""
+    def sync(self):
+        self.write_chunk()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
@@ -1,13 +1,42 @@
 import numpy as np
 import re
 import os
-import threading
-import sys
+import time
+import argparse
+import hashlib
+import json
+import store
+import profiler
+import capture
+import packed
+from histogram import Histogram
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+CHUNK_SIZE = 16 * 1024 * 1024  # Bytes read from the log at each step
+ESTIMATED_LINE_SIZE = 16  # Used to preallocate the output buffer (bytes per line)
+
+NEWLINE = ord("\n")
+COLON = ord(":")
+ZERO = ord("0")
+NINE = ord("9")
+MAX_FIELD_WIDTH = 24  # Longer fields are parsed without vectorization
+MAX_DIGITS = 18  # Fields with more digits are dropped (the int64 parse is exact up to 18 digits)
+MAX_VALUE = np.iinfo(np.uint32).max  # Larger values do not fit the SERIES_DTYPE fields and are dropped
+SERIES_APPENDIX_FILE = "_series"
+HIST_APPENDIX_FILE = "_hist"
+MANIFEST_APPENDIX_FILE = ".manifest.json"
+OUTPUT_VERSION = 4  # Increase when the outputs change, so the manifests are no longer up to date
+
+SERIES_DTYPE = capture.RECORD_DTYPE  # Time-ordered samples, 8 bytes per sample (the records of the capture files)
+WARMUP_TIME = 30 * 60  # Seconds removed from the beginning of each run
+WARMUP_FRACTION = 30 / (4 * 60)  # Fallback: fraction removed when the timeline is unknown (30 minutes of 4 hours)
+MEMORY_PER_INPUT_BYTE = 1.5  # Upper bound of the memory used per byte of log (series buffer + int64 copy + sorted copy)
+MEMORY_PER_CAPTURE_BYTE = 3  # Same for capture files (8 bytes per sample instead of ~16)
 
 """
 Reads boot time data from a file, processes it, and saves it as a .npy file
 """
-def get_clean_data_boot_time(file_path, filename, encoding):
+def get_clean_data_boot_time(file_path, filename, encoding, **parameters):
     data = []
 
     with open(file_path, 'r', encoding=encoding) as f:
@@ -24,110 +53,445 @@ def get_clean_data_boot_time(file_path, filename, encoding):
 
     # Save the processed data as a .npy file
     np.save(filename + ".npy", data)
-    print(filename)
+    return [filename + ".npy"]
 
 """
-Reads a file, processes each line to extract numeric values, and returns the data as a list
+Detects the encoding of a log file by looking at its first bytes.
+Logs captured on Windows (PowerShell redirection) are UTF-16LE, with or without BOM.
 """
-def open_file_and_split(file_path, encoding):
-    data = []
+def detect_encoding(file_path, encoding='utf-8'):
+    with open(file_path, 'rb') as f:
+        head = f.read(4096)
+    return detect_encoding_from_bytes(head, encoding)
 
-    with open(file_path, 'r', encoding=encoding) as f:
-        # Process each line in the file
-        for line in f:
-            line = re.sub(r'[^0-9:]', '', line)  # Remove non-numeric characters except ":"
-            parts = line.split(":")  # Split the line by ":"
+"""
+Detects the encoding of a log from its first bytes (e.g. the start of a stream).
+"""
+def detect_encoding_from_bytes(head, encoding='utf-8'):
+    if head.startswith(b'\xff\xfe'):
+        return "utf-16le"
+    # ASCII text encoded as UTF-16LE has a zero byte in every odd position
+    if len(head) >= 2 and head[1::2].count(0) > len(head[1::2]) * 0.9:
+        return "utf-16le"
+    return encoding
 
-            if len(parts) == 3:
-                try:
-                    value = int(parts[2])  # The third column contains the measured value
-                    data.append(value)
-                except ValueError:
-                    continue
-    return data
+"""
+Extracts the sample counter (second column) and the measured value (third column)
+of every "a:b:c" line of a chunk of a cyclictest log.
 
+The chunk is a NumPy array of character codes (uint8 for UTF-8, uint16 for UTF-16LE) ending with a newline.
+A line is kept only if it has exactly two ":" and at least one digit after the second one,
+non-digit characters are ignored (same rules as the previous regex-based parser).
+Corrupted lines whose counter or value is too long or too large for SERIES_DTYPE are dropped.
 """
-Reads and processes data from a file, trims the initial 30 minutes, sorts the data, and saves it as a .npy file
+def parse_chunk(codes):
+    ends = np.flatnonzero(codes == NEWLINE)
+
+    # Keep only the lines with exactly two ":"
+    colons = np.flatnonzero(codes == COLON)
+    colons_before_end = np.searchsorted(colons, ends)
+    first_colon = np.empty_like(colons_before_end)
+    first_colon[0:1] = 0
+    first_colon[1:] = colons_before_end[:-1]
+    valid = colons_before_end - first_colon == 2
+    first_colons = colons[first_colon[valid]]
+    second_colons = colons[first_colon[valid] + 1]
+
+    values, has_digits, fits = parse_fields(codes, second_colons + 1, ends[valid])
+    keep = has_digits & fits
+    counters, _, counter_fits = parse_fields(codes, first_colons[keep] + 1, second_colons[keep])
+
+    return counters[counter_fits], values[keep][counter_fits]
+
 """
-def get_clean_data(file_path, filename, encoding):
-    try:
-        data = open_file_and_split(file_path, encoding)
-    except Exception as e:
-        print(f"Error: {e}")
-        data = open_file_and_split(file_path, "utf-16le")
-    
-    # Convert data to a numpy array
-    data = np.array(data)
+Converts the fields codes[field_starts[i]:field_ends[i]] to integers, ignoring non-digit characters.
+Returns the values, a mask of the fields with at least one digit and a mask of the fields that fit
+SERIES_DTYPE (at most MAX_DIGITS digits and MAX_VALUE; the values of the other fields are meaningless).
+"""
+def parse_fields(codes, field_starts, field_ends):
+    lengths = field_ends - field_starts
+    width = min(int(lengths.max(initial=0)), MAX_FIELD_WIDTH)
+
+    # Horner's method over the last {width} characters of every field, one column at a time
+    values = np.zeros(len(field_starts), dtype=np.int32 if width < 10 else np.int64)
+    digit_counts = np.zeros(len(field_starts), dtype=np.int32)
+    for column in range(width, 0, -1):
+        digit = codes.take(field_ends - column, mode='clip') - codes.dtype.type(ZERO)  # Non-digits wrap around to large values
+        is_digit = (digit <= 9) & (lengths >= column)
+        values = np.where(is_digit, values * 10 + digit, values)
+        digit_counts += is_digit
+
+    # Fields longer than {width} are rare (corrupted lines), they are parsed one by one
+    for i in np.flatnonzero(lengths > width):
+        digits = re.sub(r'[^0-9]', '', ''.join(map(chr, codes[field_starts[i]:field_ends[i]])))
+        digit_counts[i] = len(digits)
+        values[i] = int(digits) if 0 < len(digits) <= MAX_DIGITS else 0
+
+    fits = (digit_counts <= MAX_DIGITS) & (values <= MAX_VALUE)
+    return values, digit_counts > 0, fits
+
+"""
+Returns the index after the last newline of a chunk (0 if there is none).
+"""
+def end_of_last_line(codes):
+    tail = max(len(codes) - 65536, 0)
+    newlines = np.flatnonzero(codes[tail:] == NEWLINE)
+    if len(newlines) == 0:
+        tail = 0
+        newlines = np.flatnonzero(codes == NEWLINE)
+    return tail + newlines[-1] + 1 if len(newlines) else 0
+
+"""
+Reads a cyclictest log in large chunks and returns the samples, in time order, as a
+NumPy array of SERIES_DTYPE (sample counter and measured value in microseconds).
+"""
+def open_file_and_split(file_path, encoding, chunk_size=CHUNK_SIZE):
+    encoding = detect_encoding(file_path, encoding)
+    if encoding == "utf-16le":
+        dtype = np.dtype('<u2')
+    else:
+        dtype = np.dtype(np.uint8)
+    chunk_size -= chunk_size % dtype.itemsize
+
+    # Preallocated output buffer, grown only if the estimate is too small
+    data = np.empty(max(os.path.getsize(file_path) // (ESTIMATED_LINE_SIZE * dtype.itemsize), 1), dtype=SERIES_DTYPE)
+    count = 0
+    rest = b''
+
+    with open(file_path, 'rb') as f:
+        if dtype.itemsize == 2 and f.read(2) != b'\xff\xfe':
+            f.seek(0)
+
+        while True:
+            chunk = f.read(chunk_size)
+            codes = np.frombuffer(rest + chunk, dtype=dtype)
+
+            if chunk:
+                # Only complete lines are parsed, the rest is kept for the next chunk
+                end = end_of_last_line(codes)
+                rest = codes[end:].tobytes()
+                codes = codes[:end]
+            elif len(codes) > 0:
+                # Last line without a newline at the end of the file
+                codes = np.append(codes, dtype.type(NEWLINE))
+                rest = b''
+            else:
+                break
+
+            if len(codes) == 0:
+                continue
+
+            counters, values = parse_chunk(codes)
+            if count + len(values) > len(data):
+                data = np.resize(data, max(2 * len(data), count + len(values)))
+            data["counter"][count:count + len(values)] = counters
+            data["latency"][count:count + len(values)] = values
+            count += len(values)
+
+    return data[:count]
+
+"""
+Builds the output name (without extension) of a RAW file.
+"""
+def get_output_name(option, file_path):
+    file_final_path = file_path.replace("RAW\\", "")
+    final_name_path = file_final_path.replace(os.path.basename(file_final_path), "")
+
+    if option == "cyclictest":
+        if "10000" in file_path:
+            final_name_path += "10000"
+        elif "1000" in file_path:
+            final_name_path += "1000"
+        elif "100" in file_path:
+            final_name_path += "100"
+        else:
+            final_name_path += "unknown"
+    elif option == "boottime":
+        components_path = final_name_path.split("\\")[2].split("\\")
+        final_name_path += components_path[0]
+
+    return final_name_path
+
+"""
+Estimates the peak memory (in bytes) needed to process a file.
+"""
+def estimate_memory(file_path):
+    if capture.is_capture(file_path):
+        return int(os.path.getsize(file_path) * MEMORY_PER_CAPTURE_BYTE)
+    return int(os.path.getsize(file_path) * MEMORY_PER_INPUT_BYTE) + 4 * CHUNK_SIZE
+
+"""
+Returns the interval (us) of a cyclictest output name (e.g. ".../Stress/1000"), or None if unknown.
+"""
+def get_interval(filename):
+    interval = os.path.basename(filename)
+    return int(interval) if interval.isdigit() else None
+
+"""
+Removes the warmup of a run from its time-ordered samples.
+
+The elapsed time of each sample is computed from its cyclictest loop counter and the interval,
+so the trim is correct for runs of any duration (including runs killed before the end).
+If the interval is unknown or the run is shorter than the warmup, the same fraction as
+the original 30 minutes of 4 hours is removed instead.
+"""
+def remove_warmup(series, interval, warmup=WARMUP_TIME, filename=""):
+    counters = series["counter"]
+    if len(counters) == 0:
+        return series["latency"]
+
+    first_counter = counters.min()
+    if interval is not None:
+        duration = (int(counters.max()) - int(first_counter) + 1) * interval / 1e6  # Seconds
+
+        if duration > warmup:
+            warmup_samples = int(np.ceil(warmup * 1e6 / interval))
+            return series["latency"][counters - first_counter >= warmup_samples]
+        print(f"Warning: {filename} run of {duration:.0f}s is shorter than the {warmup}s warmup, removing {WARMUP_FRACTION:.1%} of the run")
+    else:
+        print(f"Warning: {filename} unknown interval, removing {WARMUP_FRACTION:.1%} of the run")
+
+    return series["latency"][int(len(counters) * WARMUP_FRACTION):]
+
+"""
+Reads and processes data from a file, removes the warmup, sorts the data, and saves it as a .npy file.
+The samples are also saved in time order (untrimmed) as {filename}_series.npy, and an HDR histogram
+of the sorted data as {filename}_hist.npy (enough for the statistics and plots without the full array).
+Binary captures (capture.py) are read directly, without parsing.
+"""
+def get_clean_data(file_path, filename, encoding, warmup=WARMUP_TIME, pack=None):
+    with profiler.stage("parse"):
+        if capture.is_capture(file_path):
+            series = np.array(capture.open_capture(file_path))
+        else:
+            series = open_file_and_split(file_path, encoding)
+    return save_clean_data(series, filename, warmup, pack)
+
+"""
+Saves the outputs of a run from its time-ordered samples (series, sorted data without the warmup and histogram).
+With {pack} (a packed.CODECS name), the sorted data is saved as a packed file instead of a .npy file.
+"""
+def save_clean_data(series, filename, warmup=WARMUP_TIME, pack=None):
+    with profiler.stage("save_series"):
+        np.save(filename + SERIES_APPENDIX_FILE + ".npy", series)
+
+    # Remove the warmup (default: first 30 minutes)
+    with profiler.stage("warmup"):
+        data_trimmed = remove_warmup(series, get_interval(filename), warmup, filename).astype(np.int64)
 
-    # Remove the first 30 minutes of data
-    total_time = 4 * 60  # Total time - 4 hours
-    lines_to_remove = int((len(data) * 30) / total_time)  # Calculate the number of lines to remove
-    data_trimmed = data[lines_to_remove:]  # Remove the first 30 minutes
-    
     # Sort the data to remove a percentage from each side later
-    sorted_data = np.sort(data_trimmed)
+    with profiler.stage("sort"):
+        sorted_data = np.sort(data_trimmed)
 
-    # Save the processed data as a .npy file
-    np.save(filename + ".npy", sorted_data)
-    print(file_path)
+    # Save the processed data as a .npy file (or a packed file)
+    with profiler.stage("save"):
+        if pack:
+            sorted_path = filename + packed.EXTENSION
+            packed.save(sorted_path, sorted_data, pack)
+            if os.path.exists(filename + ".npy"):
+                os.remove(filename + ".npy")  # An old .npy file would be read instead of the packed file
+        else:
+            sorted_path = filename + ".npy"
+            np.save(sorted_path, sorted_data)
+    with profiler.stage("histogram"):
+        np.save(filename + HIST_APPENDIX_FILE + ".npy", Histogram.from_values(sorted_data).to_array())
+    return [sorted_path, filename + SERIES_APPENDIX_FILE + ".npy", filename + HIST_APPENDIX_FILE + ".npy"]
+
+"""
+Computes the content hash of a file.
+"""
+def file_hash(file_path):
+    digest = hashlib.blake2b()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 """
-Processes files in a directory using multithreading.
+Checks the manifest written next to the outputs of {filename}.
+A RAW file is up to date if the outputs exist, it was processed by the same function
+with the same parameters and its size and mtime did not change (or its content hash is the same).
 """
-def process_files(option, directory, processing_function, encoding='utf-8'):
-    threads = []
+def is_up_to_date(file_path, filename, function_name, parameters):
+    try:
+        with open(filename + MANIFEST_APPENDIX_FILE, "r") as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return False
+
+    if os.path.abspath(manifest.get("input", "")) != os.path.abspath(file_path) or manifest.get("function") != function_name or manifest.get("version") != OUTPUT_VERSION:
+        return False
+    if manifest.get("parameters") != parameters:
+        return False
+    if not all(os.path.exists(output) for output in manifest.get("outputs", [])):
+        return False
+
+    stat = os.stat(file_path)
+    if stat.st_size != manifest.get("size"):
+        return False
+    if stat.st_mtime_ns == manifest.get("mtime_ns"):
+        return True
+
+    # Touched but maybe not modified (e.g. copied), compare the content
+    if file_hash(file_path) != manifest.get("hash"):
+        return False
+    manifest["mtime_ns"] = stat.st_mtime_ns
+    write_manifest(filename, manifest)
+    return True
+
+"""
+Writes the manifest of the outputs of {filename}.
+"""
+def write_manifest(filename, manifest):
+    with open(filename + MANIFEST_APPENDIX_FILE, "w") as file:
+        json.dump(manifest, file, indent=4)
+
+"""
+Processes one RAW file and records its size, mtime and content hash in the manifest of its outputs.
+"""
+def process_file(processing_function, file_path, filename, encoding, parameters):
+    stat = os.stat(file_path)
+    outputs = processing_function(file_path, filename, encoding, **parameters)
+    write_manifest(filename, build_manifest(file_path, stat, processing_function.__name__, parameters, outputs))
+    return outputs
+
+"""
+Builds the manifest of the outputs of a RAW file ({stat} taken before the file was read).
+Paths are absolute, so a manifest written from another directory (e.g. by live.py) still matches.
+"""
+def build_manifest(file_path, stat, function_name, parameters, outputs):
+    return {
+        "input": os.path.abspath(file_path),
+        "function": function_name,
+        "version": OUTPUT_VERSION,
+        "parameters": parameters,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "hash": file_hash(file_path),
+        "outputs": [os.path.abspath(output) for output in outputs]
+    }
+
+"""
+Processes one RAW file in a worker process with profiling. Returns its outputs and the profiling records of the worker.
+"""
+def profiled_process_file(processing_function, file_path, filename, encoding, parameters):
+    if not profiler.enabled:
+        profiler.enable()
+    profiler.take_records() # Records inherited from the parent process
+    with profiler.stage("file", file=file_path):
+        outputs = process_file(processing_function, file_path, filename, encoding, parameters)
+    return outputs, profiler.take_records()
+
+"""
+Processes files in a directory using a pool of processes.
+
+Files are processed largest first, so the longest parse starts early, and a file is only
+started when the estimated memory of all running files fits in {max_memory} (MB).
+The outputs are then appended to the dataset store {store_path} (None to skip it), in one step once every file is processed
+(store.py import does the same for the whole DATA tree).
+"""
+def process_files(option, directory, processing_function, encoding='utf-8', jobs=None, max_memory=None, force=False, parameters=None, store_path=store.STORE_FILE):
+    parameters = parameters or {}
+    pending = []
+    up_to_date = 0
 
     # Walk through the directory
     for root, dirs, files in os.walk(directory):
         for file in files:
-            if file.endswith(".txt"):
+            if file.endswith(capture.TEMPORARY_EXTENSION):
+                continue  # Spill file of a live.py run, not a run
+            if file.endswith(".txt") and file[:-len(".txt")] + capture.EXTENSION in files:
+                continue  # Run also kept as a capture (live.py --capture): the capture is read, without parsing
+            if file.endswith((".txt", capture.EXTENSION)):
                 file_path = os.path.join(root, file)
-                file_final_path = file_path.replace("RAW\\", "")
-                final_name_path = file_final_path.replace(os.path.basename(file_final_path), "")
-
-                if option == "cyclictest":
-                    if "10000" in file_path:
-                        final_name_path += "10000"
-                    elif "1000" in file_path:
-                        final_name_path += "1000"
-                    elif "100" in file_path:
-                        final_name_path += "100"
-                    else:
-                        final_name_path += "unknown"
-                elif option == "boottime":
-                    components_path = final_name_path.split("\\")[2].split("\\")
-                    final_name_path += components_path[0]
-
-                # Create a thread to process the file
-                thread = threading.Thread(target=processing_function, args=(file_path, final_name_path, encoding))
-                threads.append(thread)
-                thread.start()
-
-    # Wait for all threads to finish
-    for t in threads:
-        t.join()
-
-"""
-Main entry point of the script. Calls either `main` or `main2` based on the command-line argument.
+                final_name_path = get_output_name(option, file_path)
+
+                # Skip the files already processed (unless {force})
+                if not force and is_up_to_date(file_path, final_name_path, processing_function.__name__, parameters):
+                    up_to_date += 1
+                    continue
+
+                pending.append((file_path, final_name_path, estimate_memory(file_path)))
+
+    if up_to_date:
+        print(f"{up_to_date} file(s) up to date, skipped (use --force to process them again)")
+
+    pending.sort(key=lambda item: os.path.getsize(item[0]), reverse=True)
+    total = len(pending)
+    budget = max_memory * 1024 * 1024 if max_memory else None
+    jobs = jobs or os.cpu_count()
+    task = profiled_process_file if profiler.enabled else process_file
+
+    stored = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        running = {}
+        done = 0
+
+        while pending or running:
+            # Submit the largest files that fit in the memory budget (at least one file runs at a time)
+            in_use = sum(memory for _, _, memory in running.values())
+            for item in list(pending):
+                if len(running) >= jobs:
+                    break
+                if budget is None or not running or in_use + item[2] <= budget:
+                    future = executor.submit(task, processing_function, item[0], item[1], encoding, parameters)
+                    running[future] = (item[0], time.time(), item[2])
+                    in_use += item[2]
+                    pending.remove(item)
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                file_path, start, _ = running.pop(future)
+                done += 1
+                try:
+                    outputs = future.result()
+                    if profiler.enabled:
+                        outputs, worker_records = outputs
+                        profiler.records.extend(worker_records)
+                    stored.extend(outputs)
+                    print(f"[{done}/{total}] {file_path} ({time.time() - start:.1f}s)")
+                except Exception as e:
+                    print(f"[{done}/{total}] Error processing {file_path}: {e}")
+
+    if store_path and stored:
+        with profiler.stage("store", file=store_path):
+            store.add_files(stored, store_path)
+        print(f"{len(stored)} output(s) added to {store_path}")
+
+"""
+Main entry point of the script.
     
-Usage: python script.py [option]
+Usage: python clean_data.py [option] [--jobs N] [--max-memory MB] [--force] [--warmup SECONDS] [--store STORE | --no-store] [--pack [CODEC]] [--profile [REPORT]] [--cprofile FILE]
     - option: "cyclictest" to process Cyclictest data or "boottime" to process BootTime data.
 """
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python script.py [option]")
-        print("Options:")
-        print("  cyclictest - Process Cyclictest data")
-        print("  boottime   - Process BootTime data")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Process RAW data into .npy files.")
+    parser.add_argument("option", type=str.lower, choices=["cyclictest", "boottime"],
+                        help="cyclictest - Process Cyclictest data, boottime - Process BootTime data")
+    parser.add_argument("--jobs", type=int, default=None, help="Number of worker processes (default: number of CPU cores).")
+    parser.add_argument("--max-memory", type=int, default=None, help="Memory budget in MB for the files processed at the same time.")
+    parser.add_argument("--force", action="store_true", help="Process every RAW file, even if its outputs are up to date.")
+    parser.add_argument("--warmup", type=float, default=WARMUP_TIME, help=f"Seconds removed from the beginning of each Cyclictest run (default: {WARMUP_TIME}).")
+    parser.add_argument("--store", default=store.STORE_FILE, help=f"Dataset store the outputs are added to (default: {store.STORE_FILE}).")
+    parser.add_argument("--no-store", dest="store", action="store_const", const=None, help="Only write the .npy files, not the dataset store.")
+    parser.add_argument("--pack", nargs="?", const=packed.CODEC, default=None, choices=packed.CODECS,
+                        help=f"Save the sorted data as packed files (delta encoded and bit-packed, compressed with {packed.CODEC} by default).")
+    parser.add_argument("--profile", nargs="?", const=profiler.REPORT_FILE, default=None,
+                        help=f"Record the time, bytes read and peak memory of each stage per file in a JSON report (default: {profiler.REPORT_FILE}).")
+    parser.add_argument("--cprofile", default=None, help="Also dump cProfile statistics of the main process to this file (implies --profile).")
+    args = parser.parse_args()
+    if args.profile or args.cprofile:
+        profiler.enable(args.cprofile)
 
-    option = sys.argv[1].lower()
+    if args.option == "cyclictest":
+        parameters = {"warmup": args.warmup}
+        if args.pack:
+            parameters["pack"] = args.pack
+        process_files(args.option, "../../DATA/Cyclictest/", get_clean_data, jobs=args.jobs, max_memory=args.max_memory, force=args.force,
+                      parameters=parameters, store_path=args.store)
+    elif args.option == "boottime":
+        process_files(args.option, "../../DATA/BootTime/", get_clean_data_boot_time, jobs=args.jobs, max_memory=args.max_memory, force=args.force,
+                      store_path=args.store)
 
-    if option == "cyclictest":
-        process_files(option, "../../DATA/Cyclictest/", get_clean_data)
-    elif option == "boottime":
-        process_files(option, "../../DATA/BootTime/", get_clean_data_boot_time)
-    else:
-        print(f"Invalid option: {option}")
-        print("Valid options are 'cyclictest' or 'boottime'.")
-        sys.exit(1)
+    if args.profile or args.cprofile:
+        profiler.write_report(args.profile or profiler.REPORT_FILE, args.cprofile)
@@ -1,8 +1,19 @@
 import numpy as np
 import json
+import os
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import matplotlib
 from matplotlib.colors import to_rgba
 
+import store
+import profiler
+import capture
+import clean_data
+from histogram import Histogram
 import stats
+import bootstrap
 import jitter
 import boxplot
 import barchart_desvio
@@ -45,16 +56,49 @@ MEMORY = 'memory'
 
 LOG_APPENDIX_FILE = "_log"
 
+# Views of the latency data saved by clean_data
+SORTED = 'sorted'   # Samples after warmup, sorted
+SERIES = 'series'   # All samples in time order (counter and latency)
+HIST = 'hist'       # HDR histogram of the sorted samples (bounded error, a few KB)
+
+view_appendix_files = {
+    SORTED: "",
+    SERIES: "_series",
+    HIST: "_hist"
+}
+KEY_INTERVAL = store.KEY_FIELDS.index("interval_range")  # Position of the interval in the keys of the dataset store
+
 function_map = {
     "1": "Process statistics",
     "2": "Process jitter",
     "3": "Generate boxplot",
-    "4": "Generate barchart"
+    "4": "Generate barchart",
+    "5": "Process bootstrap confidence intervals",
+    "6": "Process time-domain jitter"
+}
+
+# View loaded by the functions that need a specific view of the latency data
+function_views = {
+    "6": SERIES  # Time-domain jitter needs the time-ordered samples
 }
 
+# Cache of the loaded datasets, shared by all profiles: (path, confidence interval, type, view) -> array
+CACHE_MEMORY_MB = 4096  # Memory budget of the cache
+dataset_cache = OrderedDict()
+
+# Plot functions that can be rendered in parallel (statistics are printed in order)
+PARALLEL_FUNCTIONS = ["2", "3", "4", "6"]
+
+# Datasets of the profiles rendered in parallel, loaded before the workers are forked
+loaded_profiles = {}
+
 class BoxData:
-    def __init__(self, data, source, color, stress, environment, label=""):
+    def __init__(self, data, source, color, stress, environment, label="", view=SORTED, sorted=False, interval_range=None):
         self.data = data
+        self.interval_range = interval_range  # Interval of the cyclictest run in us (latency only)
+        self.box_stats = None  # Boxplot statistics, computed once by stats.box_summary
+        self.view = view
+        self.sorted = sorted  # True if data is sorted (statistics are then read by direct indexing)
         self.label = label
         self.color = color
         self.stress = stress
@@ -67,27 +111,121 @@ class BoxData:
         if "Ubuntu" in label:
             self.label = "Ubuntu RT"
 
-def load_data(filename, confidence_interval=10, type_data=LATENCY):
-    data = np.load(filename)
-    n = len(data)
+"""
+Sets the memory budget (MB) of the dataset cache, evicting the least recently used datasets if needed.
+"""
+def set_cache_memory(memory_mb):
+    global CACHE_MEMORY_MB
+    CACHE_MEMORY_MB = memory_mb
+    evict_cache(0)
+
+"""
+Evicts the least recently used datasets until {extra_bytes} more fit in the cache budget.
+"""
+def evict_cache(extra_bytes):
+    budget = CACHE_MEMORY_MB * 1024 * 1024
+    in_use = sum(data.nbytes for data in dataset_cache.values())
+    while dataset_cache and in_use + extra_bytes > budget:
+        _, data = dataset_cache.popitem(last=False)
+        in_use -= data.nbytes
+
+"""
+Loads a dataset (memory-mapped) and converts it, reusing the cached result when the same
+file was already loaded with the same confidence interval, type and view.
+The returned arrays are shared and read-only.
+"""
+def load_data(filename, confidence_interval=10, type_data=LATENCY, view=SORTED):
+    location = filename if isinstance(filename, store.Location) else os.path.normpath(filename)
+    key = (location, confidence_interval, type_data, view)
+    if key in dataset_cache:
+        dataset_cache.move_to_end(key)
+        return dataset_cache[key]
+
+    data = read_data(filename, confidence_interval, type_data, view)
+    if isinstance(data, np.ndarray):
+        data.flags.writeable = False
+
+    if data.nbytes <= CACHE_MEMORY_MB * 1024 * 1024:
+        evict_cache(data.nbytes)
+        dataset_cache[key] = data
+
+    return data
+
+"""
+Reads a dataset from a .npy file, a capture or the dataset store: trims {confidence_interval} percent of the sorted data and converts the units.
+"""
+def read_data(filename, confidence_interval=10, type_data=LATENCY, view=SORTED):
+    with profiler.stage("np.load"):
+        data = store.open_array(filename) # Memory-mapped, only the pages used are read
+
+    if capture.is_capture(filename) and view != SERIES:
+        with profiler.stage("sort"):
+            data = capture_view(filename, data, view)
+    elif view == SERIES:
+        with profiler.stage("warmup"):
+            data = clean_data.remove_warmup(data, run_interval(filename), clean_data.WARMUP_TIME, filename)
+
+    with profiler.stage("trim"):
+        return trim_data(data, confidence_interval, type_data, view)
 
-    data = data/1000 #us to ms
+"""
+Returns the interval (us) of the run of a dataset: from the header of a capture, the key of a store location
+or the name of a .npy file, and None if it is unknown.
+"""
+def run_interval(filename):
+    if capture.is_capture(filename):
+        return capture.read_header(filename)["interval"]
+    if isinstance(filename, store.Location):
+        return filename.key[KEY_INTERVAL]
+    name = os.path.splitext(os.path.basename(filename))[0]
+    for appendix in view_appendix_files.values():
+        if appendix and name.endswith(appendix):
+            name = name[:-len(appendix)]
+    return clean_data.get_interval(name)
+
+"""
+Builds the sorted (or histogram) view of a capture from its time-ordered samples, without the warmup, as clean_data does.
+"""
+def capture_view(filename, series, view):
+    latencies = clean_data.remove_warmup(series, run_interval(filename), clean_data.WARMUP_TIME, filename)
+    sorted_data = np.sort(latencies.astype(np.int64))
+    return Histogram.from_values(sorted_data).to_array() if view == HIST else sorted_data
+
+"""
+Trims {confidence_interval} percent of the sorted data and converts the units.
+"""
+def trim_data(data, confidence_interval, type_data, view):
+    if view == SERIES:
+        return data/1000 #us to ms, in time order (only the warmup is removed, by read_data)
+
+    if view == HIST:
+        data = Histogram.from_array(data)
+
+    n = len(data)
 
     percentual_cute = confidence_interval/2
     corte = int(n * percentual_cute / 100)
 
-    data_trimmed = data[corte: n - corte] # Remove {confidence_interval} of the data
+    if view == HIST:
+        return data.trimmed(corte).scaled(1/1000) # Remove {confidence_interval} of the data, us to ms
+
+    data_trimmed = data[corte: n - corte]/1000 # Remove {confidence_interval} of the data, us to ms
 
     if type_data == CPU:
-        data_trimmed = data_trimmed * 1000
+        data_trimmed *= 1000
     elif type_data == MEMORY:
-        data_trimmed = data_trimmed * 1000 / 1024
+        data_trimmed *= 1000
+        data_trimmed /= 1024
 
     return data_trimmed
 
-def from_json(json_file, confidence_interval, type_function):
+def from_json(json_file, confidence_interval, type_function, jobs=1):
     with open(json_file, "r") as file:
         profiles = json.load(file)
+
+    if jobs > 1 and type_function in PARALLEL_FUNCTIONS:
+        from_json_parallel(profiles, confidence_interval, type_function, jobs)
+        return
     
     for profile in profiles:
         try:
@@ -95,39 +233,150 @@ def from_json(json_file, confidence_interval, type_function):
         except Exception as e:
             print(f"Error: {e}")
 
-def process_profile(profile, confidence_interval, type_function):
-    title_name = profile["title"]
-    type_data = profile["type"]
-    all_data = []
+"""
+Renders the plots of all profiles in a pool of {jobs} processes (Agg backend).
 
-    if type_data == LATENCY or type_data == BOOT or type_data == CPU or type_data == MEMORY:
-        for i in range(len(profile["configurations"])):
-            data = process_source(profile["configurations"][i], confidence_interval, type_data)
-            all_data.append(data)
+The datasets are loaded once in this process before the workers start, so forked workers
+share them (copy-on-write) instead of loading them again. Each profile and each of its
+log/linear variants is a separate task.
+"""
+def from_json_parallel(profiles, confidence_interval, type_function, jobs):
+    matplotlib.use("Agg")
+    variants = [None] if type_function in ("2", "6") else [True, False] # Jitter has no log variant
+    remaining = {}
+
+    for index, profile in enumerate(profiles):
+        try:
+            with profiler.stage("profile", profile=profile["title"]):
+                all_data = load_profile(profile, confidence_interval, function_views.get(type_function))
+        except Exception as e:
+            print(f"Error: {e}")
+            continue
+        if all_data is not None:
+            loaded_profiles[index] = all_data
+            remaining[index] = len(variants)
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
     else:
-        print(f"Type {type_data} not supported")
+        context = None # Workers load the datasets themselves
+
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+        futures = {}
+        for index in remaining:
+            for log in variants:
+                future = executor.submit(render_task, index, profiles[index], confidence_interval, type_function, log)
+                futures[future] = index
+
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                profiler.records.extend(future.result())
+            except Exception as e:
+                print(f"Error: {e}")
+                remaining[index] = -1
+                continue
+
+            remaining[index] -= 1
+            if remaining[index] == 0:
+                print(f"{profiles[index]['title']} - Done")
+
+    loaded_profiles.clear()
+
+"""
+Renders one variant of a profile in a worker process. Returns the profiling records of the worker.
+"""
+def render_task(index, profile, confidence_interval, type_function, log):
+    profiler.take_records() # Records inherited from the parent process
+    with profiler.stage("profile", profile=profile["title"]):
+        all_data = loaded_profiles.get(index)
+        if all_data is None:
+            all_data = load_profile(profile, confidence_interval, function_views.get(type_function))
+        render_profile(profile, all_data, type_function, log)
+    return profiler.take_records()
+
+def process_profile(profile, confidence_interval, type_function):
+    with profiler.stage("profile", profile=profile["title"]):
+        run_profile(profile, confidence_interval, type_function)
+
+def run_profile(profile, confidence_interval, type_function):
+    all_data = load_profile(profile, confidence_interval, function_views.get(type_function))
+    if all_data is None:
         return
 
     if type_function == "1": # Process statistics
-        for i in all_data:
-            stats.get_stats(i)
-    elif type_function == "2": # Process jitter
-        jitter.plot(all_data, title_name)
+        for configuration, i in zip(profile["configurations"], all_data):
+            with profiler.stage("stats", configuration=configuration_name(configuration)):
+                stats.get_stats(i)
+    elif type_function == "5": # Process bootstrap confidence intervals of every configuration
+        with profiler.stage("bootstrap"):
+            intervals = bootstrap.profile_intervals(all_data)
+        for data, data_intervals in zip(all_data, intervals):
+            stats.get_bootstrap_stats(data, intervals=data_intervals)
+    elif type_function == "2" or type_function == "6": # Process jitter
+        render_profile(profile, all_data, type_function)
     else: # Generate boxplot or barchart
         log = 0
         for i in range(2):  # Run twice to generate log and non-log plots
             log = not log
-            if type_function == "3":
-                boxplot.box_plot_all(all_data, title_name, log, type_data)
-            elif type_function == "4":
-                barchart_desvio.box_plot_all(all_data, title_name, log, type_data)
-            else:
-                print(f"Function {type_function} not supported")
+            if not render_profile(profile, all_data, type_function, log):
                 return
     
-    print(f"{title_name} - Done")
+    print(f"{profile['title']} - Done")
+
+"""
+Loads the data of every configuration of a profile (None if the type is not supported).
+{view} overrides the view of the latency configurations.
+"""
+def load_profile(profile, confidence_interval, view=None):
+    type_data = profile["type"]
+    all_data = []
 
-def process_source(profile, confidence_interval, type_data):
+    if type_data == LATENCY or type_data == BOOT or type_data == CPU or type_data == MEMORY:
+        for i in range(len(profile["configurations"])):
+            with profiler.stage("load", configuration=configuration_name(profile["configurations"][i])):
+                data = process_source(profile["configurations"][i], confidence_interval, type_data, view)
+            all_data.append(data)
+    else:
+        print(f"Type {type_data} not supported")
+        return None
+
+    return all_data
+
+"""
+Name of a configuration in the profiling report: environment/source/stress[/interval].
+"""
+def configuration_name(configuration):
+    name = f"{configuration.get('environment')}/{configuration.get('source')}/{'Stress' if configuration.get('stress') else 'NoStress'}"
+    if "interval_range" in configuration:
+        name += f"/{configuration['interval_range']}"
+    return name
+
+"""
+Renders the plot of a profile for a plot function (log scale or not). Returns False if the function is not supported.
+"""
+def render_profile(profile, all_data, type_function, log=False):
+    with profiler.stage("render", variant="log" if log else "linear"):
+        return plot_profile(profile, all_data, type_function, log)
+
+def plot_profile(profile, all_data, type_function, log):
+    title_name = profile["title"]
+    type_data = profile["type"]
+
+    if type_function == "2":
+        jitter.plot(all_data, title_name)
+    elif type_function == "6":
+        jitter.plot_time_domain(all_data, title_name)
+    elif type_function == "3":
+        boxplot.box_plot_all(all_data, title_name, log, type_data)
+    elif type_function == "4":
+        barchart_desvio.box_plot_all(all_data, title_name, log, type_data)
+    else:
+        print(f"Function {type_function} not supported")
+        return False
+    return True
+
+def process_source(profile, confidence_interval, type_data, view=None):
     try:
         environment = profile["environment"]
         stress = profile["stress"]
@@ -140,7 +389,10 @@ def process_source(profile, confidence_interval, type_data):
     
         if type_data == LATENCY:
             interval_range = profile["interval_range"]
-            return get_profile(environment, stress, source, label, interval_range=interval_range, confidence_interval=confidence_interval, type_data=type_data) # Get profile
+            if view is None:
+                view = profile.get("view", SORTED)
+            run = profile.get("run", 0)
+            return get_profile(environment, stress, source, label, interval_range=interval_range, confidence_interval=confidence_interval, type_data=type_data, view=view, run=run) # Get profile
         elif type_data == BOOT:
             return get_profile(environment, stress, source, label, confidence_interval=confidence_interval, type_data=type_data) # Get profile
         elif type_data == CPU:
@@ -150,7 +402,11 @@ def process_source(profile, confidence_interval, type_data):
     except Exception as e:
         print(f"Error: {e}")
 
-def get_profile(environment, stress, source, label, interval_range=10000, confidence_interval=10, type_data=LATENCY):
+def get_profile(environment, stress, source, label, interval_range=10000, confidence_interval=10, type_data=LATENCY, view=SORTED, run=0):
+    # Configurations available in the dataset store are resolved with a lookup in its index; entries older than their
+    # files (e.g. a run processed again with --pack) are skipped, and the .npy path below falls back to the packed file
+    location = store.find(store.make_key(type_data, environment, source, stress, interval_range if type_data == LATENCY else None, run), view)
+
     if stress == False:
         stress_path = "NoStress"
     else:
@@ -164,12 +420,18 @@ def get_profile(environment, stress, source, label, interval_range=10000, confid
     if "Old" in label:
         data = load_data(f"../OldData/{path_types_of_tests[type_data]}/{environment_path}/{stress_path}/{source}/{interval_range}.npy", confidence_interval, type_data)
 
+    elif location is not None:
+        data = load_data(location, confidence_interval, type_data, view)
+        if type_data == CPU or type_data == MEMORY:
+            stress = False
     elif type_data == LATENCY:
-        data = load_data(f"{path_types_of_tests['data']}/{path_types_of_tests[type_data]}/{environment_path}/{source}/{stress_path}/{interval_range}.npy", confidence_interval, type_data)
+        data = load_data(f"{path_types_of_tests['data']}/{path_types_of_tests[type_data]}/{environment_path}/{source}/{stress_path}/{interval_range}{view_appendix_files[view]}.npy", confidence_interval, type_data, view)
     elif type_data == BOOT:
         data = load_data(f"{path_types_of_tests['data']}/{path_types_of_tests[type_data]}/{environment_path}/{stress_path}/{source}/{environment_path}_{stress_path}_{source}.npy", confidence_interval, type_data)
     elif type_data == CPU or type_data == MEMORY:
         data = load_data(f"{path_types_of_tests['data']}/{path_types_of_tests[type_data]}/{environment_path}/{stress_path}/{source}/{source}.npy", confidence_interval, type_data)
         stress = False
 
-    return BoxData(data, source, to_rgba(base_colors[source], alpha=1), stress, environment, label)
+    is_sorted = type_data == LATENCY and view == SORTED # clean_data saves the latency data sorted
+    return BoxData(data, source, to_rgba(base_colors[source], alpha=1), stress, environment, label, view, is_sorted,
+                   int(interval_range) if type_data == LATENCY else None)
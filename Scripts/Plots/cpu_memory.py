@@ -0,0 +1,66 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+"""
+Spill format of the CPU/RSS samples of a run (GetData/procSampler.py) and their conversion to the .npy layout
+that config.get_profile loads for "cpu" and "memory":
+    <data>/CPU/<environment>/<Stress|NoStress>/<source>/<source>.npy     CPU (%) per window of {cpu_window} s, sorted
+    <data>/Memory/<environment>/<Stress|NoStress>/<source>/<source>.npy  RSS (KB) of every sample, sorted
+The time-ordered samples are kept in <source>_samples.npy and the report of the sampler in <source>.sampler.json,
+next to the CPU dataset.
+
+Each sample of a spill file is 16 bytes: nanoseconds since the start of the sampling, utime + stime of every
+thread (clock ticks) and resident pages.
+"""
+
+CPU_WINDOW = 1         # Seconds of each CPU (%) value (1 s is what pidstat reported)
+SPILL_APPENDIX_FILE = "_samples.tmp"
+SAMPLES_APPENDIX_FILE = "_samples"
+REPORT_APPENDIX_FILE = ".sampler.json"
+
+SAMPLE = struct.Struct("<QII")  # Nanoseconds since the start, utime + stime (clock ticks), resident pages
+SAMPLE_DTYPE = np.dtype([("time", "<u8"), ("ticks", "<u4"), ("rss", "<u4")])
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+
+"""
+Returns the paths of the CPU and Memory datasets of a configuration, as config.get_profile reads them.
+"""
+def output_paths(data_dir, environment, stress, source):
+    stress_path = "Stress" if stress else "NoStress"
+    return tuple(os.path.join(data_dir, kind, environment, stress_path, source, source + ".npy") for kind in ("CPU", "Memory"))
+
+"""
+Returns the CPU usage (%) of each window of {window} seconds (every pair of samples if {window} is 0).
+"""
+def cpu_percent(samples, window=CPU_WINDOW):
+    times = samples["time"].astype(np.int64)
+    if window > 0 and len(times):
+        # First sample of each window (the samples after the last window start form an incomplete window, left out)
+        edges = np.unique(np.searchsorted(times, np.arange(times[0], times[-1] + 1, int(window * 1e9))))
+        samples, times = samples[edges], times[edges]
+    elapsed = np.diff(times) / 1e9
+    ticks = np.diff(samples["ticks"].astype(np.int64)) / CLOCK_TICKS
+    return 100 * ticks[elapsed > 0] / elapsed[elapsed > 0]
+
+"""
+Converts the spilled samples into the CPU and Memory datasets, and writes the time-ordered samples and the report.
+"""
+def save_outputs(spill_path, cpu_path, memory_path, report, cpu_window=CPU_WINDOW):
+    samples = np.fromfile(spill_path, dtype=SAMPLE_DTYPE)
+    for path in (cpu_path, memory_path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    base = os.path.splitext(cpu_path)[0]
+    np.save(base + SAMPLES_APPENDIX_FILE + ".npy", samples)
+    np.save(cpu_path, np.sort(cpu_percent(samples, cpu_window)))
+    np.save(memory_path, np.sort(samples["rss"].astype(np.int64) * PAGE_KB))
+    os.remove(spill_path)
+
+    with open(base + REPORT_APPENDIX_FILE, "w") as f:
+        json.dump(dict(report, cpu_window=cpu_window), f, indent=4)
+    return [cpu_path, memory_path, base + SAMPLES_APPENDIX_FILE + ".npy", base + REPORT_APPENDIX_FILE]
@@ -0,0 +1,151 @@
+import numpy as np
+
+"""
+High-dynamic-range (HDR) histogram of non-negative integer values (latencies in microseconds).
+
+Values below 2^SUB_BUCKET_BITS have their own bucket. Above that, every power of two is split into
+2^(SUB_BUCKET_BITS - 1) buckets, so the relative error of any value is below 2^-(SUB_BUCKET_BITS - 1)
+(0.8% with 8 bits) from 1 us to hours, with a few thousand buckets.
+The exact count, sum, sum of squares, minimum and maximum are kept next to the buckets.
+"""
+
+SUB_BUCKET_BITS = 8
+HALF_BUCKET_COUNT = 1 << (SUB_BUCKET_BITS - 1)
+
+HEADER_SIZE = 6  # sub bucket bits, count, sum, sum of squares, min, max
+
+class Histogram:
+    def __init__(self, counts=None, total=0.0, total_squares=0.0, min_value=0, max_value=0, scale=1.0):
+        self.counts = np.zeros(0, dtype=np.int64) if counts is None else counts
+        self.total = total                  # Sum of the values
+        self.total_squares = total_squares  # Sum of the squares of the values
+        self.min_value = min_value
+        self.max_value = max_value
+        self.scale = scale                  # Unit conversion applied to every result (e.g. 1/1000 for us to ms)
+
+    @property
+    def count(self):
+        return int(self.counts.sum())
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return self.counts.nbytes
+
+    """
+    Adds values to the histogram (vectorized, can be called once per chunk).
+    """
+    def add(self, values):
+        values = np.asarray(values).astype(np.int64, copy=False)
+        if len(values) == 0:
+            return self
+
+        empty = self.counts.sum() == 0
+        counts = np.bincount(bucket_index(values))
+        if len(counts) > len(self.counts):
+            self.counts = np.concatenate((self.counts, np.zeros(len(counts) - len(self.counts), dtype=np.int64)))
+        self.counts[:len(counts)] += counts
+
+        self.min_value = int(values.min()) if empty else min(self.min_value, int(values.min()))
+        self.max_value = int(values.max()) if empty else max(self.max_value, int(values.max()))
+        as_float = values.astype(np.float64)
+        self.total += float(as_float.sum())
+        self.total_squares += float(np.dot(as_float, as_float))
+        return self
+
+    def mean(self):
+        return self.total / self.count * self.scale
+
+    def std(self):
+        mean = self.total / self.count
+        return np.sqrt(max(self.total_squares / self.count - mean * mean, 0.0)) * self.scale
+
+    def min(self):
+        return self.min_value * self.scale
+
+    def max(self):
+        return self.max_value * self.scale
+
+    """
+    Returns the percentiles {q} (0-100). The value is the middle of the bucket holding the rank
+    of the percentile, so the relative error is bounded by the bucket precision.
+    """
+    def percentiles(self, q):
+        q = np.asarray(q, dtype=np.float64)
+        ranks = np.round(q / 100 * (self.count - 1)).astype(np.int64)
+        buckets = np.searchsorted(np.cumsum(self.counts), ranks, side='right')
+        lower, width = bucket_bounds(buckets)
+        values = np.clip(lower + (width - 1) / 2, self.min_value, self.max_value)
+        values = np.where(q <= 0, self.min_value, np.where(q >= 100, self.max_value, values))
+        return values * self.scale
+
+    """
+    Returns a copy of the histogram with every result multiplied by {factor}.
+    """
+    def scaled(self, factor):
+        return Histogram(self.counts, self.total, self.total_squares, self.min_value, self.max_value, self.scale * factor)
+
+    """
+    Returns a copy without the {cut} smallest and {cut} largest values (like slicing a sorted array).
+    The sums of the remaining values are estimated from the middle of their buckets (exact below 2^SUB_BUCKET_BITS).
+    """
+    def trimmed(self, cut):
+        if cut <= 0:
+            return self.scaled(1.0)
+
+        counts = self.counts.copy()
+        cumulative = np.cumsum(counts)
+        low = np.minimum(counts, np.maximum(cut - (cumulative - counts), 0))
+        reverse = np.cumsum(counts[::-1])[::-1]
+        high = np.minimum(counts - low, np.maximum(cut - (reverse - counts), 0))
+        counts -= low + high
+
+        lower, width = bucket_bounds(np.arange(len(counts)))
+        middle = lower + (width - 1) / 2
+        used = np.flatnonzero(counts)
+        if len(used) == 0:
+            return Histogram(counts, 0.0, 0.0, 0, 0, self.scale)
+
+        first_lower, _ = bucket_bounds(used[0])
+        last_lower, last_width = bucket_bounds(used[-1])
+        return Histogram(counts,
+                         float(np.dot(counts, middle)),
+                         float(np.dot(counts, middle * middle)),
+                         max(int(first_lower), self.min_value), min(int(last_lower + last_width - 1), self.max_value),
+                         self.scale)
+
+    """
+    Packs the histogram in a float64 array (header followed by the bucket counts), to save it as .npy.
+    """
+    def to_array(self):
+        header = [SUB_BUCKET_BITS, self.count, self.total, self.total_squares, self.min_value, self.max_value]
+        return np.concatenate((np.array(header, dtype=np.float64), self.counts.astype(np.float64)))
+
+    @staticmethod
+    def from_array(array):
+        if int(array[0]) != SUB_BUCKET_BITS:
+            raise ValueError(f"Histogram with {int(array[0])} sub bucket bits is not supported")
+        return Histogram(np.asarray(array[HEADER_SIZE:]).astype(np.int64), float(array[2]), float(array[3]), int(array[4]), int(array[5]))
+
+    @staticmethod
+    def from_values(values):
+        return Histogram().add(values)
+
+"""
+Returns the bucket of each value.
+"""
+def bucket_index(values):
+    bit_length = np.frexp(values.astype(np.float64))[1]  # Exact for values below 2^53
+    shift = np.maximum(bit_length - SUB_BUCKET_BITS, 0)
+    return shift * HALF_BUCKET_COUNT + (values >> shift)
+
+"""
+Returns the lowest value and the width of each bucket.
+"""
+def bucket_bounds(indices):
+    indices = np.asarray(indices, dtype=np.int64)
+    shift = np.maximum(indices // HALF_BUCKET_COUNT - 1, 0)
+    lower = (indices - shift * HALF_BUCKET_COUNT) << shift
+    return lower, np.left_shift(1, shift)
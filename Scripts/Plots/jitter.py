@@ -4,22 +4,27 @@ import sys
 import os
 
 import config
+import profiler
+import stats
+from histogram import Histogram
+
+# Barreiras de comparação em segundos
+barriers = {
+    "1 µs": 0.001,
+    "20 µs": 0.02,
+    "100 µs": 0.1,
+    "1 ms": 1,
+    "2 ms": 2,
+    "10 ms": 10,
+    "20 ms": 20
+}
+barrier_colors = ["red", "blue", "green", "orange", "purple", "brown", "pink"]
 
 def plot(all_data, title_name):
     data = []
     for i in all_data:
-        data.append(np.std(i.data))
-    # Barreiras de comparação em segundos
-    barriers = {
-        "1 µs": 0.001,
-        "20 µs": 0.02,
-        "100 µs": 0.1,
-        "1 ms": 1,
-        "2 ms": 2,
-        "10 ms": 10,
-        "20 ms": 20
-    }
-    colors = ["red", "blue", "green", "orange", "purple", "brown", "pink"]
+        data.append(stats.std(i.data))
+    colors = barrier_colors
 
     # Convertendo as barreiras para facilitar a plotagem
     barrier_values = list(barriers.values())
@@ -50,11 +55,159 @@ def plot(all_data, title_name):
 
     # Exibir o gráfico
     plt.tight_layout()
-    plt.savefig(config.path_types_of_tests['data'] + config.path_types_of_tests["latency"] + config.path_boxplots + title_name + "jitter.png", dpi=300)
+    with profiler.stage("savefig"):
+        plt.savefig(config.path_types_of_tests['data'] + config.path_types_of_tests["latency"] + config.path_boxplots + title_name + "jitter.png", dpi=300)
     plt.close()
     print(config.path_types_of_tests['data'] + config.path_types_of_tests["latency"] + config.path_boxplots + title_name + "jitter.png")
     plt.close()
 
+# Time-domain jitter (function 6): computed on the time-ordered samples (series view)
+WINDOW_TIME = 1            # Duration of the rolling windows in seconds
+WINDOW_SAMPLES = 1000      # Samples per window when the interval of the run is unknown
+CHUNK_SAMPLES = 1 << 22    # Samples processed at once, to bound the memory of the temporaries on long runs
+DELTA_PERCENTILE = 99      # Percentile of the absolute inter-sample deltas shown in the plot
+DELTA_RESOLUTION = 1000    # Deltas are counted in 1/DELTA_RESOLUTION of the unit of the data (us for data in ms)
+
+"""
+Returns the number of samples of a window of {WINDOW_TIME} seconds for a run with an interval of {interval_range} us.
+"""
+def window_samples(interval_range=None):
+    if not interval_range:
+        return WINDOW_SAMPLES
+    return max(2, int(round(WINDOW_TIME * 1e6 / interval_range)))
+
+"""
+Returns the chunks of {CHUNK_SAMPLES} samples of {values} as float64, each one followed by the first {overlap}
+samples of the next chunk: (first sample, chunk).
+"""
+def chunks(values, overlap=0):
+    for begin in range(0, len(values), CHUNK_SAMPLES):
+        yield begin, np.asarray(values[begin:begin + CHUNK_SAMPLES + overlap], dtype=np.float64)
+
+"""
+Returns the mean and the standard deviation of {values}, computed chunk by chunk (two passes, like np.std).
+"""
+def moments(values):
+    n = len(values)
+    if n == 0:
+        return 0.0, 0.0
+    mean = sum(float(chunk.sum()) for _, chunk in chunks(values)) / n
+    squares = sum(float(np.dot(chunk - mean, chunk - mean)) for _, chunk in chunks(values))
+    return mean, np.sqrt(squares / n)
+
+"""
+Computes the jitter (standard deviation) and the maximum deviation from the mean of every window
+of {window} consecutive samples, starting every {step} samples (default: non-overlapping windows).
+
+The sums are running sums over the values centred on the global mean, so each window costs two
+subtractions whatever its size. They are computed chunk by chunk: each chunk overlaps the next one
+by a window, and its cumulative sums start from the running sums of the chunks before it.
+"""
+def rolling_jitter(values, window, step=None, center=None):
+    step = window if step is None else step
+    n = len(values)
+    if n < window:
+        return np.empty(0), np.empty(0)
+
+    starts = np.arange(0, n - window + 1, step)
+    center = moments(values)[0] if center is None else center
+    jitter = np.empty(len(starts))
+    deviation = np.empty(len(starts))
+    running_sum = running_squares = 0.0  # Sums of the centred values (and of their squares) before the chunk
+
+    for begin, chunk in chunks(values, window - 1):
+        chunk = chunk - center  # Never in place: the chunk may be a view of the (read-only) data
+        sums = np.cumsum(chunk)
+        sums = np.concatenate(([running_sum], sums + running_sum))
+        squares = np.cumsum(chunk * chunk)
+        squares = np.concatenate(([running_squares], squares + running_squares))
+        running_sum, running_squares = sums[min(CHUNK_SAMPLES, len(chunk))], squares[min(CHUNK_SAMPLES, len(chunk))]
+
+        first, last = np.searchsorted(starts, [begin, begin + CHUNK_SAMPLES])  # Windows starting in this chunk
+        if first == last:
+            continue
+        low = starts[first:last] - begin
+        high = low + window
+        window_mean = (sums[high] - sums[low]) / window
+        variance = (squares[high] - squares[low]) / window - window_mean * window_mean
+        jitter[first:last] = np.sqrt(np.maximum(variance, 0.0))
+
+        windows = np.lib.stride_tricks.sliding_window_view(chunk, window)[low[0]::step][:last - first]  # View, no copy
+        deviation[first:last] = np.maximum(windows.max(axis=1) - window_mean, window_mean - windows.min(axis=1))
+
+    return jitter, deviation
+
+"""
+Returns the absolute differences between consecutive samples (inter-sample jitter), counted chunk by chunk
+in a histogram (histogram.py) at a resolution of 1/{DELTA_RESOLUTION} of the unit of the data.
+"""
+def inter_sample_deltas(values):
+    deltas = Histogram()
+    for _, chunk in chunks(values, 1):
+        deltas.add(np.rint(np.abs(np.diff(chunk)) * DELTA_RESOLUTION))
+    return deltas.scaled(1 / DELTA_RESOLUTION)
+
+"""
+Computes the time-domain jitter metrics of a run (time-ordered samples).
+
+    :return: A dictionary with the overall jitter, the percentiles of the inter-sample deltas,
+             the rolling-window jitter and the maximum per-window deviation.
+"""
+def time_domain_metrics(values, interval_range=None, window=None, step=None):
+    if window is None:
+        window = window_samples(interval_range)
+    mean, std = moments(values)
+    jitter, deviation = rolling_jitter(values, window, step, mean)
+    deltas = inter_sample_deltas(values)
+    delta_median, delta_tail, delta_max = stats.percentiles(deltas, [50, DELTA_PERCENTILE, 100]) if len(deltas) else (0, 0, 0)
+
+    return {
+        "jitter": std,
+        "delta_median": delta_median,
+        "delta_tail": delta_tail,
+        "delta_max": delta_max,
+        "window": window,
+        "window_jitter": jitter,
+        "window_deviation": deviation,
+        "max_window_deviation": deviation.max() if len(deviation) else 0,
+    }
+
+"""
+Plots the time-domain jitter of every configuration: overall jitter, p99 of the inter-sample deltas and
+maximum per-window deviation (bars), and the rolling-window jitter along the run (lines), with the barriers.
+"""
+def plot_time_domain(all_data, title_name):
+    metrics = [time_domain_metrics(i.data, i.interval_range) for i in all_data]
+
+    fig, (ax_bars, ax_time) = plt.subplots(2, 1, figsize=(10, 12))
+    indices = np.arange(len(metrics))
+    width = 0.27
+    ax_bars.bar(indices - width, [m["jitter"] for m in metrics], width, color="tan", label="Jitter")
+    ax_bars.bar(indices, [m["delta_tail"] for m in metrics], width, color="peru", label=f"Δ p{DELTA_PERCENTILE}")
+    ax_bars.bar(indices + width, [m["max_window_deviation"] for m in metrics], width, color="sienna", label="Max. window dev.")
+    ax_bars.set_xticks(indices, [f"C.{i+1}" for i in indices], rotation=90, fontsize=20)
+
+    for i, (data, m) in enumerate(zip(all_data, metrics)):
+        window_time = m["window"] * (data.interval_range or 1) / 1e6 / 60  # Minutes per window
+        times = np.arange(len(m["window_jitter"])) * window_time
+        ax_time.plot(times, m["window_jitter"], color=data.color, linewidth=0.8, label=f"C.{i+1}")
+    ax_time.set_xlabel("Time (min)", fontsize=20, fontweight='bold')
+
+    for ax in (ax_bars, ax_time):
+        for value, label, color in zip(barriers.values(), barriers.keys(), barrier_colors):
+            ax.axhline(y=value, color=color, linestyle="--", linewidth=1, label=f"{label}")
+        ax.set_yscale("log")
+        ax.set_ylabel("Jitter (ms)", fontsize=20, fontweight='bold')
+        ax.tick_params(axis='y', labelsize=20)
+        ax.legend(loc="upper right", fontsize=12)
+
+    plt.tight_layout()
+    path = config.path_types_of_tests['data'] + config.path_types_of_tests["latency"] + config.path_boxplots + title_name + "jitter_time.png"
+    with profiler.stage("savefig"):
+        plt.savefig(path, dpi=300)
+    plt.close()
+    print(path)
+
 if __name__ == "__main__":
     confidence_interval = 5  # Default confidence interval
 
@@ -0,0 +1,266 @@
+import numpy as np
+import argparse
+import os
+import select
+import signal
+import sys
+import tempfile
+import time
+
+import capture
+import clean_data
+import store
+from histogram import Histogram
+
+"""
+Live analysis of a cyclictest run while it is in progress.
+
+Follows the serial output of the VM (the RAW log written by getDataQemu.sh, or stdin) and parses the
+new lines as they arrive. Every {REPORT_INTERVAL} seconds it prints the running min/max/mean and
+p99/p99.9 of the whole run (HDR histogram) and of the most recent samples (ring buffer), in constant memory.
+The samples are appended to a binary capture file (capture.py, fsync'd periodically); at the end of the run
+the same outputs as clean_data (.npy, _series.npy, _hist.npy and manifest) are written, so no separate ingest
+pass is needed. With --capture the capture is kept instead of the text log, so a killed run leaves a valid
+partial capture that clean_data and config.load_data read directly (clean_data reads the capture instead of a
+text log of the same name). Without --capture, the capture is a temporary file outside the DATA tree.
+
+    Usage: python live.py <log file | -> [--output NAME] [--capture FILE [--capture-only]] [--report-interval SECONDS] [--pid PID] [--idle-timeout SECONDS] [--store STORE | --no-store]
+    - log file: RAW log being written by the run, or "-" to read the serial output from stdin
+      (e.g. qemu ... -serial stdio | tee RAW/QemuNanos100.txt | python live.py - --output .../100,
+       or qemu ... -serial stdio | python live.py - --output .../100 --capture RAW/QemuNanos100.cap).
+"""
+
+REPORT_INTERVAL = 10  # Seconds between two reports
+RING_SIZE = 1 << 20  # Recent samples kept for the statistics of the last part of the run
+READ_SIZE = 1 << 20  # Bytes read at once
+POLL_INTERVAL = 0.5  # Seconds between two reads when the log has no new data
+IDLE_TIMEOUT = 120  # The run is over when the log has not grown for this long (seconds)
+DETECT_SIZE = 64  # Bytes needed to detect the encoding of a stream
+
+stop_requested = False  # Set by SIGTERM/SIGINT: follow stops after the current read
+
+"""
+Fixed-size ring buffer of the most recent samples.
+"""
+class RingBuffer:
+    def __init__(self, capacity=RING_SIZE):
+        self.values = np.zeros(capacity, dtype=np.uint32)
+        self.position = 0  # Next index written
+        self.count = 0
+
+    def extend(self, values):
+        capacity = len(self.values)
+        values = values[-capacity:]
+        end = self.position + len(values)
+        if end <= capacity:
+            self.values[self.position:end] = values
+        else:
+            split = capacity - self.position
+            self.values[self.position:] = values[:split]
+            self.values[:end - capacity] = values[split:]
+        self.position = end % capacity
+        self.count = min(self.count + len(values), capacity)
+
+    """
+    Returns the samples in the buffer (not in time order, enough for the statistics).
+    """
+    def samples(self):
+        return self.values[:self.count]
+
+"""
+Incremental parser and statistics of a cyclictest log received in pieces.
+"""
+class LiveAnalysis:
+    def __init__(self, spill_path, encoding='utf-8', ring_size=RING_SIZE, interval=None):
+        self.encoding = encoding
+        self.dtype = None  # Decided from the first bytes
+        self.pending = b''  # Bytes received before the encoding is known, or after the last complete line
+        self.histogram = Histogram()
+        self.ring = RingBuffer(ring_size)
+        self.spill = capture.CaptureWriter(spill_path, interval)
+        self.spill_path = spill_path
+
+    @property
+    def samples(self):
+        return self.histogram.count
+
+    """
+    Parses the complete lines of the data received so far.
+    """
+    def feed(self, data):
+        self.pending += data
+        if self.dtype is None:
+            if len(self.pending) < DETECT_SIZE:
+                return
+            self.detect_encoding()
+
+        usable = len(self.pending) - len(self.pending) % self.dtype.itemsize
+        codes = np.frombuffer(self.pending[:usable], dtype=self.dtype)
+        end = clean_data.end_of_last_line(codes)
+        self.pending = self.pending[end * self.dtype.itemsize:]
+        self.add(codes[:end])
+
+    """
+    Parses the last line (without a newline) and closes the capture.
+    """
+    def finish(self):
+        if self.dtype is None:
+            self.detect_encoding()
+        usable = len(self.pending) - len(self.pending) % self.dtype.itemsize
+        codes = np.frombuffer(self.pending[:usable], dtype=self.dtype)
+        if len(codes):
+            self.add(np.append(codes, self.dtype.type(clean_data.NEWLINE)))
+        self.pending = b''
+        self.spill.close()
+
+    def detect_encoding(self):
+        self.encoding = clean_data.detect_encoding_from_bytes(self.pending[:4096], self.encoding)
+        self.dtype = np.dtype('<u2') if self.encoding == "utf-16le" else np.dtype(np.uint8)
+        if self.dtype.itemsize == 2 and self.pending.startswith(b'\xff\xfe'):
+            self.pending = self.pending[2:]
+
+    def add(self, codes):
+        if len(codes) == 0:
+            return
+        counters, values = clean_data.parse_chunk(codes)
+        self.spill.append(counters, values)
+
+        self.histogram.add(values)
+        self.ring.extend(values)
+
+    """
+    Returns the report line of the run so far (values in us).
+    """
+    def report(self, elapsed):
+        if self.samples == 0:
+            return f"[{elapsed:7.0f}s] no samples yet"
+
+        p99, p999 = self.histogram.percentiles([99, 99.9])
+        recent = self.ring.samples()
+        recent_p99, recent_p999 = np.percentile(recent, [99, 99.9])
+        return (f"[{elapsed:7.0f}s] {self.samples} samples: min {self.histogram.min():.0f} max {self.histogram.max():.0f} "
+                f"mean {self.histogram.mean():.1f} p99 {p99:.0f} p99.9 {p999:.0f} us | "
+                f"last {len(recent)}: max {recent.max()} p99 {recent_p99:.0f} p99.9 {recent_p999:.0f} us")
+
+"""
+Returns True if the process {pid} is still running.
+"""
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+"""
+Creates the temporary capture of a run without --capture, in the temporary directory (outside the DATA tree, so
+a spill left by a killed run is never processed as a run).
+"""
+def spill_file():
+    fd, path = tempfile.mkstemp(prefix="live_", suffix=capture.TEMPORARY_EXTENSION)
+    os.close(fd)
+    return path
+
+"""
+Handler of SIGTERM and SIGINT: only asks follow to stop, so the run is never interrupted in the middle of a
+parse or of a write to the capture; the main flow then parses the rest and saves the samples received so far.
+"""
+def request_stop(signum, frame):
+    global stop_requested
+    stop_requested = True
+
+"""
+Follows a log (or stdin if {source} is "-") until the run is over or a stop is requested, reporting the statistics periodically.
+Following a file stops when {pid} has exited or the file has not grown for {idle_timeout} seconds.
+"""
+def follow(source, analysis, report_interval=REPORT_INTERVAL, pid=None, idle_timeout=IDLE_TIMEOUT):
+    start = last_report = last_data = time.time()
+    f = sys.stdin.buffer if source == "-" else open(source, "rb")
+    try:
+        while not stop_requested:
+            if source == "-" and not select.select([f], [], [], POLL_INTERVAL)[0]:
+                data = None  # No data yet, the stop request and the report are checked again
+            else:
+                data = os.read(f.fileno(), READ_SIZE)
+            now = time.time()
+            if data:
+                analysis.feed(data)
+                last_data = now
+            elif source == "-":
+                if data is not None:
+                    break  # End of the stream
+            elif (pid is not None and not is_running(pid)) or now - last_data > idle_timeout:
+                # Read what was written before the process exited
+                while data := os.read(f.fileno(), READ_SIZE):
+                    analysis.feed(data)
+                break
+            else:
+                time.sleep(POLL_INTERVAL)
+
+            if now - last_report >= report_interval:
+                print(analysis.report(now - start), flush=True)
+                last_report = now
+        if stop_requested:
+            print("Interrupted, saving the samples received so far")
+    finally:
+        if source != "-":
+            f.close()
+
+    analysis.finish()
+    print(analysis.report(time.time() - start), flush=True)
+
+"""
+Writes the clean_data outputs of the run from the capture. If the input is a file, its manifest is
+also written, so clean_data skips the file (as long as it does not change), and the outputs are added to the dataset
+store {store_path} (None to skip it). The capture is removed unless {keep_capture}.
+"""
+def save_outputs(source, analysis, output, warmup=clean_data.WARMUP_TIME, store_path=store.STORE_FILE, keep_capture=False):
+    series = np.array(capture.open_capture(analysis.spill_path))
+    outputs = clean_data.save_clean_data(series, output, warmup)
+    if not keep_capture:
+        os.remove(analysis.spill_path)
+
+    if source != "-":
+        parameters = {"warmup": warmup}
+        clean_data.write_manifest(output, clean_data.build_manifest(source, os.stat(source), clean_data.get_clean_data.__name__, parameters, outputs))
+    if store_path:
+        store.add_files(outputs, store_path)
+
+    for path in outputs:
+        print(path)
+    return outputs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live analysis of a cyclictest run (RAW log being written or stdin).")
+    parser.add_argument("source", help='RAW log of the run, or "-" for stdin.')
+    parser.add_argument("--output", default=None, help="Output name without extension (default: the clean_data name of the log, required for stdin).")
+    parser.add_argument("--capture", default=None, help=f"Keep the binary capture of the samples in this file ({capture.EXTENSION}, default: a temporary file removed at the end).")
+    parser.add_argument("--capture-only", action="store_true", help="Only write the capture (requires --capture): clean_data processes it later.")
+    parser.add_argument("--report-interval", type=float, default=REPORT_INTERVAL, help=f"Seconds between two reports (default: {REPORT_INTERVAL}).")
+    parser.add_argument("--ring-size", type=int, default=RING_SIZE, help=f"Recent samples kept for the last-samples statistics (default: {RING_SIZE}).")
+    parser.add_argument("--pid", type=int, default=None, help="PID of the VM: the run is over when it exits.")
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT, help=f"The run is over when the log has not grown for this long (default: {IDLE_TIMEOUT}s).")
+    parser.add_argument("--warmup", type=float, default=clean_data.WARMUP_TIME, help=f"Seconds removed from the beginning of the run (default: {clean_data.WARMUP_TIME}).")
+    parser.add_argument("--store", default=store.STORE_FILE, help=f"Dataset store the outputs are added to (default: {store.STORE_FILE}).")
+    parser.add_argument("--no-store", dest="store", action="store_const", const=None, help="Only write the .npy files, not the dataset store.")
+    args = parser.parse_args()
+
+    if args.capture_only and args.capture is None:
+        parser.error("--capture-only requires --capture")
+    if args.output is None:
+        if args.source == "-" and not args.capture_only:
+            parser.error("--output is required when reading from stdin")
+        args.output = clean_data.get_output_name("cyclictest", args.capture if args.source == "-" else args.source)
+
+    # A run killed at its timeout (SIGTERM to its process group) or interrupted still saves the samples received so far
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    analysis = LiveAnalysis(args.capture or spill_file(), ring_size=args.ring_size, interval=clean_data.get_interval(args.output))
+    follow(args.source, analysis, args.report_interval, args.pid, args.idle_timeout)
+    if args.capture_only:
+        print(args.capture)
+        sys.exit()
+    save_outputs(args.source, analysis, args.output, args.warmup, args.store, keep_capture=args.capture is not None)
@@ -2,6 +2,9 @@ import argparse
 import textwrap
 
 import config
+import stats
+import bootstrap
+import profiler
 
 def main():
     parser = argparse.ArgumentParser(
@@ -17,9 +20,35 @@ def main():
         help=textwrap.dedent("\n".join([f"- {k} : {v}" for k, v in config.function_map.items()]))
     )
 
+    parser.add_argument("--cache-memory", type=int, default=config.CACHE_MEMORY_MB,
+                        help=f"Memory budget in MB of the datasets shared across profiles (default: {config.CACHE_MEMORY_MB}).")
+
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of processes used to render the plots of the profiles (default: 1).")
+    parser.add_argument("--percentiles", type=lambda value: [float(p) for p in value.split(",") if p], default=stats.tail_percentiles,
+                        help="Comma-separated tail percentiles added to the statistics table (default: 99,99.9,99.99,99.999).")
+    parser.add_argument("--resamples", type=int, default=bootstrap.resamples,
+                        help=f"Number of bootstrap resamples of the confidence intervals (default: {bootstrap.resamples}).")
+    parser.add_argument("--seed", type=int, default=bootstrap.seed,
+                        help=f"Seed of the bootstrap resampling (default: {bootstrap.seed}).")
+    parser.add_argument("--confidence", type=float, default=bootstrap.confidence,
+                        help=f"Confidence level in percent of the bootstrap intervals (default: {bootstrap.confidence}).")
+    parser.add_argument("--profile", nargs="?", const=profiler.REPORT_FILE, default=None,
+                        help=f"Record the time, bytes read and peak memory of each stage per profile and configuration in a JSON report (default: {profiler.REPORT_FILE}).")
+    parser.add_argument("--cprofile", default=None, help="Also dump cProfile statistics to this file (implies --profile).")
+
     args = parser.parse_args()
+    config.set_cache_memory(args.cache_memory)
+    stats.tail_percentiles = args.percentiles
+    bootstrap.resamples = args.resamples
+    bootstrap.seed = args.seed
+    bootstrap.confidence = args.confidence
     print(f"Executing: {config.function_map[args.function]}...")
-    config.from_json(args.file, args.conf_int, args.function)
+    if args.profile or args.cprofile:
+        profiler.enable(args.cprofile)
+    config.from_json(args.file, args.conf_int, args.function, args.jobs)
+    if args.profile or args.cprofile:
+        profiler.write_report(args.profile or profiler.REPORT_FILE, args.cprofile)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,229 @@
+import numpy as np
+import argparse
+import os
+import struct
+import zlib
+
+"""
+Compressed storage of sorted integer arrays (the sorted latencies written by clean_data).
+
+Sorted latencies grow by tiny steps (mostly 0 or 1 us), so the array is stored as blocks of
+{BLOCK_SIZE} values: the first value of the block and the deltas to the next values, bit-packed
+with the width of the largest delta of the block, optionally compressed with zlib or zstd.
+
+Layout of the file:
+    header (32 bytes) | block table (BLOCK_DTYPE per block) | block | block | ...
+
+The block table gives the first value, bit width, offset and size of every block, so a single value
+(e.g. a quantile) is read by decoding one block. PackedArray opens a file lazily (memory-mapped) and
+supports len, integer and slice indexing and integer index arrays, decoding only the blocks used.
+store.open_array reads a <name>.pk file in place of a missing <name>.npy, so config.load_data reads it transparently.
+
+    Usage: python packed.py <directory> [--codec none|zlib|zstd] [--remove]
+    - Converts every sorted integer .npy of the directory tree and reports the space saved.
+"""
+
+EXTENSION = ".pk"
+MAGIC = b"SORTPACK"
+VERSION = 1
+HEADER = struct.Struct("<8sHHQII4x")  # Magic, version, codec, number of values, block size, number of blocks
+BLOCK_DTYPE = np.dtype([("first", "<i8"), ("width", "<u1"), ("offset", "<u8"), ("size", "<u4")])
+
+BLOCK_SIZE = 64 * 1024  # Values per block
+CODECS = {"none": 0, "zlib": 1, "zstd": 2}
+CODEC = "zlib"
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+DECODED_BLOCKS = 16  # Decoded blocks kept by a PackedArray
+VIEW_APPENDIX_FILES = ("_series", "_hist")  # Other views of the clean_data outputs (store.VIEW_APPENDIX_FILES)
+
+def compressor(codec):
+    if codec == CODECS["zlib"]:
+        return lambda data: zlib.compress(data, ZLIB_LEVEL)
+    if codec == CODECS["zstd"]:
+        import zstandard  # Optional dependency, only needed for zstd files
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress
+    return bytes
+
+def decompressor(codec):
+    if codec == CODECS["zlib"]:
+        return zlib.decompress
+    if codec == CODECS["zstd"]:
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress
+    return bytes
+
+"""
+Packs non-negative integers with {width} bits each (little-endian bit order).
+"""
+def pack_bits(values, width):
+    if width == 0:
+        return b""
+    bits = ((values[:, None] >> np.arange(width, dtype=np.uint64)) & 1).astype(np.uint8)
+    return np.packbits(bits.reshape(-1), bitorder="little").tobytes()
+
+"""
+Unpacks {count} integers of {width} bits packed by pack_bits.
+"""
+def unpack_bits(data, width, count):
+    if width == 0:
+        return np.zeros(count, dtype=np.uint64)
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=count * width, bitorder="little")
+    return bits.reshape(count, width).astype(np.uint64) @ (np.uint64(1) << np.arange(width, dtype=np.uint64))
+
+"""
+Writes a sorted (non-decreasing) integer array to a packed file.
+"""
+def save(path, data, codec=CODEC, block_size=BLOCK_SIZE):
+    data = np.asarray(data, dtype=np.int64)
+    if data.ndim != 1:
+        raise ValueError("Only one-dimensional arrays can be packed")
+    if len(data) and np.any(data[1:] < data[:-1]):
+        raise ValueError("Only sorted arrays can be packed")
+
+    codec = CODECS[codec]
+    compress = compressor(codec)
+    starts = range(0, len(data), block_size)
+    table = np.zeros(len(starts), dtype=BLOCK_DTYPE)
+    offset = HEADER.size + table.nbytes
+    payloads = []
+    for i, start in enumerate(starts):
+        deltas = np.diff(data[start:start + block_size]).astype(np.uint64)
+        width = int(deltas.max()).bit_length() if len(deltas) else 0
+        payload = compress(pack_bits(deltas, width))
+        table[i] = (data[start], width, offset, len(payload))
+        payloads.append(payload)
+        offset += len(payload)
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, codec, len(data), block_size, len(table)))
+        f.write(table.tobytes())
+        for payload in payloads:
+            f.write(payload)
+    os.replace(temporary_path, path)
+
+"""
+Sorted array stored in a packed file, decoded block by block on access.
+"""
+class PackedArray:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, self.codec, self.count, self.block_size, blocks = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"Invalid packed array {path}: bad header")
+        self.file = np.memmap(path, dtype=np.uint8, mode="r")
+        self.table = np.frombuffer(self.file, dtype=BLOCK_DTYPE, count=blocks, offset=HEADER.size)
+        self.decompress = decompressor(self.codec)
+        self.blocks = {}  # Decoded blocks, most recently used last
+        self.dtype = np.dtype(np.int64)
+        self.shape = (self.count,)
+        self.ndim = 1
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return self.count * self.dtype.itemsize
+
+    """Decoded values of block {i}."""
+    def block(self, i):
+        values = self.blocks.pop(i, None)
+        if values is None:
+            first, width, offset, size = self.table[i]
+            count = min(self.block_size, self.count - i * self.block_size)
+            data = self.decompress(self.file[offset:offset + size].tobytes()) if size else b""
+            values = np.empty(count, dtype=np.int64)
+            values[0] = first
+            np.cumsum(unpack_bits(data, int(width), count - 1).astype(np.int64), out=values[1:])
+            values[1:] += first
+            if len(self.blocks) >= DECODED_BLOCKS:
+                self.blocks.pop(next(iter(self.blocks)))
+        self.blocks[i] = values
+        return values
+
+    """Values from index {start} to {stop}, in a new array (decodes the blocks of the range only)."""
+    def range(self, start, stop):
+        if stop <= start:
+            return np.empty(0, dtype=np.int64)
+        first_block, last_block = start // self.block_size, (stop - 1) // self.block_size
+        parts = [self.block(i) for i in range(first_block, last_block + 1)]
+        values = parts[0].copy() if len(parts) == 1 else np.concatenate(parts)
+        offset = first_block * self.block_size
+        return values[start - offset:stop - offset]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.count)
+            if step < 0:
+                return np.asarray(self)[index]
+            values = self.range(start, max(start, stop))
+            return values if step == 1 else values[::step].copy()
+
+        indices = np.asarray(index)
+        if indices.dtype.kind not in "iu":
+            raise TypeError(f"Invalid index {index!r}")
+        indices = np.where(indices < 0, indices + self.count, indices)
+        if np.any((indices < 0) | (indices >= self.count)):
+            raise IndexError("Index out of range")
+        blocks = indices // self.block_size
+        values = np.empty(indices.shape, dtype=np.int64)
+        for i in np.unique(blocks):
+            mask = blocks == i
+            values[mask] = self.block(int(i))[indices[mask] - i * self.block_size]
+        return values[()] if values.ndim == 0 else values
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.range(0, self.count)
+        return values if dtype is None else values.astype(dtype)
+
+"""
+Returns the packed file of a .npy path (same name, packed extension).
+"""
+def packed_path(npy_path):
+    return os.path.splitext(npy_path)[0] + EXTENSION
+
+"""
+Returns True if an array can be packed (one-dimensional, integer and sorted).
+"""
+def is_packable(data):
+    return data.ndim == 1 and data.dtype.kind in "iu" and data.dtype.names is None and (len(data) < 2 or not np.any(data[1:] < data[:-1]))
+
+"""
+Converts every sorted integer .npy of a directory tree to a packed file. Returns (bytes before, bytes after).
+"""
+def convert_tree(directory, codec=CODEC, remove=False):
+    before = after = 0
+    for root, dirs, files in os.walk(directory):
+        for file in sorted(files):
+            if not file.endswith(".npy"):
+                continue
+            path = os.path.join(root, file)
+            if any(file.endswith(appendix + ".npy") for appendix in VIEW_APPENDIX_FILES):
+                continue  # Time-ordered series and histograms are not sorted arrays
+            data = np.load(path, mmap_mode="r")
+            if not is_packable(data):
+                continue
+            save(packed_path(path), data, codec)
+            size, packed_size = os.path.getsize(path), os.path.getsize(packed_path(path))
+            before += size
+            after += packed_size
+            print(f"{path}: {size / 1e6:.1f} MB -> {packed_size / 1e6:.2f} MB ({size / max(packed_size, 1):.1f}x)")
+            if remove:
+                os.remove(path)
+    return before, after
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the sorted integer .npy files of a directory tree to packed files.")
+    parser.add_argument("directory", help="Directory tree to convert (e.g. ../../DATA/Cyclictest).")
+    parser.add_argument("--codec", choices=CODECS, default=CODEC, help=f"Compression of the blocks (default: {CODEC}).")
+    parser.add_argument("--remove", action="store_true", help="Remove the .npy files once packed (config.load_data reads the packed files instead).")
+    args = parser.parse_args()
+
+    before, after = convert_tree(args.directory, args.codec, args.remove)
+    if after:
+        print(f"Total: {before / 1e6:.1f} MB -> {after / 1e6:.2f} MB ({before / after:.1f}x)")
+    else:
+        print("No sorted integer .npy file found")
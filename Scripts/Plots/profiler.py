@@ -0,0 +1,156 @@
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+"""
+Stage profiling of the analysis scripts (--profile option of main.py and clean_data.py).
+
+Each stage records its wall time, CPU time, bytes read and peak memory (tracemalloc, which also
+traces the NumPy buffers), with the labels of the stages it is nested in (profile, configuration, file).
+When profiling is disabled, stage() returns a shared no-op context, so the instrumented code only
+pays for a function call and a flag test.
+"""
+
+REPORT_FILE = "profile_report.json"  # Default path of the report
+
+enabled = False
+records = []  # One dictionary per finished stage
+stack = []    # Stages in progress (innermost last)
+cprofile = None
+
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_STAGE = NullStage()
+
+"""
+Returns the bytes read by the process so far: (bytes read by system calls, bytes read from storage).
+Pages of memory-mapped files are only counted in the second value. Zeros if /proc is not available.
+"""
+def bytes_read():
+    try:
+        with open("/proc/self/io") as f:
+            counters = dict(line.split(": ") for line in f.read().splitlines())
+        return int(counters["rchar"]), int(counters["read_bytes"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+"""
+Returns the peak resident memory of the process in MB.
+"""
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+
+class Stage:
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.peak = 0
+
+    def __enter__(self):
+        if stack:
+            self.labels = dict(stack[-1].labels, **self.labels)
+            stack[-1].peak = max(stack[-1].peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        stack.append(self)
+
+        self.start_bytes = bytes_read()
+        self.start_cpu = time.process_time()
+        self.start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+        end_bytes = bytes_read()
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+
+        stack.pop()
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, self.peak)
+        tracemalloc.reset_peak()
+
+        records.append(dict(self.labels,
+                            stage=self.name,
+                            depth=len(stack),
+                            wall=wall,
+                            cpu=cpu,
+                            bytes_read=end_bytes[0] - self.start_bytes[0],
+                            storage_bytes_read=end_bytes[1] - self.start_bytes[1],
+                            peak_memory_mb=self.peak / 1024 / 1024))
+        return False
+
+"""
+Returns the context of a stage, recorded with {labels} (e.g. profile="...", configuration="...").
+"""
+def stage(name, **labels):
+    if not enabled:
+        return NULL_STAGE
+    return Stage(name, labels)
+
+"""
+Starts profiling (and cProfile if {cprofile_path} is given).
+"""
+def enable(cprofile_path=None):
+    global enabled, cprofile
+    enabled = True
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if cprofile_path:
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+
+"""
+Returns the records collected so far and clears them (used to send the records of worker processes to the parent).
+"""
+def take_records():
+    taken = list(records)
+    records.clear()
+    return taken
+
+"""
+Aggregates the records by stage name: total wall time, CPU time, bytes read and the largest peak memory.
+"""
+def summary():
+    stages = {}
+    for record in records:
+        total = stages.setdefault(record["stage"], {"count": 0, "wall": 0.0, "cpu": 0.0, "bytes_read": 0, "peak_memory_mb": 0.0})
+        total["count"] += 1
+        total["wall"] += record["wall"]
+        total["cpu"] += record["cpu"]
+        total["bytes_read"] += record["bytes_read"]
+        total["peak_memory_mb"] = max(total["peak_memory_mb"], record["peak_memory_mb"])
+    return stages
+
+"""
+Stops profiling, writes the JSON report to {report_path} and the cProfile statistics to {cprofile_path}.
+"""
+def write_report(report_path, cprofile_path=None):
+    global enabled
+    enabled = False
+    if cprofile is not None:
+        cprofile.disable()
+        cprofile.dump_stats(cprofile_path)
+
+    stages = summary()
+    with open(report_path, "w") as f:
+        json.dump({
+            "command": sys.argv,
+            "pid": os.getpid(),
+            "peak_rss_mb": peak_rss_mb(),
+            "summary": stages,
+            "stages": records,
+        }, f, indent=4)
+
+    for name, total in sorted(stages.items(), key=lambda item: item[1]["wall"], reverse=True):
+        print(f"{name}: {total['wall']:.3f}s wall, {total['cpu']:.3f}s CPU, {total['bytes_read'] / 1e6:.1f} MB read, "
+              f"{total['peak_memory_mb']:.1f} MB peak ({total['count']}x)")
+    print(f"Profile report: {report_path}")
@@ -2,57 +2,136 @@ import numpy as np
 import sys
 
 import config
+import bootstrap
+from histogram import Histogram
 
 """Formats a value with a specific number of decimal places"""
 def format_value(value, decimal_places=4):
     return f"{value:.{decimal_places}f}"
 
+# Tail percentiles added to the table after the maximum (configurable with --percentiles)
+tail_percentiles = [99, 99.9, 99.99, 99.999]
+
+"""
+Linear interpolation between a and b, computed like NumPy's percentile for identical results.
+"""
+def lerp(a, b, t):
+    diff = b - a
+    return np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+
+"""
+Calculates several percentiles of an array at once (same definition as np.percentile).
+
+Sorted arrays (e.g. the latency data saved by clean_data) are read by direct indexing.
+Unsorted arrays are partitioned once with all the required ranks.
+Histograms return the percentiles with the precision of their buckets.
+"""
+def percentiles(data_array, q, is_sorted=False):
+    if isinstance(data_array, Histogram):
+        return data_array.percentiles(q)
+
+    n = len(data_array)
+    position = np.asarray(q, dtype=np.float64) / 100 * (n - 1)
+    below = np.floor(position).astype(np.int64)
+    above = np.minimum(below + 1, n - 1)
+
+    if not is_sorted:
+        ranks = np.unique(np.concatenate((below, above)))
+        data_array = np.partition(data_array, ranks)
+
+    return lerp(data_array[below], data_array[above], position - below)
+
+"""Mean of an array or a histogram"""
+def mean(data_array):
+    if isinstance(data_array, Histogram):
+        return data_array.mean()
+    return np.mean(data_array)
+
+"""Standard deviation of an array or a histogram"""
+def std(data_array):
+    if isinstance(data_array, Histogram):
+        return data_array.std()
+    return np.std(data_array)
+
+"""
+Returns the statistics drawn by a boxplot (Axes.bxp) of a dataset: five-number summary and mean.
+Whiskers are at the minimum and maximum (no outliers). The result is kept in the dataset, so it is
+computed once per configuration (by direct indexing when the data is sorted).
+"""
+def box_summary(data):
+    if data.box_stats is None:
+        whislo, q1, med, q3, whishi = percentiles(data.data, [0, 25, 50, 75, 100], data.sorted)
+        data.box_stats = {"label": data.label, "whislo": whislo, "q1": q1, "med": med, "q3": q3, "whishi": whishi,
+                          "mean": mean(data.data), "fliers": []}
+    return data.box_stats
+
 """
 Calculates and prints statistical metrics for a given dataset.
 
     :param data: The dataset containing the data to be analysed.
     :param decimal_places: The number of decimal places to format the output (default is 4).
+    :param tail: The tail percentiles added after the maximum (default is {tail_percentiles}).
 """
-def get_stats(data, decimal_places=4):
+def get_stats(data, decimal_places=4, tail=None):
     data_array = data.data # Extracts the data from the dataset
-    
-    # Calculating metrics
-    mean = np.mean(data_array)  # Calculates the mean of the data
-    median = np.median(data_array)  # Calculates the median of the data
-    standard_deviation = np.std(data_array)  # Calculates the standard deviation of the data
+    if tail is None:
+        tail = tail_percentiles
 
-    max_value = np.max(data_array)  # Maximum value in the data
-    min_value = np.min(data_array)  # Minimum value in the data
+    # Calculating metrics
+    mean_value = mean(data_array)  # Calculates the mean of the data
+    standard_deviation = std(data_array)  # Calculates the standard deviation of the data
 
-    # Quartiles
-    Q1 = np.percentile(data_array, 25)  # Calculates the first quartile
-    Q3 = np.percentile(data_array, 75)  # Calculates the third quartile
+    # Minimum, quartiles, median, maximum and tail percentiles in a single pass
+    min_value, Q1, median, Q3, max_value, *tail_values = percentiles(data_array, [0, 25, 50, 75, 100] + list(tail), data.sorted)
 
     # Prints the results in a formatted table row
     print(
         f"& \\textbf{{{data.source}}} & "
-        f"{format_value(mean, decimal_places)} & "
+        f"{format_value(mean_value, decimal_places)} & "
         f"{format_value(median, decimal_places)} & "
         f"{format_value(standard_deviation, decimal_places)} & "
         f"{format_value(Q1, decimal_places)} & "
         f"{format_value(Q3, decimal_places)} & "
         f"{format_value(min_value, decimal_places)} & "
-        f"{format_value(max_value, decimal_places)} \\\\ \\cline{{2-9}}"
+        f"{format_value(max_value, decimal_places)}"
+        + "".join(f" & {format_value(value, decimal_places)}" for value in tail_values)
+        + f" \\\\ \\cline{{2-{9 + len(tail_values)}}}"
+    )
+
+"""
+Prints the bootstrap confidence intervals of the mean, median, standard deviation and tail percentiles of a dataset.
+
+    :param data: The dataset containing the data to be analysed.
+    :param decimal_places: The number of decimal places to format the output (default is 4).
+    :param intervals: Intervals already computed by bootstrap.confidence_intervals (computed if not given).
+"""
+def get_bootstrap_stats(data, decimal_places=4, intervals=None):
+    if intervals is None:
+        intervals = bootstrap.confidence_intervals(data.data, is_sorted=data.sorted)
+
+    # Prints the results in a formatted table row: estimate [low, high]
+    print(
+        f"& \\textbf{{{data.source}}}"
+        + "".join(f" & {format_value(interval.estimate, decimal_places)} "
+                  f"[{format_value(interval.low, decimal_places)}, {format_value(interval.high, decimal_places)}]"
+                  for interval in intervals.values())
+        + f" \\\\ \\cline{{2-{2 + len(intervals)}}}"
     )
 
 """
 Main entry point of the script. Parses command-line arguments and initialises the configuration.
     
-    Usage: python stats.py <file.json> [confidence_interval]
+    Usage: python stats.py <file.json> [confidence_interval] [percentiles]
     - file.json: Path to the JSON file containing the dataset.
     - confidence_interval: Optional. The confidence interval to use (default is 5).
+    - percentiles: Optional. Comma-separated tail percentiles (default is 99,99.9,99.99,99.999).
 """
 if __name__ == "__main__":
     confidence_interval = 5  # Default confidence interval
     
     # Check if the required file path argument is provided
     if len(sys.argv) < 2:
-        print("Usage: python stats.py <file.json> [confidence_interval]")
+        print("Usage: python stats.py <file.json> [confidence_interval] [percentiles]")
         sys.exit(1)
 
     file_path = sys.argv[1]  # Get the file path from the command-line arguments
@@ -65,5 +144,13 @@ if __name__ == "__main__":
             print("Confidence interval must be an integer.")
             sys.exit(1)
 
+    # Check if an optional list of tail percentiles is provided
+    if len(sys.argv) > 3:
+        try:
+            config.stats.tail_percentiles = [float(value) for value in sys.argv[3].split(",") if value]
+        except ValueError:
+            print("Percentiles must be comma-separated numbers.")
+            sys.exit(1)
+
     # Initialise the configuration using the provided file and confidence interval
     config.from_json(file_path, confidence_interval, "1")
@@ -0,0 +1,326 @@
+import numpy as np
+import json
+import os
+import re
+import struct
+import sys
+from collections import namedtuple
+
+import capture
+import packed
+
+"""
+Consolidated dataset store: every processed array of the DATA tree in one file.
+
+Layout of the file:
+    MAGIC | header (index offset, index size) | array | index (JSON) | array | array | ... | index (JSON)
+
+Each array is aligned to ALIGNMENT bytes so it can be memory-mapped directly. The index table
+maps (type, environment, source, stress, interval_range, run) and a view name to the dtype,
+shape and offset of an array. Nothing written is ever overwritten: new arrays and a new index
+are appended at the end of the file and synced, then the header is switched to the new index.
+A crash at any point leaves the previous index in place; compact removes the old indexes and
+replaced arrays.
+"""
+
+STORE_FILE = "../../DATA/dataset.store"
+
+MAGIC = b"UNIKSTOR"
+HEADER = struct.Struct("<QQ")  # Index offset, index size (right after MAGIC)
+ALIGNMENT = 64
+VERSION = 1
+
+RUN_DIRECTORY = re.compile(r'^[Rr]un(\d+)$')  # "Run2"
+RUN_SUFFIX = re.compile(r'_[Rr]un(\d+)$')  # "10000_run2"
+
+VIEW_APPENDIX_FILES = {"_series": "series", "_hist": "hist"}  # Name appendix of the .npy files of each view
+
+KEY_FIELDS = ("type", "environment", "source", "stress", "interval_range", "run")
+SOURCE_FIELDS = ("source_file", "mtime_ns")  # File an array was added from, and its mtime (see current_entries)
+
+# Reference to an array of the store, used as a dataset location by config.load_data
+Location = namedtuple("Location", ["path", "key", "view"])
+
+# Index tables already read (current entries only): path -> (mtime, index)
+index_cache = {}
+
+"""
+Builds the key of a configuration (same environment naming as the DATA tree).
+"""
+def make_key(type_data, environment, source, stress, interval_range=None, run=0):
+    if environment == "QEMU + KVM":
+        environment = "QEMU"
+    if interval_range is not None:
+        interval_range = int(interval_range)
+    return (type_data, environment, source, bool(stress), interval_range, int(run))
+
+"""
+Reads the header and returns (index offset, index size).
+"""
+def read_index_location(f):
+    f.seek(0)
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Invalid dataset store: bad magic")
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise ValueError("Invalid dataset store: file too small")
+    return HEADER.unpack(header)
+
+"""
+Reads the index as a dictionary key -> {view: entry}.
+"""
+def read_index_from_file(f):
+    index_offset, index_size = read_index_location(f)
+    f.seek(index_offset)
+    table = json.loads(f.read(index_size))
+    index = {}
+    for entry in table["entries"]:
+        key = tuple(entry[field] for field in KEY_FIELDS)
+        index.setdefault(key, {})[entry["view"]] = entry
+    return index
+
+"""
+Returns the index of a store (empty if the store does not exist), read once per modification.
+Entries older than their files are left out when the index is read (see current_entries), so lookups never touch the DATA tree.
+"""
+def read_index(path=STORE_FILE):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+
+    cached = index_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, "rb") as f:
+        index = current_entries(read_index_from_file(f))
+    index_cache[path] = (mtime, index)
+    return index
+
+"""
+Returns the entries of an index whose file has not changed since it was added, or been replaced by a newer .npy or
+packed file (e.g. a run processed again with --pack and --no-store): the file is then read instead of the store.
+Entries without a source file (whose files were removed) are kept.
+"""
+def current_entries(index):
+    current = {}
+    for key, views in index.items():
+        views = {view: entry for view, entry in views.items() if is_current(entry)}
+        if views:
+            current[key] = views
+    return current
+
+"""
+Enumerates the configurations available in the store, without walking the DATA tree.
+"""
+def configurations(path=STORE_FILE, type_data=None):
+    return sorted((key for key in read_index(path) if type_data is None or key[0] == type_data), key=str)
+
+"""
+Returns the location of an array of the store, or None if it is not available (a lookup in the cached index).
+"""
+def find(key, view, path=STORE_FILE):
+    if view not in read_index(path).get(key, {}):
+        return None
+    return Location(path, key, view)
+
+"""
+Returns False if the source file of an entry has a different mtime, or a sibling .npy or packed file is newer.
+"""
+def is_current(entry):
+    source = entry.get("source_file")
+    if source is None:
+        return True
+    base = os.path.splitext(source)[0]
+    for file in (source, base + ".npy", base + packed.EXTENSION):
+        try:
+            mtime = os.stat(file).st_mtime_ns
+        except OSError:
+            continue
+        if mtime != entry["mtime_ns"] if file == source else mtime > entry["mtime_ns"]:
+            return False
+    return True
+
+"""
+Opens a dataset as a read-only array: a zero-copy memory map for store locations and capture files, np.load otherwise.
+A missing .npy file is read from its packed file (packed.py) if there is one, decoding only the blocks used.
+"""
+def open_array(location):
+    if capture.is_capture(location):
+        return capture.open_capture(location)
+    if not isinstance(location, Location):
+        if not location.endswith(packed.EXTENSION) and (os.path.exists(location) or not os.path.exists(packed.packed_path(location))):
+            return np.load(location, mmap_mode='r')
+        return packed.PackedArray(location if location.endswith(packed.EXTENSION) else packed.packed_path(location))
+
+    entry = read_index(location.path)[location.key][location.view]
+    dtype = np.dtype([tuple(field) for field in entry["dtype"]]) if isinstance(entry["dtype"], list) else np.dtype(entry["dtype"])
+    shape = tuple(entry["shape"])
+    if np.prod(shape) == 0:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(location.path, dtype=dtype, mode='r', offset=entry["offset"], shape=shape)
+
+"""
+Appends arrays to the store (created if it does not exist).
+{arrays} maps a view name to an array; an array already stored with the same key and view is replaced.
+{metadata} maps a view name to extra fields of its entry (the source file and its mtime, see current_entries).
+"""
+def append(key, arrays, path=STORE_FILE, metadata=None):
+    if not os.path.exists(path):
+        create(path)
+
+    with open(path, "r+b") as f:
+        index = read_index_from_file(f)
+        end = f.seek(0, os.SEEK_END)
+
+        for view, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            offset = -(-end // ALIGNMENT) * ALIGNMENT
+            f.write(b"\0" * (offset - end))
+            f.write(memoryview(array.reshape(-1)).cast("B"))
+            end = f.tell()
+
+            entry = dict(zip(KEY_FIELDS, key), view=view, dtype=array.dtype.descr if array.dtype.names else array.dtype.str, shape=list(array.shape), offset=offset)
+            entry.update((metadata or {}).get(view, {}))
+            index.setdefault(key, {})[view] = entry
+
+        write_index(f, end, index)
+
+    index_cache.pop(path, None)
+
+"""
+Writes the index table at {offset} (the end of the file), then switches the header to it once the table is on disk.
+"""
+def write_index(f, offset, index):
+    table = json.dumps({"version": VERSION, "entries": [entry for views in index.values() for entry in views.values()]}).encode()
+    f.seek(offset)
+    f.write(table)
+    f.flush()
+    os.fsync(f.fileno())
+
+    f.seek(len(MAGIC))
+    f.write(HEADER.pack(offset, len(table)))
+    f.flush()
+    os.fsync(f.fileno())
+
+"""
+Creates an empty store (written to a temporary file first, so a partial store is never left at {path}).
+"""
+def create(path):
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w+b") as f:
+        f.write(MAGIC + HEADER.pack(0, 0))
+        write_index(f, len(MAGIC) + HEADER.size, {})
+    os.replace(temporary_path, path)
+
+"""
+Rewrites the store without the space left by replaced arrays, old indexes and entries older than their files
+(the store is replaced only once complete).
+"""
+def compact(path=STORE_FILE):
+    index = read_index(path)
+    temporary_path = path + ".compact"
+    create(temporary_path)
+
+    for key, views in index.items():
+        metadata = {view: {field: entry[field] for field in SOURCE_FIELDS if field in entry} for view, entry in views.items()}
+        append(key, {view: np.array(open_array(Location(path, key, view))) for view in views}, temporary_path, metadata)
+    os.replace(temporary_path, path)
+    index_cache.pop(path, None)
+
+"""
+Builds the key and view of a processed .npy (or packed) file from its path in the DATA tree, or returns None.
+
+    Cyclictest/<environment>/<source>/<stress>/[RAW/]<interval>[_series|_hist].npy
+    BootTime/<environment>/<stress>/<source>/<environment>_<stress>_<source>.npy
+    CPU|Memory/<environment>/<stress>/<source>/<source>.npy
+
+The run is {run} if given, otherwise the number of a Run<N> directory or of a _run<N> name suffix
+(e.g. Cyclictest/QEMU/Nanos/NoStress/Run2/10000.npy or 10000_run2.npy), and 0 without one.
+"""
+def key_from_path(file_path, run=None):
+    parts = os.path.normpath(file_path).replace("\\", "/").split("/")
+    name = os.path.splitext(parts[-1])[0]
+
+    view = "sorted"
+    for appendix, appendix_view in VIEW_APPENDIX_FILES.items():
+        if name.endswith(appendix):
+            name, view = name[:-len(appendix)], appendix_view
+
+    found_run = 0
+    directories = []
+    for part in parts[:-1]:
+        match = RUN_DIRECTORY.match(part)
+        if match:
+            found_run = int(match.group(1))
+        elif part != "RAW":
+            directories.append(part)
+    match = RUN_SUFFIX.search(name)
+    if match:
+        name, found_run = name[:match.start()], int(match.group(1))
+    parts = directories
+    run = found_run if run is None else run
+
+    for i, part in enumerate(parts):
+        rest = parts[i + 1:]
+        if part == "Cyclictest" and len(rest) == 3 and name.isdigit():
+            return make_key("latency", rest[0], rest[1], rest[2] == "Stress", name, run), view
+        if part == "BootTime" and len(rest) == 3:
+            return make_key("boot", rest[0], rest[2], rest[1] == "Stress", run=run), view
+        if part in ("CPU", "Memory") and len(rest) == 3:
+            return make_key(part.lower(), rest[0], rest[2], rest[1] == "Stress", run=run), view
+    return None
+
+"""
+Appends processed .npy and packed files (decoded) to the store, with the mtime of each file, so an entry is
+no longer used once its file is processed again (see current_entries). Files outside the DATA layout are ignored.
+{run} overrides the run found in the paths (see key_from_path).
+"""
+def add_files(file_paths, path=STORE_FILE, run=None):
+    for file_path in file_paths:
+        if not file_path.endswith((".npy", packed.EXTENSION)):
+            continue
+        found = key_from_path(file_path, run)
+        if found is None:
+            continue
+        key, view = found
+        array = np.load(file_path, mmap_mode='r') if file_path.endswith(".npy") else np.asarray(packed.PackedArray(file_path))
+        metadata = {view: {"source_file": os.path.abspath(file_path), "mtime_ns": os.stat(file_path).st_mtime_ns}}
+        append(key, {view: array}, path, metadata)
+
+"""
+Imports every processed .npy file (or packed file without its .npy) of a DATA tree into the store.
+"""
+def import_tree(directory, path=STORE_FILE):
+    file_paths = []
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if "Plots" in root:
+                continue
+            if file.endswith(".npy") or (file.endswith(packed.EXTENSION) and file[:-len(packed.EXTENSION)] + ".npy" not in files):
+                file_paths.append(os.path.join(root, file))
+    add_files(sorted(file_paths), path)
+    print(f"{len(read_index(path))} configurations in {path}")
+
+"""
+Main entry point of the script.
+
+Usage: python store.py [import | list | compact]
+    - import:  adds every processed .npy (or packed) file of ../../DATA/ to the store
+    - list:    lists the configurations available in the store
+    - compact: removes the space left by replaced arrays
+"""
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("import", "list", "compact"):
+        print("Usage: python store.py [import | list | compact]")
+        sys.exit(1)
+
+    if sys.argv[1] == "import":
+        import_tree("../../DATA/")
+    elif sys.argv[1] == "list":
+        for key in configurations():
+            views = ", ".join(sorted(read_index()[key]))
+            print(" ".join(str(value) for value in key) + f" ({views})")
+    elif sys.argv[1] == "compact":
+        compact()
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import bootstrap
+from histogram import Histogram
+
+TAIL = [99]
+RESAMPLES = 1000
+
+@pytest.fixture
+def latencies():
+    return np.round(np.random.default_rng(0).gamma(4, 15, 5000)).astype(np.int64)
+
+"""Percentile bootstrap resampling the indices of the data (the textbook definition)."""
+def reference_intervals(data, resamples=RESAMPLES, confidence=95):
+    rng = np.random.default_rng(1)
+    samples = data[rng.integers(0, len(data), (resamples, len(data)))]
+    metrics = {
+        "mean": samples.mean(axis=1),
+        "median": np.percentile(samples, 50, axis=1),
+        "std": samples.std(axis=1),
+        "p99": np.percentile(samples, 99, axis=1),
+    }
+    alpha = (100 - confidence) / 2
+    return {name: np.percentile(values, [alpha, 100 - alpha]) for name, values in metrics.items()}
+
+def test_resample_percentiles_match_numpy(latencies):
+    values, counts = bootstrap.distinct_values(latencies)
+    draws = np.random.default_rng(2).multinomial(len(latencies), counts / len(latencies), size=20)
+    q = [0, 10, 50, 99, 99.9, 100]
+
+    result = bootstrap.resample_percentiles(values, np.cumsum(draws, axis=1), q)
+    for row, draw in zip(result, draws):
+        np.testing.assert_allclose(row, np.percentile(np.repeat(values, draw), q))
+
+def test_distinct_values_of_sorted_array(latencies):
+    values, counts = bootstrap.distinct_values(np.sort(latencies), is_sorted=True)
+    expected_values, expected_counts = np.unique(latencies, return_counts=True)
+    np.testing.assert_array_equal(values, expected_values)
+    np.testing.assert_array_equal(counts, expected_counts)
+
+def test_intervals_match_reference(monkeypatch, latencies):
+    monkeypatch.setattr(bootstrap, "resamples", RESAMPLES)
+    intervals = bootstrap.confidence_intervals(latencies, TAIL)
+    reference = reference_intervals(latencies)
+
+    assert intervals["mean"].estimate == pytest.approx(latencies.mean())
+    assert intervals["median"].estimate == np.median(latencies)
+    assert intervals["std"].estimate == pytest.approx(latencies.std())
+    assert intervals["p99"].estimate == np.percentile(latencies, 99)
+    for name, (low, high) in reference.items():
+        interval = intervals[name]
+        assert interval.low <= interval.estimate <= interval.high
+        # Different random draws: the bounds agree within the Monte Carlo error of the reference
+        # (and a couple of microseconds for the percentiles of integer latencies)
+        tolerance = max(0.2 * (high - low), 2.0)
+        assert interval.low == pytest.approx(low, abs=tolerance), name
+        assert interval.high == pytest.approx(high, abs=tolerance), name
+
+def test_intervals_are_reproducible(latencies):
+    first = bootstrap.confidence_intervals(latencies, TAIL)
+    assert bootstrap.confidence_intervals(np.sort(latencies), TAIL, is_sorted=True) == first
+
+def test_intervals_of_histogram(latencies):
+    from_array = bootstrap.confidence_intervals(latencies, TAIL)
+    from_histogram = bootstrap.confidence_intervals(Histogram.from_values(latencies), TAIL)
+    for name, interval in from_array.items():
+        assert from_histogram[name].low == pytest.approx(interval.low, rel=0.01), name
+        assert from_histogram[name].high == pytest.approx(interval.high, rel=0.01), name
+
+def test_intervals_of_empty_data():
+    assert bootstrap.confidence_intervals(np.array([], dtype=np.int64), TAIL) == {}
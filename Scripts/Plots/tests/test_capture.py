@@ -0,0 +1,62 @@
+import numpy as np
+import os
+import pytest
+
+import capture
+
+INTERVAL = 1000  # us
+
+def write(path, counters, values, chunk_samples=capture.CHUNK_SAMPLES, pieces=1):
+    writer = capture.CaptureWriter(str(path), interval=INTERVAL, chunk_samples=chunk_samples)
+    for part_counters, part_values in zip(np.array_split(counters, pieces), np.array_split(values, pieces)):
+        writer.append(part_counters, part_values)
+    writer.close()
+    return writer
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "QemuNanos1000.cap"
+    counters = np.arange(1000, dtype=np.uint32)
+    values = np.random.default_rng(0).integers(40, 5000, 1000).astype(np.uint32)
+    writer = write(path, counters, values, chunk_samples=64, pieces=7)  # Appends across chunk boundaries
+
+    header = capture.read_header(str(path))
+    assert header["interval"] == INTERVAL
+    assert header["samples"] == writer.samples == 1000
+    assert os.path.getsize(path) == capture.HEADER.size + 1000 * capture.RECORD_DTYPE.itemsize
+
+    records = capture.open_capture(str(path))
+    assert records.dtype == capture.RECORD_DTYPE
+    np.testing.assert_array_equal(records["counter"], counters)
+    np.testing.assert_array_equal(records["latency"], values)
+
+def test_empty_capture(tmp_path):
+    path = tmp_path / "empty.cap"
+    capture.CaptureWriter(str(path)).close()
+    assert capture.read_header(str(path))["interval"] is None
+    assert len(capture.open_capture(str(path))) == 0
+
+def test_truncated_last_record(tmp_path):
+    path = tmp_path / "killed.cap"
+    write(path, np.arange(100), np.full(100, 58))
+    with open(path, "r+b") as f:  # A run killed in the middle of a record
+        f.truncate(os.path.getsize(path) - capture.RECORD_DTYPE.itemsize // 2)
+
+    records = capture.open_capture(str(path))
+    assert capture.read_header(str(path))["samples"] == len(records) == 99
+    assert records["counter"].tolist() == list(range(99))
+    assert (records["latency"] == 58).all()
+
+def test_unsynced_samples_written_at_sync(tmp_path):
+    path = tmp_path / "live.cap"
+    writer = capture.CaptureWriter(str(path), chunk_samples=1000)
+    writer.append(np.arange(10), np.arange(10))
+    writer.sync()  # The samples still in the chunk reach the file
+    assert capture.open_capture(str(path))["counter"].tolist() == list(range(10))
+    writer.close()
+
+@pytest.mark.parametrize("data", [b"", b"NOTACAPT" + bytes(24)])
+def test_invalid_capture(tmp_path, data):
+    path = tmp_path / "bad.cap"
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        capture.open_capture(str(path))
@@ -0,0 +1,74 @@
+import numpy as np
+import os
+import pytest
+
+import capture
+import clean_data
+
+LOG = "cyclictest header\n0:1:58\n0:2:61\nT: 0 ( 1234) P:99 I:1000\n0:3:1200\n0:4:57"
+EXPECTED_COUNTERS = [1, 2, 3, 4]
+EXPECTED_VALUES = [58, 61, 1200, 57]
+
+"""Character codes of a text, as clean_data reads them (uint8 for UTF-8, uint16 for UTF-16LE)."""
+def codes_of(text, encoding="utf-8"):
+    return np.frombuffer(text.encode(encoding), dtype="<u2" if encoding == "utf-16le" else np.uint8)
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-16le"])
+def test_parse_chunk(encoding):
+    counters, values = clean_data.parse_chunk(codes_of(LOG + "\n", encoding))
+    assert counters.tolist() == EXPECTED_COUNTERS
+    assert values.tolist() == EXPECTED_VALUES
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-16le"])
+def test_parse_chunk_malformed_lines(encoding):
+    lines = [
+        "0:1:58",
+        "no colon",
+        "0:2",                         # One colon
+        "0:3:4:5",                     # Three colons
+        "0:4:",                        # No digit after the second colon
+        "0:5: 6x1",                    # Non-digits are ignored
+        "0:6:" + "9" * 30,             # Value too long
+        "0:7:4294967296",              # Value too large for SERIES_DTYPE
+        "0:" + "1" * 19 + ":60",       # Counter too long
+        "",
+        "0:8:62",
+    ]
+    counters, values = clean_data.parse_chunk(codes_of("\n".join(lines) + "\n", encoding))
+    assert counters.tolist() == [1, 5, 8]
+    assert values.tolist() == [58, 61, 62]
+
+def test_parse_chunk_without_lines():
+    counters, values = clean_data.parse_chunk(codes_of("\n\n"))
+    assert len(counters) == len(values) == 0
+
+@pytest.mark.parametrize("encoding, bom", [("utf-8", b""), ("utf-8", b"\xef\xbb\xbf"), ("utf-16le", b""), ("utf-16le", b"\xff\xfe")])
+def test_open_file_and_split(tmp_path, encoding, bom):
+    path = tmp_path / "log.txt"
+    path.write_bytes(bom + LOG.encode(encoding))
+
+    assert clean_data.detect_encoding(str(path)) == encoding
+    data = clean_data.open_file_and_split(str(path), "utf-8", chunk_size=16)  # Lines split across chunks
+    assert data.dtype == clean_data.SERIES_DTYPE
+    assert data["counter"].tolist() == EXPECTED_COUNTERS
+    assert data["latency"].tolist() == EXPECTED_VALUES
+
+def test_end_of_last_line():
+    assert clean_data.end_of_last_line(codes_of("0:1:5\n0:2")) == 6
+    assert clean_data.end_of_last_line(codes_of("0:1:5")) == 0
+
+def test_process_files_skips_spills_and_logs_with_a_capture(tmp_path):
+    directory = tmp_path / "Cyclictest" / "QEMU" / "Nanos" / "NoStress"
+    directory.mkdir(parents=True)
+    (directory / "QemuNanos1000.txt").write_text("0:1:99\n")  # Same run as the capture
+    writer = capture.CaptureWriter(str(directory / "QemuNanos1000.cap"), interval=1000)
+    writer.append(np.arange(10), np.full(10, 58))
+    writer.close()
+    (directory / ("QemuNanos100" + capture.TEMPORARY_EXTENSION)).write_bytes(b"")  # Spill of a killed live.py run
+
+    clean_data.process_files("cyclictest", str(tmp_path / "Cyclictest"), clean_data.get_clean_data, jobs=1,
+                             parameters={"warmup": 0}, store_path=None)
+    assert sorted(file for file in os.listdir(directory) if file.endswith(".npy")) == ["1000.npy", "1000_hist.npy", "1000_series.npy"]
+    assert np.load(str(directory / "1000.npy")).tolist() == [58] * 10
+    with open(str(directory / ("1000" + clean_data.MANIFEST_APPENDIX_FILE))) as f:
+        assert "QemuNanos1000.cap" in f.read()
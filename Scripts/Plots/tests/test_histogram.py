@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from histogram import Histogram, SUB_BUCKET_BITS, bucket_bounds, bucket_index
+
+PRECISION = 2.0 ** -(SUB_BUCKET_BITS - 1)  # Largest relative error of a bucket
+Q = [0, 1, 25, 50, 75, 90, 99, 99.9, 99.99, 100]
+
+@pytest.fixture
+def latencies():
+    rng = np.random.default_rng(0)
+    return np.round(rng.lognormal(4, 1.2, 200000)).astype(np.int64)
+
+def test_percentiles_within_bucket_precision(latencies):
+    histogram = Histogram.from_values(latencies)
+    expected = np.percentile(latencies, Q, method="nearest")
+    np.testing.assert_allclose(histogram.percentiles(Q), expected, rtol=PRECISION, atol=0.5)
+
+def test_percentiles_exact_for_small_values():
+    values = np.random.default_rng(1).integers(0, 1 << SUB_BUCKET_BITS, 10001)
+    histogram = Histogram.from_values(values)
+    np.testing.assert_array_equal(histogram.percentiles(Q), np.percentile(values, Q, method="nearest"))
+
+def test_exact_statistics(latencies):
+    histogram = Histogram()
+    for chunk in np.array_split(latencies, 7):
+        histogram.add(chunk)
+    assert histogram.count == len(latencies)
+    assert histogram.min() == latencies.min()
+    assert histogram.max() == latencies.max()
+    assert histogram.mean() == pytest.approx(latencies.mean())
+    assert histogram.std() == pytest.approx(latencies.std())
+
+def test_buckets_contain_their_values():
+    values = np.unique(np.geomspace(1, 1 << 40, 5000).astype(np.int64))
+    lower, width = bucket_bounds(bucket_index(values))
+    assert np.all((lower <= values) & (values < lower + width))
+    assert np.all(width <= np.maximum(values * PRECISION, 1))
+
+def test_scaled(latencies):
+    histogram = Histogram.from_values(latencies)
+    in_ms = histogram.scaled(1 / 1000)
+    np.testing.assert_allclose(in_ms.percentiles(Q), histogram.percentiles(Q) / 1000)
+    assert in_ms.mean() == pytest.approx(histogram.mean() / 1000)
+
+def test_trimmed(latencies):
+    cut = 1000
+    trimmed = Histogram.from_values(latencies).trimmed(cut)
+    expected = np.sort(latencies)[cut:-cut]
+    assert trimmed.count == len(expected)
+    assert trimmed.min() == pytest.approx(expected.min(), rel=PRECISION)
+    assert trimmed.max() == pytest.approx(expected.max(), rel=PRECISION)
+    assert trimmed.mean() == pytest.approx(expected.mean(), rel=PRECISION)
+
+def test_array_round_trip(latencies):
+    histogram = Histogram.from_values(latencies)
+    loaded = Histogram.from_array(histogram.to_array())
+    np.testing.assert_array_equal(loaded.counts, histogram.counts)
+    assert (loaded.count, loaded.min(), loaded.max(), loaded.mean()) == (histogram.count, histogram.min(), histogram.max(), histogram.mean())
+
+def test_from_array_rejects_other_precision(latencies):
+    array = Histogram.from_values(latencies).to_array()
+    array[0] = SUB_BUCKET_BITS + 1
+    with pytest.raises(ValueError):
+        Histogram.from_array(array)
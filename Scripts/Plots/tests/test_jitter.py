@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import jitter
+
+CHUNK_SAMPLES = 100  # Small chunks, so the windows cross chunk boundaries
+
+@pytest.fixture
+def values(monkeypatch):
+    monkeypatch.setattr(jitter, "CHUNK_SAMPLES", CHUNK_SAMPLES)
+    rng = np.random.default_rng(0)
+    values = rng.integers(40, 3000, 1050) / 1000  # ms, with a resolution of 1 us
+    values[500] = 25.0  # A spike in the middle of a chunk
+    return values
+
+"""Jitter and maximum deviation of each window, one window at a time."""
+def naive_rolling(values, window, step):
+    jitter_values, deviations = [], []
+    for start in range(0, len(values) - window + 1, step):
+        samples = values[start:start + window]
+        jitter_values.append(np.std(samples))
+        deviations.append(np.abs(samples - samples.mean()).max())
+    return np.array(jitter_values), np.array(deviations)
+
+@pytest.mark.parametrize("window, step", [(37, None), (37, 10), (150, 1), (100, 100), (7, 3)])
+def test_rolling_jitter_matches_naive(values, window, step):
+    result = jitter.rolling_jitter(values, window, step)
+    expected = naive_rolling(values, window, step or window)
+    assert len(result[0]) == len(expected[0])
+    np.testing.assert_allclose(result[0], expected[0], rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(result[1], expected[1], rtol=1e-9, atol=1e-9)
+
+def test_rolling_jitter_of_read_only_data(values):
+    values.flags.writeable = False  # As the memory-mapped datasets
+    jitter.rolling_jitter(values, 37)
+    np.testing.assert_allclose(jitter.moments(values), (values.mean(), values.std()))
+
+def test_rolling_jitter_shorter_than_window(values):
+    result = jitter.rolling_jitter(values[:10], 37)
+    assert len(result[0]) == len(result[1]) == 0
+
+def test_inter_sample_deltas(values):
+    deltas = jitter.inter_sample_deltas(values)
+    expected = np.abs(np.diff(values))
+    assert len(deltas) == len(values) - 1  # Including the deltas across chunk boundaries
+    assert deltas.min() == pytest.approx(expected.min())
+    assert deltas.max() == pytest.approx(expected.max())
+    assert deltas.mean() == pytest.approx(expected.mean())
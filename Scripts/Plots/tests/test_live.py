@@ -0,0 +1,90 @@
+import numpy as np
+import os
+import pytest
+import tempfile
+
+import capture
+import clean_data
+import live
+
+INTERVAL = 1000  # us
+WARMUP = 1       # Seconds (1000 samples)
+
+def test_ring_buffer_wraps_around():
+    ring = live.RingBuffer(5)
+    ring.extend(np.array([1, 2, 3]))
+    assert sorted(ring.samples()) == [1, 2, 3]
+
+    ring.extend(np.array([4, 5, 6, 7]))  # Wraps around the end of the buffer
+    assert ring.count == 5
+    assert sorted(ring.samples()) == [3, 4, 5, 6, 7]
+
+    ring.extend(np.arange(10, 18))  # More values than the capacity: only the last ones are kept
+    assert sorted(ring.samples()) == [13, 14, 15, 16, 17]
+    ring.extend(np.array([], dtype=np.uint32))
+    assert sorted(ring.samples()) == [13, 14, 15, 16, 17]
+
+def log_text(samples=5000):
+    rng = np.random.default_rng(0)
+    lines = ["# /dev/cpu_dma_latency set to 0us", "policy: fifo: loadavg: 0.00 0.00 0.00 1/100 1"]
+    lines += [f"       0:{i:8d}:{latency:8d}" for i, latency in enumerate(rng.integers(40, 3000, samples))]
+    lines.insert(1000, "T: 0 ( 1234) P:99 I:1000 C:   1000 Min:     40 Act:   60 Avg:   70 Max:    2999")
+    return "\n".join(lines)  # The last line has no newline
+
+def log_bytes(encoding):
+    return (b"\xff\xfe" if encoding == "utf-16le" else b"") + log_text().encode(encoding)
+
+"""Feeds a log to a LiveAnalysis in pieces of random (odd) sizes, as a pipe delivers them."""
+def analyze(data, spill_path):
+    analysis = live.LiveAnalysis(spill_path, interval=INTERVAL)
+    rng = np.random.default_rng(1)
+    position = 0
+    while position < len(data):
+        size = int(rng.integers(1, 4000)) | 1
+        analysis.feed(data[position:position + size])
+        position += size
+    analysis.finish()
+    return analysis
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-16le"])
+def test_feed_matches_clean_data(tmp_path, encoding):
+    data = log_bytes(encoding)
+    log_path = tmp_path / "QemuNanos1000.txt"
+    log_path.write_bytes(data)
+
+    analysis = analyze(data, str(tmp_path / ("spill" + capture.TEMPORARY_EXTENSION)))
+    expected = clean_data.open_file_and_split(str(log_path), "utf-8")
+    series = capture.open_capture(analysis.spill_path)
+    np.testing.assert_array_equal(series["counter"], expected["counter"])
+    np.testing.assert_array_equal(series["latency"], expected["latency"])
+
+    assert analysis.samples == len(expected)
+    assert analysis.histogram.max() == expected["latency"].max()
+    assert analysis.ring.count == len(expected)
+
+def test_save_outputs_match_clean_data(tmp_path):
+    log_path = tmp_path / "QemuNanos1000.txt"
+    log_path.write_bytes(log_bytes("utf-8"))
+    live_output = str(tmp_path / "live" / "1000")
+    batch_output = str(tmp_path / "batch" / "1000")
+    os.makedirs(os.path.dirname(live_output))
+    os.makedirs(os.path.dirname(batch_output))
+
+    analysis = analyze(log_path.read_bytes(), live.spill_file())
+    outputs = live.save_outputs(str(log_path), analysis, live_output, WARMUP, store_path=None)
+    expected = clean_data.get_clean_data(str(log_path), batch_output, "utf-8", WARMUP)
+
+    assert not os.path.exists(analysis.spill_path)
+    assert len(outputs) == len(expected)
+    for live_path, batch_path in zip(outputs, expected):
+        assert os.path.basename(live_path) == os.path.basename(batch_path)
+        np.testing.assert_array_equal(np.load(live_path), np.load(batch_path))
+    assert clean_data.is_up_to_date(str(log_path), live_output, clean_data.get_clean_data.__name__, {"warmup": WARMUP})
+
+def test_spill_file_outside_data_tree():
+    path = live.spill_file()
+    try:
+        assert path.endswith(capture.TEMPORARY_EXTENSION)
+        assert os.path.dirname(path) == tempfile.gettempdir()
+    finally:
+        os.remove(path)
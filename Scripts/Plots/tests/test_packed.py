@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+import packed
+import stats
+import store
+
+BLOCK_SIZE = 1000
+Q = [0, 50, 99, 99.9, 99.99, 100]
+
+@pytest.fixture
+def latencies():
+    rng = np.random.default_rng(0)
+    values = np.round(rng.lognormal(4, 1, 25000)).astype(np.int64)
+    values[-10:] = [1 << 40] * 10  # Wide deltas in the last block
+    return np.sort(values)
+
+@pytest.mark.parametrize("codec", ["none", "zlib", "zstd"])
+def test_round_trip(tmp_path, latencies, codec):
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+    path = str(tmp_path / "data.pk")
+    packed.save(path, latencies, codec, BLOCK_SIZE)
+
+    array = packed.PackedArray(path)
+    assert len(array) == len(latencies)
+    np.testing.assert_array_equal(np.asarray(array), latencies)
+
+@pytest.mark.parametrize("data", [[], [7], [3] * 2500, list(range(2500))])
+def test_round_trip_edge_cases(tmp_path, data):
+    path = str(tmp_path / "data.pk")
+    packed.save(path, data, block_size=BLOCK_SIZE)
+    np.testing.assert_array_equal(np.asarray(packed.PackedArray(path)), np.array(data, dtype=np.int64))
+
+def test_indexing(tmp_path, latencies):
+    path = str(tmp_path / "data.pk")
+    packed.save(path, latencies, block_size=BLOCK_SIZE)
+    array = packed.PackedArray(path)
+
+    assert array[0] == latencies[0]
+    assert array[-1] == latencies[-1]
+    assert array[BLOCK_SIZE] == latencies[BLOCK_SIZE]
+    np.testing.assert_array_equal(array[990:2010], latencies[990:2010])
+    np.testing.assert_array_equal(array[5:20000:7], latencies[5:20000:7])
+    np.testing.assert_array_equal(array[::-1], latencies[::-1])
+    indices = np.array([[3, 24999], [12000, -2]])
+    np.testing.assert_array_equal(array[indices], latencies[indices])
+    with pytest.raises(IndexError):
+        array[len(latencies)]
+
+def test_quantiles_decode_only_their_blocks(tmp_path, latencies):
+    path = str(tmp_path / "data.pk")
+    packed.save(path, latencies, block_size=BLOCK_SIZE)
+    array = packed.PackedArray(path)
+
+    np.testing.assert_array_equal(stats.percentiles(array, Q, is_sorted=True), np.percentile(latencies, Q))
+    assert len(array.blocks) <= 3  # First, middle and last blocks, out of 25
+    assert len(array.blocks) < len(array.table)
+
+def test_save_rejects_unsorted(tmp_path):
+    with pytest.raises(ValueError):
+        packed.save(str(tmp_path / "data.pk"), [3, 1, 2])
+    with pytest.raises(ValueError):
+        packed.save(str(tmp_path / "data.pk"), [[1, 2], [3, 4]])
+
+def test_open_array_reads_packed_file(tmp_path, latencies):
+    npy_path = str(tmp_path / "10000.npy")
+    packed.save(packed.packed_path(npy_path), latencies)
+    array = store.open_array(npy_path)  # No .npy: its packed file is read instead
+    assert isinstance(array, packed.PackedArray)
+    np.testing.assert_array_equal(np.asarray(array), latencies)
@@ -0,0 +1,102 @@
+import numpy as np
+import os
+import pytest
+
+import clean_data
+import store
+
+KEY = store.make_key("latency", "QEMU + KVM", "Nanos", False, 10000)
+OTHER_KEY = store.make_key("latency", "QEMU", "OSv", True, 1000, run=2)
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "dataset.store")
+
+def series_of(latencies):
+    series = np.zeros(len(latencies), dtype=clean_data.SERIES_DTYPE)
+    series["counter"] = np.arange(len(latencies))
+    series["latency"] = latencies
+    return series
+
+def test_append_find_round_trip(store_path):
+    latencies = np.random.default_rng(0).integers(40, 2000, 10000)
+    store.append(KEY, {"sorted": np.sort(latencies), "series": series_of(latencies)}, store_path)
+    store.append(OTHER_KEY, {"sorted": np.arange(5)}, store_path)
+
+    assert store.configurations(store_path) == sorted([KEY, OTHER_KEY], key=str)
+    location = store.find(KEY, "sorted", store_path)
+    assert location == store.Location(store_path, KEY, "sorted")
+    np.testing.assert_array_equal(store.open_array(location), np.sort(latencies))
+    series = store.open_array(store.find(KEY, "series", store_path))
+    assert series.dtype == clean_data.SERIES_DTYPE
+    np.testing.assert_array_equal(series["latency"], latencies)
+    np.testing.assert_array_equal(store.open_array(store.find(OTHER_KEY, "sorted", store_path)), np.arange(5))
+
+    assert store.find(KEY, "hist", store_path) is None
+    assert store.find(store.make_key("latency", "QEMU", "Nanos", False, 1), "sorted", store_path) is None
+
+def test_find_without_store(store_path):
+    assert store.find(KEY, "sorted", store_path) is None
+    assert store.configurations(store_path) == []
+
+def test_replace_and_compact(store_path):
+    store.append(KEY, {"sorted": np.arange(100000)}, store_path)
+    store.append(KEY, {"sorted": np.arange(10)}, store_path)
+    np.testing.assert_array_equal(store.open_array(store.find(KEY, "sorted", store_path)), np.arange(10))
+
+    size = os.path.getsize(store_path)
+    store.compact(store_path)
+    assert os.path.getsize(store_path) < size
+    np.testing.assert_array_equal(store.open_array(store.find(KEY, "sorted", store_path)), np.arange(10))
+
+def test_empty_array(store_path):
+    store.append(KEY, {"sorted": np.zeros(0, dtype=np.int64)}, store_path)
+    assert len(store.open_array(store.find(KEY, "sorted", store_path))) == 0
+
+def test_add_files_and_stale_entries(tmp_path, store_path):
+    directory = tmp_path / "Cyclictest" / "QEMU" / "Nanos" / "NoStress" / "Run2"
+    directory.mkdir(parents=True)
+    file_path = str(directory / "10000.npy")
+    np.save(file_path, np.arange(50))
+
+    store.add_files([file_path, str(directory / "notes.txt")], store_path)
+    key = store.make_key("latency", "QEMU", "Nanos", False, 10000, run=2)
+    assert store.configurations(store_path) == [key]
+    np.testing.assert_array_equal(store.open_array(store.find(key, "sorted", store_path)), np.arange(50))
+
+    # The file processed again without the store: the entry is left out from the next index load
+    np.save(file_path, np.arange(60))
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert store.find(key, "sorted", store_path) is not None  # Lookups use the loaded index only
+    store.index_cache.clear()
+    assert store.find(key, "sorted", store_path) is None
+    store.add_files([file_path], store_path)
+    np.testing.assert_array_equal(store.open_array(store.find(key, "sorted", store_path)), np.arange(60))
+
+def test_process_files_fills_store(tmp_path, store_path):
+    directory = tmp_path / "Cyclictest" / "QEMU" / "Nanos" / "NoStress"
+    directory.mkdir(parents=True)
+    (directory / "QemuNanos1000.txt").write_text("".join(f"0:{i}:{50 + i % 7}\n" for i in range(5000)))
+
+    clean_data.process_files("cyclictest", str(tmp_path / "Cyclictest"), clean_data.get_clean_data, jobs=1,
+                             parameters={"warmup": 1}, store_path=store_path)
+    key = store.make_key("latency", "QEMU", "Nanos", False, 1000)
+    assert sorted(store.read_index(store_path)[key]) == ["hist", "series", "sorted"]
+    np.testing.assert_array_equal(store.open_array(store.find(key, "sorted", store_path)), np.load(str(directory / "1000.npy")))
+    assert len(store.open_array(store.find(key, "series", store_path))) == 5000
+
+def test_bad_magic(store_path):
+    with open(store_path, "wb") as f:
+        f.write(b"NOTASTORE" + bytes(32))
+    with pytest.raises(ValueError):
+        store.read_index(store_path)
+
+@pytest.mark.parametrize("path, expected", [
+    ("DATA/Cyclictest/QEMU + KVM/Nanos/Stress/RAW/1000_series.npy", (store.make_key("latency", "QEMU", "Nanos", True, 1000), "series")),
+    ("DATA/Cyclictest/QEMU/OSv/NoStress/10000_run3_hist.npy", (store.make_key("latency", "QEMU", "OSv", False, 10000, run=3), "hist")),
+    ("DATA/BootTime/QEMU/NoStress/Nanos/QEMU_NoStress_Nanos.pk", (store.make_key("boot", "QEMU", "Nanos", False), "sorted")),
+    ("DATA/Cyclictest/QEMU/Plots/boxplot.npy", None),
+])
+def test_key_from_path(path, expected):
+    assert store.key_from_path(path) == expected